@@ -0,0 +1,214 @@
+import copy
+import json
+import os
+import threading
+import time
+
+import psutil
+import torch
+from ultralytics import YOLOv10
+from ultralytics.cfg import get_cfg
+
+from detection_ledger import weights_hash
+
+AUTOTUNE_RECORD = "training_record/autobatch.json"
+
+class PeakRSS:
+    """在背景每 interval 秒取樣一次行程 RSS，記錄區間內的最大值 (CPU 訓練的記憶體峰值)。"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.process = psutil.Process()
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self.running = True
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def _sample(self):
+        while self.running:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def record_key(model_path, device_name, amp):
+    """以權重檔內容的雜湊區分模型 (不同的 runs/.../best.pt 檔名相同，但模型大小可能不同)。"""
+    return f"{weights_hash(model_path)[:16]}|{device_name}|amp={amp}"
+
+def _is_oom(e):
+    return isinstance(e, MemoryError) or "out of memory" in str(e).lower()
+
+def memory_budget(device, fraction=0.8):
+    """
+    記憶體預算 (bytes)：GPU 為總顯存 * fraction；
+    CPU 量測的是整個行程的 RSS，因此為 (目前 RSS + 可用的系統記憶體) * fraction。
+    """
+    if device.type == "cuda":
+        return int(torch.cuda.get_device_properties(device).total_memory * fraction)
+    return int((psutil.Process().memory_info().rss + psutil.virtual_memory().available) * fraction)
+
+def synthetic_batch(batch, imgsz, device, boxes_per_image=4, nc=5):
+    """隨機影像與標註 (與 ultralytics dataloader 相同的格式)，只用來量測記憶體與速度。"""
+    n = batch * boxes_per_image
+    xy = torch.rand(n, 2) * 0.6 + 0.2
+    wh = torch.rand(n, 2) * 0.2 + 0.05
+    return {
+        "img": torch.rand(batch, 3, imgsz, imgsz, device=device),
+        "batch_idx": torch.arange(batch).repeat_interleave(boxes_per_image).float().to(device),
+        "cls": torch.randint(0, nc, (n, 1)).float().to(device),
+        "bboxes": torch.cat([xy, wh], 1).to(device),
+    }
+
+def probe_step(net, batch, imgsz, device, amp=True, steps=3):
+    """
+    以 batch 張 imgsz 的影像跑 steps 次 forward + backward (第一次為暖機)，
+    回傳 (記憶體峰值 bytes, 平均每步秒數)；記憶體不足時回傳 None。
+    """
+    optimizer = torch.optim.SGD(net.parameters(), lr=1e-6)
+    use_amp = amp and device.type == "cuda"
+    try:
+        data = synthetic_batch(batch, imgsz, device, nc=len(net.names))
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats(device)
+        times = []
+        with PeakRSS() as rss:
+            for _ in range(steps):
+                start = time.perf_counter()
+                with torch.autocast(device.type, enabled=use_amp):
+                    loss, _ = net.loss(data)
+                loss.sum().backward()
+                optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+                if device.type == "cuda":
+                    torch.cuda.synchronize(device)
+                times.append(time.perf_counter() - start)
+        peak = torch.cuda.max_memory_reserved(device) if device.type == "cuda" else rss.peak
+        return peak, sum(times[1:]) / max(len(times) - 1, 1)
+    except (RuntimeError, MemoryError) as e:
+        if not _is_oom(e):
+            raise
+        return None
+    finally:
+        optimizer.zero_grad(set_to_none=True)
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+
+def find_max_batch(net, imgsz, device, budget, amp=True, start=8, max_batch=512, multiple=8):
+    """
+    batch 從 start 開始加倍，直到記憶體不足或超過 budget，再以二分法在最後一個可行與第一個不可行之間細找
+    (batch 取 multiple 的倍數)。
+
+    Returns:
+        (最大可行 batch, {batch: {"peak_mb", "step_s", "images_per_sec"} 或 None})
+    """
+    probes = {}
+
+    def fits(batch):
+        result = probe_step(net, batch, imgsz, device, amp)
+        if result is None:
+            probes[batch] = None
+            print(f"   batch {batch:4d}: ❌ 記憶體不足")
+            return False
+        peak, step = result
+        probes[batch] = {"peak_mb": round(peak / 2 ** 20, 1), "step_s": round(step, 4),
+                         "images_per_sec": round(batch / step, 1)}
+        ok = peak <= budget
+        print(f"   batch {batch:4d}: {peak / 2 ** 20:9.1f} MB, {step:.3f} 秒/步, {batch / step:7.1f} 張/秒"
+              f"{'' if ok else ' ⚠️ 超過預算'}")
+        return ok
+
+    good, bad = 0, None
+    batch = start
+    while batch <= max_batch:
+        if not fits(batch):
+            bad = batch
+            break
+        good = batch
+        batch *= 2
+    if bad is not None:
+        while bad - good > multiple:
+            mid = (good + bad) // 2 // multiple * multiple
+            if mid <= good:
+                break
+            if fits(mid):
+                good = mid
+            else:
+                bad = mid
+    return good, probes
+
+def autotune(model_path, image_sizes=(256, 480, 640), device=None, amp=True, memory_fraction=0.8,
+             record_path=AUTOTUNE_RECORD, max_batch=512):
+    """
+    在目前的裝置上對每個 imgsz 找出不超過 記憶體 * memory_fraction (其餘留給 dataloader 與碎片) 的最大 batch，
+    結果寫入 record_path，train.py 以 tuned_batch 讀取。
+    """
+    device = torch.device(device or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+    net = copy.deepcopy(YOLOv10(model_path).model).to(device).train()
+    net.args = get_cfg()  # loss 需要 box / cls / dfl 等超參數
+    for p in net.parameters():
+        p.requires_grad_(True)
+
+    budget = memory_budget(device, memory_fraction)
+    name = torch.cuda.get_device_name(device) if device.type == "cuda" else "cpu"
+    print(f"ℹ️ 裝置 {name}，記憶體預算 {budget / 2 ** 20:.0f} MB (比例 {memory_fraction})，amp={amp}")
+
+    results = {}
+    for imgsz in image_sizes:
+        print(f"\n📊 imgsz={imgsz}")
+        batch, probes = find_max_batch(net, imgsz, device, budget, amp, max_batch=max_batch)
+        results[str(imgsz)] = {"batch": batch, "probes": {str(b): p for b, p in sorted(probes.items())}}
+        if batch:
+            print(f"✅ imgsz={imgsz}: batch={batch}")
+        else:
+            print(f"❌ imgsz={imgsz}: 連最小的 batch 都超過預算")
+
+    record = {}
+    if os.path.exists(record_path):
+        with open(record_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    key = record_key(model_path, name, amp)
+    entry = record.get(key, {})
+    if entry.get("memory_fraction") != memory_fraction:
+        entry = {}
+    entry.update(model_path=os.path.abspath(model_path), memory_fraction=memory_fraction,
+                 budget_mb=round(budget / 2 ** 20))
+    entry.setdefault("imgsz", {}).update(results)
+    record[key] = entry
+    os.makedirs(os.path.dirname(record_path) or ".", exist_ok=True)
+    with open(record_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 結果已寫入 {record_path} ({key})")
+    return {int(k): v["batch"] for k, v in results.items()}
+
+def tuned_batch(model_path, imgsz, device=None, amp=True, memory_fraction=0.8, record_path=AUTOTUNE_RECORD):
+    """回傳這個權重 / 裝置 / imgsz 已量測的最大 batch；沒有紀錄時先執行 autotune。"""
+    device = torch.device(device or ("cuda:0" if torch.cuda.is_available() else "cpu"))
+    name = torch.cuda.get_device_name(device) if device.type == "cuda" else "cpu"
+    key = record_key(model_path, name, amp)
+    entry = None
+    if os.path.exists(record_path):
+        with open(record_path, "r", encoding="utf-8") as f:
+            entry = json.load(f).get(key)
+    if entry and entry["memory_fraction"] == memory_fraction and str(imgsz) in entry["imgsz"]:
+        batch = entry["imgsz"][str(imgsz)]["batch"]
+    else:
+        batch = autotune(model_path, (imgsz,), device, amp, memory_fraction, record_path)[imgsz]
+    if not batch:
+        raise RuntimeError(f"imgsz={imgsz} 在 {name} 上連 batch=8 都超過記憶體預算")
+    return batch
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'runs/detect/train30/weights/best.pt'
+    image_sizes = [256, 480, 640]
+    device = None           # None: 有 GPU 用 GPU，否則 CPU
+    memory_fraction = 0.8   # 只用到 80% 的記憶體，其餘留給 dataloader 與記憶體碎片
+
+    autotune(model_weight, image_sizes, device=device, memory_fraction=memory_fraction)
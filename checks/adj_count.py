@@ -1,36 +1,26 @@
 import os
-import xml.etree.ElementTree as ET
+import sys
 from collections import Counter, defaultdict
 import random
 
+# 共用的標註索引位於 transfers/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+from annotation_index import AnnotationIndex
+
 # 設定資料夾路徑
 xml_folder = './../../SIXray_YOLO/xml_all'
 
 category_counter = Counter()         # 原本統計違禁品總數量
 category_image_counter = Counter()   # 統計有該種類違禁品的圖片數量
 objects_per_image_counter = Counter()
-xml_files = [f for f in os.listdir(xml_folder) if f.endswith('.xml')]
-image_objects = {}
-
-for xml_file in xml_files:
-    tree = ET.parse(os.path.join(xml_folder, xml_file))
-    root = tree.getroot()
-    objects = root.findall('object')
-    names = []
-    for obj in objects:
-        name_tag = obj.find('name')
-        if name_tag is not None and name_tag.text is not None:
-            names.append(name_tag.text)
-    for name in names:
-        category_counter[name] += 1
-    # 統計有該種類違禁品的圖片數量
-    unique_names = set(names)
-    for name in unique_names:
-        category_image_counter[name] += 1
 
-    obj_count = len(names)
-    objects_per_image_counter[obj_count] += 1
-    image_objects[xml_file] = names
+# 從標註索引讀取 (第一次執行時會解析所有 XML 並建立索引)
+index = AnnotationIndex.load_or_build(xml_folder)
+category_counter.update(index.class_counts())
+# 統計有該種類違禁品的圖片數量
+category_image_counter.update(index.image_class_counts())
+objects_per_image_counter.update(index.objects_per_image().tolist())
+image_objects = {image_id + '.xml': names for image_id, names in index.names_per_image().items()}
 
 print("各種類違禁品總數量:")
 for k, v in category_counter.items():
@@ -74,13 +64,5 @@ print(f"訓練集: {len(train_files)} 張")
 print(f"驗證集: {len(val_files)} 張")
 print(f"測試集: {len(test_files)} 張")
 
-for xml_file in xml_files:
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-    objects = root.findall('object')
-
-    # 過濾 None 或沒有 name 的物件
-    names = [obj.find('name').text for obj in objects if obj.find('name') is not None]
-
-    if len(names) == 0:
-        print("0個違禁品:", xml_file)
+for image_id in index.empty_images():
+    print("0個違禁品:", image_id + '.xml')
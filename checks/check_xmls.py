@@ -1,6 +1,13 @@
 import os
+import sys
+from collections import defaultdict
 from pathlib import Path
 
+# 共用的 XML 讀取模組位於 transfers/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+from voc_reader import (read_voc, default_backend, STATUS_PARSE_ERROR, STATUS_NO_SIZE, STATUS_BAD_SIZE,
+                        BOX_MISSING, BOX_BAD_COORDS)
+
 def find_missing_xmls(xml_dir, start_num, end_num, prefix="P", padding=5):
     """
     檢查指定目錄中 Pxxxx.xml 檔案序列是否有缺失。
@@ -40,6 +47,52 @@ def find_missing_xmls(xml_dir, start_num, end_num, prefix="P", padding=5):
     else:
         print(f"\n🎉 恭喜！{prefix} 系列 XML 檔案 ({end_num} 個) 序列完整，沒有發現缺失。")
 
+def check_xml_contents(xml_dir, prefix="P", backend=None):
+    """
+    逐一讀取 XML 內容，檢查是否能解析、<size> 是否正確、以及每個物件的 <name>/<bndbox>。
+
+    Args:
+        xml_dir (Path): 存放所有 XML 檔案的目錄路徑。
+        prefix (str): 只檢查此前綴開頭的檔案。
+        backend (str): voc_reader 的解析後端 (None 表示自動選擇)。
+    """
+
+    if not xml_dir.is_dir():
+        print(f"❌ 錯誤：找不到 XML 資料夾: {xml_dir.resolve()}。請確認路徑設定是否正確。")
+        return
+
+    xml_files = sorted(xml_dir.glob(f"{prefix}*.xml"))
+    print(f"--- 開始檢查 {len(xml_files)} 個 XML 的內容 (解析後端: {backend or default_backend()}) ---")
+
+    # 問題類型 -> 檔名列表
+    issues = defaultdict(list)
+    for xml_file in xml_files:
+        ann = read_voc(xml_file, backend)
+        if ann.status == STATUS_PARSE_ERROR:
+            issues["無法解析"].append(xml_file.name)
+            continue
+        if ann.status == STATUS_NO_SIZE:
+            issues["缺少 <size>"].append(xml_file.name)
+        elif ann.status == STATUS_BAD_SIZE:
+            issues["<size> 內容有問題"].append(xml_file.name)
+
+        if not ann.names:
+            issues["沒有任何 <object>"].append(xml_file.name)
+        if any(name is None for name in ann.names):
+            issues["<object> 名稱為空"].append(xml_file.name)
+        if (ann.box_status == BOX_MISSING).any():
+            issues["<object> 沒有 bndbox"].append(xml_file.name)
+        if (ann.box_status == BOX_BAD_COORDS).any():
+            issues["bndbox 座標有問題"].append(xml_file.name)
+
+    if issues:
+        for issue, filenames in issues.items():
+            print(f"\n🔴 {issue}: {len(filenames)} 個檔案")
+            for filename in filenames:
+                print(f"    - {filename}")
+    else:
+        print(f"\n🎉 恭喜！{len(xml_files)} 個 XML 內容皆正確。")
+
 
 if __name__ == "__main__":
     
@@ -59,4 +112,7 @@ if __name__ == "__main__":
         xml_dir=XML_ALL_DIR,
         start_num=START_NUMBER,
         end_num=END_NUMBER
-    )
\ No newline at end of file
+    )
+
+    # 4. 檢查 XML 內容
+    check_xml_contents(XML_ALL_DIR)
\ No newline at end of file
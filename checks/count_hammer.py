@@ -1,7 +1,12 @@
 # save as check_annotations.py
 import os
 import shutil
-import xml.etree.ElementTree as ET
+import sys
+
+# 共用的標註索引位於 transfers/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+from annotation_index import AnnotationIndex
+from voc_reader import STATUS_PARSE_ERROR
 
 # These routes are written in old pc
 xml_dir = "./../SIXray/positive-Annotation"    # 改成你的 xml 資料夾
@@ -15,35 +20,22 @@ empty_xmls = []
 hammer_xmls = []
 other_issue_xmls = []
 
-def get_image_filename_from_xml(root):
-    fn_tag = root.find('filename')
-    if fn_tag is not None and fn_tag.text:
-        return fn_tag.text.strip()
-    return None
+# 從標註索引讀取 (第一次執行時會解析所有 XML 並建立索引)
+index = AnnotationIndex.load_or_build(xml_dir)
 
-for fname in sorted(os.listdir(xml_dir)):
-    if not fname.endswith('.xml'):
-        continue
-    xml_path = os.path.join(xml_dir, fname)
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-    except Exception as e:
-        other_issue_xmls.append((xml_path, f"parse_error:{e}"))
+for image_i, image_id in enumerate(index.image_ids.tolist()):
+    xml_path = os.path.join(xml_dir, image_id + '.xml')
+    if index.status[image_i] == STATUS_PARSE_ERROR:
+        other_issue_xmls.append((xml_path, "parse_error"))
         continue
 
-    objects = root.findall('object')
-    names = []
-    for obj in objects:
-        name_tag = obj.find('name')
-        if name_tag is not None and name_tag.text:
-            names.append(name_tag.text.strip())
+    names = [n.strip() for n in index.object_names(image_id) if n]
 
     # 空標註
     if len(names) == 0:
         empty_xmls.append(xml_path)
         # 嘗試把對應影像複製過去 review folder，方便你手動打開看
-        img_name = get_image_filename_from_xml(root)
+        img_name = str(index.filenames[image_i]) or None
         if img_name:
             # 如果 xml filename 是 P00001.xml 但 image 存 P00001.jpg
             img_path = os.path.join(img_dir, img_name)
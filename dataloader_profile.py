@@ -0,0 +1,208 @@
+import csv
+import json
+import os
+import time
+
+import torch
+from ultralytics.cfg import get_cfg
+from ultralytics.data.build import PIN_MEMORY, InfiniteDataLoader, build_yolo_dataset, seed_worker
+from ultralytics.data.utils import check_det_dataset
+from ultralytics.models.yolov10.train import YOLOv10DetectionTrainer
+
+SWEEP_RECORD = "training_record/dataloader_sweep.json"
+STEP_COLUMNS = ("epoch", "step", "data_wait_s", "h2d_s", "compute_s", "load_s", "augment_s")
+
+class ProfiledDataset:
+    """
+    包住 ultralytics 的 dataset，在 worker 中量測每個樣本的讀圖 (get_image_and_label) 與增強 (transforms) 時間，
+    放在樣本的 t_load / t_augment 欄位 (collate 後為 tuple)。mosaic 讀取其他圖片的時間算在增強內。
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getattr__(self, name):
+        if name == "dataset":  # 還原 pickle 時尚未設定
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        t0 = time.perf_counter()
+        label = self.dataset.get_image_and_label(index)
+        t1 = time.perf_counter()
+        sample = self.dataset.transforms(label)
+        sample["t_load"] = t1 - t0
+        sample["t_augment"] = time.perf_counter() - t1
+        return sample
+
+def build_loader(dataset, batch_size, workers, prefetch_factor=2, shuffle=True, seed=0):
+    """與 ultralytics build_dataloader 相同 (單 GPU)，但可以設定 prefetch_factor。"""
+    generator = torch.Generator()
+    generator.manual_seed(6148914691236517205 + seed)
+    workers = min(os.cpu_count() or 1, workers)
+    return InfiniteDataLoader(
+        dataset=dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        num_workers=workers,
+        pin_memory=PIN_MEMORY,
+        collate_fn=getattr(dataset, "collate_fn", None),
+        worker_init_fn=seed_worker,
+        generator=generator,
+        prefetch_factor=prefetch_factor if workers else None,
+    )
+
+def _sync(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+def profiled_trainer(prefetch_factor=2, profile=True, base=YOLOv10DetectionTrainer):
+    """
+    回傳可設定 prefetch_factor 的 trainer 類別；profile=True 時記錄每一步的
+    等待資料、host-to-device 複製、計算時間與 worker 端的讀圖 / 增強時間，
+    寫到 results.csv 旁的 dataloader_steps.csv (每步) 與 dataloader_profile.csv (每個 epoch)。
+    (量測時每步會同步 GPU，吞吐量會略低於正常訓練。)
+    """
+
+    class ProfiledTrainer(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.step_times = []
+            if profile:
+                self.add_callback("on_train_epoch_start", lambda trainer: trainer._mark())
+                self.add_callback("on_train_batch_start", lambda trainer: trainer._batch_start())
+                self.add_callback("on_train_batch_end", lambda trainer: trainer._batch_end())
+                self.add_callback("on_train_epoch_end", lambda trainer: trainer._write_profile())
+
+        def get_dataloader(self, dataset_path, batch_size=16, rank=0, mode="train"):
+            if mode != "train":
+                return super().get_dataloader(dataset_path, batch_size, rank, mode)
+            dataset = self.build_dataset(dataset_path, mode, batch_size)
+            if profile:
+                dataset = ProfiledDataset(dataset)
+            shuffle = not getattr(dataset, "rect", False)
+            return build_loader(dataset, batch_size, self.args.workers, prefetch_factor, shuffle, self.args.seed)
+
+        def _mark(self):
+            _sync(self.device)
+            self.t_mark = time.perf_counter()
+
+        def _batch_start(self):
+            now = time.perf_counter()
+            self.current = {"data_wait_s": now - self.t_mark, "h2d_s": 0.0, "load_s": 0.0, "augment_s": 0.0}
+            self.t_batch = now
+
+        def preprocess_batch(self, batch):
+            if not profile:
+                return super().preprocess_batch(batch)
+            self.current["load_s"] = sum(batch.pop("t_load", ()))
+            self.current["augment_s"] = sum(batch.pop("t_augment", ()))
+            _sync(self.device)
+            t0 = time.perf_counter()
+            batch = super().preprocess_batch(batch)
+            _sync(self.device)
+            self.current["h2d_s"] = time.perf_counter() - t0
+            return batch
+
+        def _batch_end(self):
+            self._mark()
+            self.current["compute_s"] = self.t_mark - self.t_batch - self.current["h2d_s"]
+            self.step_times.append({"epoch": self.epoch + 1, "step": len(self.step_times), **self.current})
+
+        def _write_profile(self):
+            steps = [s for s in self.step_times if s["epoch"] == self.epoch + 1]
+            if not steps:
+                return
+            steps_path = os.path.join(self.save_dir, "dataloader_steps.csv")
+            new_file = not os.path.exists(steps_path)
+            with open(steps_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=STEP_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows({k: round(v, 6) if isinstance(v, float) else v for k, v in s.items()} for s in steps)
+
+            total = {k: sum(s[k] for s in steps) for k in STEP_COLUMNS[2:]}
+            step_time = total["data_wait_s"] + total["h2d_s"] + total["compute_s"]
+            summary = {"epoch": self.epoch + 1, "steps": len(steps), **{k: round(v, 3) for k, v in total.items()},
+                       "data_bound_fraction": round(total["data_wait_s"] / max(step_time, 1e-9), 4)}
+            summary_path = os.path.join(self.save_dir, "dataloader_profile.csv")
+            new_file = not os.path.exists(summary_path)
+            with open(summary_path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(summary))
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(summary)
+            print(f"📊 epoch {summary['epoch']}: 等待資料 {summary['data_bound_fraction']:.1%} "
+                  f"(等待 {total['data_wait_s']:.1f} 秒, 複製 {total['h2d_s']:.1f} 秒, 計算 {total['compute_s']:.1f} 秒)")
+            self.step_times = []
+
+    return ProfiledTrainer
+
+def loader_throughput(dataset, batch_size, workers, prefetch_factor, batches=50, warmup=5):
+    """只跑 dataloader (不訓練)，回傳每秒可產生的圖片數。"""
+    loader = build_loader(dataset, batch_size, workers, prefetch_factor)
+    iterator = iter(loader)
+    for _ in range(warmup):
+        next(iterator)
+    start = time.perf_counter()
+    for _ in range(batches):
+        next(iterator)
+    elapsed = time.perf_counter() - start
+    del iterator, loader
+    return batches * batch_size / elapsed
+
+def sweep_workers(data_yaml, imgsz=256, batch_size=128, worker_options=(0, 2, 4, 8, 12, 16),
+                  prefetch_options=(2, 4, 8), batches=50, compute_images_per_sec=None, tolerance=0.95,
+                  record_path=SWEEP_RECORD):
+    """
+    對 workers / prefetch_factor 的組合量測 dataloader 吞吐量 (含 mosaic 等訓練增強)，
+    選出吞吐量達最佳值 tolerance 比例內、workers 與 prefetch 最少 (記憶體最省) 的設定。
+    compute_images_per_sec (例如 batch_autotune.py 量到的 張/秒) 有設定時，一併判斷訓練會不會卡在資料。
+    """
+    cfg = get_cfg(overrides={"data": data_yaml, "imgsz": imgsz})
+    data = check_det_dataset(data_yaml)
+    dataset = build_yolo_dataset(cfg, data["train"], batch_size, data, mode="train")
+    print(f"ℹ️ {len(dataset)} 張訓練圖片，imgsz={imgsz}，batch={batch_size}，CPU 核心數 {os.cpu_count()}")
+
+    results = []
+    for workers in worker_options:
+        for prefetch in prefetch_options if workers else (None,):
+            speed = loader_throughput(dataset, batch_size, workers, prefetch, batches)
+            results.append({"workers": workers, "prefetch_factor": prefetch, "images_per_sec": round(speed, 1)})
+            print(f"   workers={workers:2d}, prefetch={prefetch or '-':>2}: {speed:8.1f} 張/秒")
+
+    best = max(r["images_per_sec"] for r in results)
+    choice = min((r for r in results if r["images_per_sec"] >= best * tolerance),
+                 key=lambda r: (r["workers"], r["prefetch_factor"] or 0))
+    print(f"\n✅ 建議 workers={choice['workers']}, prefetch_factor={choice['prefetch_factor']} "
+          f"({choice['images_per_sec']} 張/秒，最佳 {best} 張/秒)")
+    if compute_images_per_sec:
+        if choice["images_per_sec"] < compute_images_per_sec:
+            print(f"⚠️ dataloader ({choice['images_per_sec']} 張/秒) 比模型計算 ({compute_images_per_sec} 張/秒) 慢，訓練會卡在資料")
+        else:
+            print(f"ℹ️ dataloader 比模型計算 ({compute_images_per_sec} 張/秒) 快，訓練以計算為瓶頸")
+
+    record = {}
+    if os.path.exists(record_path):
+        with open(record_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    record[f"imgsz={imgsz}|batch={batch_size}"] = {"choice": choice, "results": results, "cpu_count": os.cpu_count()}
+    os.makedirs(os.path.dirname(record_path) or ".", exist_ok=True)
+    with open(record_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"📝 結果已寫入 {record_path}")
+    return choice
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    dataset_path = "./../SIXray_YOLO/dataset.yaml"
+    image_size = 256
+    batch_size = 128
+    worker_options = [0, 2, 4, 8, 12, 16]
+    prefetch_options = [2, 4, 8]
+
+    sweep_workers(dataset_path, imgsz=image_size, batch_size=batch_size,
+                  worker_options=worker_options, prefetch_options=prefetch_options)
@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import random
+import tarfile
+import time
+
+import cv2
+import numpy as np
+from torch.utils.data import IterableDataset, get_worker_info
+from tqdm import tqdm
+
+from image_cache import dataset_image_files
+
+# shard 的轉換與讀取速度量測工具：train.py 與各 trainer 目前都不使用 shard 訓練
+# (ultralytics 的 mosaic 等增強需要隨機存取的 YOLODataset，ShardStream 是循序串流，無法直接接上)。
+# 每個樣本在 tar 中是兩個相鄰的成員：<key>.<圖片副檔名> 與 <key>.txt (YOLO 標註，負樣本為空檔)
+LABEL_EXT = ".txt"
+
+def label_path_for(image_path):
+    """與 ultralytics 相同的規則：路徑中最後一個 /images/ 換成 /labels/，副檔名換成 .txt。"""
+    sa, sb = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    head, sep, tail = image_path.rpartition(sa)
+    return os.path.splitext((head + sb + tail) if sep else image_path)[0] + LABEL_EXT
+
+def parse_labels(data):
+    """YOLO 標註文字 -> (N, 5) float32 (class cx cy w h)。"""
+    rows = [line.split() for line in data.decode("utf-8").splitlines() if line.strip()]
+    return np.array(rows, dtype=np.float32).reshape(-1, 5)
+
+def _add_member(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = 0
+    tar.addfile(info, io.BytesIO(data))
+    # 資料補齊到 512 bytes 的區塊，資料起點 = 寫完後的位置 - 補齊後的大小
+    padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+    return tar.offset - padded, len(data)
+
+def write_shards(yaml_path, out_dir, split="train", shard_mb=256, seed=42):
+    """
+    將 dataset.yaml 中 split 的圖片 (原始檔案位元組，不重新編碼) 與 YOLO 標註打包成約 shard_mb 大小的 tar：
+      out_dir/<split>-00000.tar ...      : 依 seed 打亂順序後依序寫入，每個 shard 都混合各類別
+      out_dir/<split>-00000.idx.npy ...  : (N, 4) int64，每個樣本圖片與標註在 tar 中的 (位置, 大小)，可隨機讀取
+      out_dir/<split>-index.json         : shard 列表、樣本數與大小
+    """
+    paths = dataset_image_files(yaml_path, [split])
+    random.Random(seed).shuffle(paths)
+    os.makedirs(out_dir, exist_ok=True)
+    limit = shard_mb * 2 ** 20
+
+    shards = []
+    state = {"tar": None}
+
+    def close_shard():
+        if state["tar"] is None:
+            return
+        state["tar"].close()
+        name = state["name"]
+        os.replace(os.path.join(out_dir, name + ".tmp"), os.path.join(out_dir, name))
+        np.save(os.path.join(out_dir, name.replace(".tar", ".idx.npy")), np.array(state["offsets"], dtype=np.int64))
+        shards.append({"file": name, "samples": len(state["offsets"]),
+                       "bytes": os.path.getsize(os.path.join(out_dir, name))})
+        state["tar"] = None
+
+    missing_labels = 0
+    for i, path in enumerate(tqdm(paths, desc=f"shard {split}")):
+        if state["tar"] is None:
+            name = f"{split}-{len(shards):05d}.tar"
+            state.update(name=name, offsets=[], size=0,
+                         tar=tarfile.open(os.path.join(out_dir, name + ".tmp"), "w"))
+        with open(path, "rb") as f:
+            image = f.read()
+        label_path = label_path_for(path)
+        if os.path.exists(label_path):
+            with open(label_path, "rb") as f:
+                label = f.read()
+        else:
+            label = b""
+            missing_labels += 1
+
+        key = f"{i:07d}_{os.path.splitext(os.path.basename(path))[0]}"
+        ext = os.path.splitext(path)[1].lower()
+        image_pos = _add_member(state["tar"], key + ext, image)
+        label_pos = _add_member(state["tar"], key + LABEL_EXT, label)
+        state["offsets"].append(image_pos + label_pos)
+        state["size"] += len(image) + len(label) + 2048
+        if state["size"] >= limit:
+            close_shard()
+    close_shard()
+
+    with open(os.path.join(out_dir, f"{split}-index.json"), "w", encoding="utf-8") as f:
+        json.dump({"split": split, "samples": len(paths), "seed": seed, "shards": shards}, f, ensure_ascii=False, indent=2)
+    print(f"✅ {split}: {len(paths)} 張 -> {len(shards)} 個 shard ({sum(s['bytes'] for s in shards) / 2 ** 30:.2f} GB)")
+    if missing_labels:
+        print(f"ℹ️ {missing_labels} 張沒有標註檔，視為負樣本 (空標註)")
+    return shards
+
+def load_index(shard_dir, split):
+    with open(os.path.join(shard_dir, f"{split}-index.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def iter_shard(path):
+    """以串流方式 (循序讀取，不需 seek) 讀出一個 shard，Yields: (key, 圖片位元組, 標註位元組)。"""
+    with tarfile.open(path, "r|") as tar:
+        key, image = None, None
+        for member in tar:
+            name = member.name
+            data = tar.extractfile(member).read()
+            if name.endswith(LABEL_EXT):
+                yield key, image, data
+            else:
+                key, image = os.path.splitext(name)[0], data
+
+def read_sample(shard_dir, shard_file, row):
+    """以 .idx.npy 中的位置直接讀出單一樣本 (不需掃過整個 tar)。"""
+    offsets = np.load(os.path.join(shard_dir, shard_file.replace(".tar", ".idx.npy")), mmap_mode="r")
+    image_pos, image_size, label_pos, label_size = (int(v) for v in offsets[row])
+    with open(os.path.join(shard_dir, shard_file), "rb") as f:
+        f.seek(image_pos)
+        image = f.read(image_size)
+        f.seek(label_pos)
+        label = f.read(label_size)
+    return image, label
+
+class ShardStream(IterableDataset):
+    """
+    串流讀取 write_shards 產生的 shard：
+      - shard 層級：每個 epoch 依 (seed, epoch) 打亂 shard 順序，再平均分給各 dataloader worker
+      - buffer 層級：以 shuffle_buffer 個樣本的緩衝區隨機輸出
+    每個 shard 從頭到尾循序讀取，適合 HDD 與網路磁碟。
+    只輸出原始樣本 (沒有縮放與增強)，供 benchmark_reads 或自行撰寫的訓練流程使用，不會接到 ultralytics 的 trainer。
+
+    Yields:
+        (key, BGR 影像 (decode=False 時為原始位元組), 標註 (N, 5) float32)
+    """
+
+    def __init__(self, shard_dir, split="train", shuffle_buffer=1000, seed=0, decode=True):
+        super().__init__()
+        self.shard_dir = shard_dir
+        self.index = load_index(shard_dir, split)
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.decode = decode
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __len__(self):
+        return self.index["samples"]
+
+    def _shards(self):
+        shards = [s["file"] for s in self.index["shards"]]
+        random.Random(self.seed + self.epoch).shuffle(shards)
+        worker = get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id::worker.num_workers]
+        return shards
+
+    def _samples(self):
+        for shard in self._shards():
+            for key, image, label in iter_shard(os.path.join(self.shard_dir, shard)):
+                if self.decode:
+                    image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+                    if image is None:
+                        print(f"⚠️ 無法解碼 {shard}:{key}")
+                        continue
+                yield key, image, parse_labels(label)
+
+    def __iter__(self):
+        worker = get_worker_info()
+        rng = random.Random(self.seed * 1000003 + self.epoch * 1009 + (worker.id if worker else 0))
+        buffer = []
+        for sample in self._samples():
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            i = rng.randrange(len(buffer))
+            yield buffer[i]
+            buffer[i] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+def benchmark_reads(yaml_path, shard_dir, split="train", limit=5000):
+    """比較逐檔讀取 (圖片 + 標註) 與循序讀取 shard 的速度 (只讀位元組，不解碼)。"""
+    paths = dataset_image_files(yaml_path, [split])[:limit]
+    start = time.perf_counter()
+    total = 0
+    for path in paths:
+        with open(path, "rb") as f:
+            total += len(f.read())
+        label_path = label_path_for(path)
+        if os.path.exists(label_path):
+            with open(label_path, "rb") as f:
+                total += len(f.read())
+    files_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    count = shard_total = 0
+    for sample in ShardStream(shard_dir, split, shuffle_buffer=1000, decode=False):
+        shard_total += len(sample[1])
+        count += 1
+        if count >= len(paths):
+            break
+    shard_time = time.perf_counter() - start
+
+    print(f"📊 逐檔讀取: {len(paths) / files_time:8.1f} 張/秒 ({total / 2 ** 20 / files_time:.1f} MB/s)")
+    print(f"📊 shard 讀取: {count / shard_time:8.1f} 張/秒 ({shard_total / 2 ** 20 / shard_time:.1f} MB/s)")
+    print("ℹ️ 作業系統的檔案快取會影響結果，請在清除快取或重新開機後測試")
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    dataset_path = "./../SIXray_YOLO/dataset.yaml"
+    shard_dir = "./../SIXray_YOLO/shards"
+    splits = ["train", "val"]
+    shard_mb = 256   # 每個 shard 約多大
+
+    for split in splits:
+        write_shards(dataset_path, shard_dir, split=split, shard_mb=shard_mb)
+    benchmark_reads(dataset_path, shard_dir, split="train")
@@ -1,68 +1,234 @@
 import os
-from ultralytics import YOLOv10
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def detect_all_folders(source_root, output_root, model_path):
+import cv2
+
+from detection_ledger import DetectionLedger
+from detection_output import ResultWriter, image_id_for, keyed_records_path
+from model_backends import load_model, resolve_backend
+from prefilter import load_threshold, screen_and_detect
+from tiling import check_tiling, predict_tiled
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+def list_images(source_root, subfolders):
+    """依資料夾順序列出所有圖片，回傳 [(資料夾名稱, 圖片路徑), ...]。"""
+    items = []
+    for folder_name in subfolders:
+        folder = os.path.join(source_root, folder_name)
+        for fn in sorted(os.listdir(folder)):
+            if fn.lower().endswith(IMAGE_EXTS):
+                items.append((folder_name, os.path.join(folder, fn)))
+    return items
+
+def prefetch_batches(items, batch_size, loaders=4, prefetch=4):
+    """
+    背景執行緒以 loaders 個執行緒解碼圖片，組成 batch 後放入佇列 (最多預先準備 prefetch 個 batch)，
+    讓圖片解碼與模型推論同時進行。
+
+    Yields:
+        [(資料夾名稱, 圖片路徑, BGR 影像或 None), ...]
+    """
+    batches = queue.Queue(maxsize=prefetch)
+    done = object()
+
+    def produce():
+        try:
+            with ThreadPoolExecutor(max_workers=loaders) as pool:
+                for i in range(0, len(items), batch_size):
+                    chunk = items[i:i + batch_size]
+                    images = pool.map(cv2.imread, [path for _, path in chunk])
+                    batches.put([(folder, path, im) for (folder, path), im in zip(chunk, images)])
+        except Exception as e:
+            batches.put(e)
+        batches.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        batch = batches.get()
+        if batch is done:
+            return
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
+def detect_all_folders(source_root, output_root, model_path, batch_size=16, imgsz=640, conf=0.25,
+                       device=None, loaders=4, prefetch=4, render=True, records_path=None, render_workers=4,
+                       resume=False, chunk_size=500, backend="pytorch", tile_size=None, tile_overlap=0.2,
+                       tile_merge="nms", prefilter_recall=None, prefilter_imgsz=256, subfolders=None):
     """
     遍歷 source_root 下的所有子資料夾，使用 YOLOv10 進行偵測，
     並將結果依據資料夾名稱存入 output_root。
+
+    模型只載入一次；所有資料夾的圖片串流成同一個 batch 序列，
+    由背景執行緒預先解碼，結果交給 ResultWriter 在背景輸出。
+
+    Args:
+        render: 是否繪製並存出標註圖片 (由 render_workers 個執行緒處理)。
+        records_path: 偵測結果輸出路徑 (.jsonl 或 .parquet)；None 表示不輸出。
+                      實際的檔名會加上完成紀錄的代碼 (detections.<key>.jsonl)，每筆紀錄也帶有 run_key，
+                      換了權重或設定時不會與先前的結果混在同一個檔案。
+        resume: 接續中斷的工作：略過完成紀錄中 (相同權重雜湊與 conf / imgsz) 已處理的圖片，
+                偵測紀錄改為附加。每 chunk_size 張圖寫入一次完成紀錄。
+        backend: "pytorch"、"onnx"、"torchscript" 或 "auto" (依 model_backends.py 的測速結果選最快的)。
+        tile_size: 切片推論 (大張 X 光圖中的小物件)：每張圖切成 tile_size 的重疊切片 (重疊比例 tile_overlap)，
+                   與整張圖一起送進模型，再以 tile_merge ("nms" 或 "wbf") 合併；None 表示不切片。
+        prefilter_recall: 負樣本預先篩選：先以 prefilter_imgsz 的低解析度跑同一個模型，
+                          分數低於 prefilter.py 校正出的門檻 (保證正樣本 recall) 的圖片不做完整偵測；None 表示不篩選。
+        subfolders: 只處理 source_root 下的這些子資料夾 (例如 ["JPEGImages"])；None 表示全部。
+
+    Returns:
+        實際寫出的偵測紀錄路徑 (加上代碼後)；沒有輸出紀錄時為 None。
     """
-    
-    # 1. 載入模型
-    print(f"正在載入模型: {model_path} ...")
-    try:
-        model = YOLOv10.from_pretrained(model_path)
-    except Exception as e:
-        # 如果 from_pretrained 失敗，嘗試標準載入方式 (視你的安裝版本而定)
-        print(f"from_pretrained 載入失敗，嘗試直接載入: {e}")
-        model = YOLOv10(model_path)
+    if tile_size:
+        check_tiling(tile_size, tile_overlap)  # 設定錯誤時在載入模型前就停止
+
+    # 1. 載入模型 (依 backend 選擇 .pt 或匯出的 ONNX / TorchScript)
+    backend, weights = resolve_backend(model_path, backend, imgsz)
+    print(f"ℹ️ 推論後端: {backend}")
+    model = load_model(weights)
 
     # 確保輸出資料夾存在
     if not os.path.exists(output_root):
         os.makedirs(output_root)
 
-    # 2. 取得所有子資料夾 (例如 Gun, Knife...)
-    subfolders = [d for d in os.listdir(source_root) if os.path.isdir(os.path.join(source_root, d))]
-    
-    print(f"找到 {len(subfolders)} 個資料夾，準備開始偵測...\n")
+    # 2. 取得所有子資料夾 (例如 Gun, Knife...) 與其中的圖片
+    if subfolders is None:
+        subfolders = sorted(d for d in os.listdir(source_root) if os.path.isdir(os.path.join(source_root, d)))
+    items = list_images(source_root, subfolders)
 
-    # 3. 逐一偵測
-    for folder_name in subfolders:
-        # 建構完整的來源路徑，例如 .../My_Selected_Images/Gun
-        current_source = os.path.join(source_root, folder_name)
-        
-        print(f"--- 正在偵測: {folder_name} ---")
-        
-        # 執行預測
-        # project: 輸出的主目錄
-        # name: 輸出的子目錄 (這裡設定為資料夾名稱，例如 Gun)
-        # exist_ok=True: 如果資料夾已存在，不要建立 Gun2, Gun3，直接寫入
-        model.predict(
-            source=current_source,
-            save=True,
-            project=output_root,
-            name=folder_name,
-            exist_ok=True,
-            conf=0.25,
-            imgsz=640
-        )
+    print(f"找到 {len(subfolders)} 個資料夾、{len(items)} 張圖片，準備開始偵測 (batch={batch_size}, device={device or 'auto'})...\n")
 
+    # 完成紀錄：非接續模式時重新開始
+    settings = {"backend": backend}
+    if tile_size:
+        settings.update(tile=tile_size, tile_overlap=tile_overlap, tile_merge=tile_merge)
+        print(f"ℹ️ 切片推論: {tile_size}px，重疊 {tile_overlap:.0%}，合併方式 {tile_merge}")
+    if prefilter_recall is not None:
+        threshold = load_threshold(weights, prefilter_recall, prefilter_imgsz)
+        settings.update(prefilter_recall=prefilter_recall, prefilter_imgsz=prefilter_imgsz)
+        print(f"ℹ️ 預先篩選: imgsz={prefilter_imgsz}，門檻 {threshold:.4f} (正樣本 recall {prefilter_recall})")
+    ledger = DetectionLedger(output_root, weights, conf, imgsz, reset=not resume, **settings)
+    if records_path:
+        records_path = keyed_records_path(records_path, ledger.key)
+        if len(ledger) and not os.path.exists(records_path):
+            # 完成紀錄中的圖片沒有這份偵測紀錄 (例如先前沒有輸出紀錄或換了格式)，全部重做
+            print(f"⚠️ 找不到 {records_path}，完成紀錄 {ledger.key} 重新開始")
+            ledger = DetectionLedger(output_root, weights, conf, imgsz, reset=True, **settings)
+    if resume:
+        total = len(items)
+        items = [(folder, path) for folder, path in items if image_id_for(folder, path) not in ledger]
+        print(f"ℹ️ 接續偵測 (紀錄 {ledger.key})：略過 {total - len(items)} 張已完成的圖片，剩餘 {len(items)} 張\n")
+
+    if not render and not records_path:
+        print("⚠️ render=False 且沒有設定 records_path，偵測結果不會被儲存")
+
+    # 3. 串流偵測 (完成紀錄是空的時候偵測紀錄也從頭寫，確保兩者一致)
+    writer = ResultWriter(output_root, render=render, records_path=records_path, names=model.names,
+                          render_workers=render_workers, ledger=ledger, append=len(ledger) > 0, chunk_size=chunk_size)
+    processed = unreadable = skipped = 0
+    infer_time = prefilter_time = full_time = 0.0
+    start = time.perf_counter()
+
+    def detect(images):
+        if tile_size:
+            return predict_tiled(model, images, tile=tile_size, overlap=tile_overlap,
+                                 imgsz=imgsz, conf=conf, device=device, merge=tile_merge)
+        return model.predict(source=images, conf=conf, imgsz=imgsz, device=device, verbose=False)
+
+    # 中斷 (例如 Ctrl+C) 時也要寫出已完成的部分，接續時才不必重做
+    try:
+        for batch in prefetch_batches(items, batch_size, loaders, prefetch):
+            valid = [(folder, path, im) for folder, path, im in batch if im is not None]
+            for folder, path, im in batch:
+                if im is None:
+                    unreadable += 1
+                    print(f"\n⚠️ 無法讀取圖片: {path}")
+            if not valid:
+                continue
+
+            t0 = time.perf_counter()
+            images = [im for _, _, im in valid]
+            if prefilter_recall is not None:
+                results, n_skipped, t_pre, t_full = screen_and_detect(model, images, detect, threshold,
+                                                                      prefilter_imgsz, device)
+                skipped += n_skipped
+                prefilter_time += t_pre
+                full_time += t_full
+            else:
+                results = detect(images)
+            infer_time += time.perf_counter() - t0
+
+            for (folder, path, _), result in zip(valid, results):
+                writer.submit(folder, path, result)
+            processed += len(valid)
+
+            elapsed = time.perf_counter() - start
+            print(f"\r已處理 {processed}/{len(items)} 張 ({processed / elapsed:.1f} 張/秒)", end="", flush=True)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"\n\n📊 {processed} 張圖片，總耗時 {elapsed:.1f} 秒，端到端 {processed / max(elapsed, 1e-9):.1f} 張/秒 "
+          f"(推論 {infer_time:.1f} 秒，{processed / max(infer_time, 1e-9):.1f} 張/秒)")
+    if prefilter_recall is not None and processed:
+        # 沒有篩選時每張圖都要做完整偵測：以實際完整偵測的平均耗時估計
+        detected = processed - skipped
+        print(f"📊 預先篩除 {skipped}/{processed} 張 ({skipped / processed:.1%})，篩選 {prefilter_time:.1f} 秒 + "
+              f"完整偵測 {full_time:.1f} 秒")
+        if detected:
+            estimated = full_time / detected * processed
+            print(f"📊 推論吞吐量約為不篩選時的 {estimated / max(prefilter_time + full_time, 1e-9):.2f} 倍")
+    if unreadable:
+        print(f"⚠️ {unreadable} 張圖片無法讀取，已略過")
+    if writer.errors:
+        print(f"❌ {writer.errors} 筆結果寫出失敗")
+    if records_path:
+        print(f"📝 偵測結果已寫入: {records_path}")
     print(f"\n全部完成！結果已儲存至: {output_root}")
+    return records_path
 
 if __name__ == "__main__":
     # --- 設定路徑 (請修改這裡) ---
-    
+
     # 1. 剛剛用程式抓出來的圖片資料夾 (你的來源)
     # 請填入上一一個步驟的 output_folder
     images_source_dir = "./../SIXray_YOLO/detections2"
-    
+
     # 2. 你希望偵測結果存到哪裡 (你的輸出)
     # detection_output_dir = "./../SIXray_YOLO/detection_results"
     detection_output_dir = "./../SIXray_YOLO/detection_results_n_100_2"
-    
+
     # 3. 權重檔路徑
     # model_weight = 'savemodel/yolov10n_sixray25.pt'
     model_weight = 'savemodel/yolov10n_sixray19.pt'
     # model_weight = 'runs/detect/train30/weights/best.pt'
-    
+
+    # 4. 推論設定
+    batch_size = 16      # 每次送進模型的圖片數
+    image_size = 640
+    confidence = 0.25
+    device = None        # None 為自動選擇；只有 CPU 的機器可設為 "cpu"
+    loader_threads = 4   # 解碼圖片的執行緒數
+    backend = "pytorch"  # "pytorch"、"onnx"、"torchscript" 或 "auto" (需先執行 model_backends.py 匯出並測速)
+    tile_size = None     # 例如 640：切片推論，找出小刀、剪刀等小物件 (較慢，可先用 tiling.py 評估)
+    tile_merge = "nms"   # 切片結果的合併方式："nms" 或 "wbf"
+    prefilter_recall = None  # 例如 0.99：低解析度預先篩除負樣本 (需先執行 prefilter.py 校正門檻)
+
+    # 5. 輸出設定
+    render_images = True  # False: 不繪製標註圖片，只輸出偵測框 (大量篩檢時使用)
+    render_threads = 4    # 繪製並編碼標註圖片的執行緒數
+    records_path = os.path.join(detection_output_dir, "detections.jsonl")  # 或 .parquet (需要 pyarrow)；None 表示不輸出 (檔名會加上權重與設定的代碼)
+
+    # 6. 中斷後接續：True 時只處理尚未完成的圖片 (權重或 conf / imgsz 改變時會重新開始)
+    resume = True
+
     # 執行
-    detect_all_folders(images_source_dir, detection_output_dir, model_weight)
\ No newline at end of file
+    detect_all_folders(images_source_dir, detection_output_dir, model_weight,
+                       batch_size=batch_size, imgsz=image_size, conf=confidence, device=device,
+                       loaders=loader_threads, render=render_images, records_path=records_path,
+                       render_workers=render_threads, resume=resume, backend=backend,
+                       tile_size=tile_size, tile_merge=tile_merge, prefilter_recall=prefilter_recall)
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+
+LEDGER_DIR = ".detect_ledger"
+
+def weights_hash(model_path, chunk_size=1 << 20):
+    """權重檔內容的 SHA-1 (換了權重就視為不同的偵測工作)；不是本機檔案 (例如 hub 名稱) 時雜湊名稱本身。"""
+    h = hashlib.sha1()
+    if not os.path.isfile(model_path):
+        h.update(str(model_path).encode("utf-8"))
+        return h.hexdigest()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def run_key(model_path, conf, imgsz, **settings):
+    """由權重雜湊與偵測設定 (conf / imgsz / 其他會影響結果的參數) 組成的工作代碼。"""
+    parts = [weights_hash(model_path), f"conf={conf}", f"imgsz={imgsz}"]
+    parts += [f"{k}={settings[k]}" for k in sorted(settings)]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+class DetectionLedger:
+    """
+    每張圖的完成紀錄 (append-only)，讓中斷的大量偵測可以只補做缺少的圖片。
+
+    output_root/.detect_ledger/<run_key>.ids 每行一個已完成的 image_id，
+    只在該圖的偵測紀錄與標註圖片都寫出後，才以 chunk 為單位附加並 fsync；
+    中斷時最後一行若不完整會被忽略。程序異常終止時，最後一個 chunk 的偵測紀錄可能已寫出
+    但尚未記為完成，接續時會再偵測一次，讀取偵測紀錄時請以 image_id 去除重複。
+    """
+
+    def __init__(self, output_root, model_path, conf, imgsz, reset=False, **settings):
+        self.key = run_key(model_path, conf, imgsz, **settings)
+        ledger_dir = os.path.join(output_root, LEDGER_DIR)
+        os.makedirs(ledger_dir, exist_ok=True)
+        self.path = os.path.join(ledger_dir, f"{self.key}.ids")
+
+        # 方便人工確認這份紀錄對應的設定
+        with open(os.path.join(ledger_dir, f"{self.key}.json"), "w", encoding="utf-8") as f:
+            json.dump({"model_path": str(model_path), "conf": conf, "imgsz": imgsz, **settings}, f,
+                      ensure_ascii=False, indent=2)
+
+        if reset and os.path.exists(self.path):
+            os.remove(self.path)
+        self.done = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = f.read()
+        # 只採用以換行結尾的完整行
+        return set(data[:data.rfind("\n") + 1].splitlines()) if "\n" in data else set()
+
+    def __contains__(self, image_id):
+        return image_id in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def append(self, image_ids):
+        """將一批已完成的 image_id 附加到紀錄並寫入磁碟。"""
+        if not image_ids:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{image_id}\n" for image_id in image_ids))
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(image_ids)
@@ -0,0 +1,283 @@
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 為選用套件，只有輸出 Parquet 時需要
+    pa = pq = None
+
+def _numpy(x):
+    return x.cpu().numpy() if hasattr(x, "cpu") else np.asarray(x)
+
+def extract_detections(result, image_id):
+    """
+    從 ultralytics 的 Results 取出精簡的偵測結果 (不含影像)，可直接寫入 JSONL / Parquet。
+
+    Returns:
+        dict: image_id, width, height, cls (N,), conf (N,), xyxy (N, 4)
+    """
+    boxes = result.boxes
+    height, width = result.orig_shape[:2]
+    return {
+        "image_id": image_id,
+        "width": int(width),
+        "height": int(height),
+        "cls": _numpy(boxes.cls).astype(np.int64),
+        "conf": _numpy(boxes.conf).astype(np.float32),
+        "xyxy": _numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4),
+    }
+
+def _truncate_partial_line(path, block_size=1 << 16):
+    """移除檔案結尾不完整的一行 (寫到一半就中斷時留下的)。"""
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            start = max(0, pos - block_size)
+            f.seek(start)
+            newline = f.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            pos = start
+        f.truncate(0)
+
+class JsonlWriter:
+    """每張圖一行：{"image_id", "run_key", "width", "height", "cls": [...], "conf": [...], "xyxy": [[...], ...]}。"""
+
+    def __init__(self, path, names=None, append=False):
+        if append and os.path.exists(path):
+            _truncate_partial_line(path)
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, det):
+        record = {
+            "image_id": det["image_id"],
+            "run_key": det.get("run_key"),
+            "width": det["width"],
+            "height": det["height"],
+            "cls": det["cls"].tolist(),
+            "conf": np.round(det["conf"].astype(np.float64), 4).tolist(),
+            "xyxy": np.round(det["xyxy"].astype(np.float64), 1).tolist(),
+        }
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """
+    每個偵測框一列 (image_id, run_key, cls, name, conf, x1, y1, x2, y2)。
+    沒有偵測結果的圖也會寫一列 cls = -1，確保每張圖都有紀錄。
+
+    path 為一個資料夾 (pyarrow / pandas 可直接當成一個資料集讀取)，每次 flush 寫出一個
+    part-NNNNN.parquet (先寫暫存檔再改名)，因此中斷時已寫出的 part 都是完整的，
+    接續時只需繼續新增 part。
+    """
+
+    SCHEMA_FIELDS = [("image_id", "string"), ("run_key", "string"), ("width", "int32"), ("height", "int32"), ("cls", "int16"),
+                     ("name", "string"), ("conf", "float32"),
+                     ("x1", "float32"), ("y1", "float32"), ("x2", "float32"), ("y2", "float32")]
+
+    def __init__(self, path, names=None, append=False, chunk_rows=50000):
+        if pa is None:
+            raise ImportError("輸出 Parquet 需要安裝 pyarrow (pip install pyarrow)，或改用 .jsonl")
+        self.path = path
+        self.names = names or {}
+        self.chunk_rows = chunk_rows
+        self.schema = pa.schema([(name, getattr(pa, dtype)()) for name, dtype in self.SCHEMA_FIELDS])
+
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(f for f in os.listdir(path) if f.startswith("part-") and f.endswith(".parquet"))
+        if not append:
+            for f in parts:
+                os.remove(os.path.join(path, f))
+            parts = []
+        self.next_part = int(parts[-1][5:10]) + 1 if parts else 0
+        self._reset()
+
+    def _reset(self):
+        self.columns = {name: [] for name, _ in self.SCHEMA_FIELDS}
+        self.rows = 0
+
+    def write(self, det):
+        n = len(det["cls"])
+        cls = det["cls"].tolist() if n else [-1]
+        conf = det["conf"].tolist() if n else [float("nan")]
+        xyxy = det["xyxy"] if n else np.full((1, 4), np.nan, dtype=np.float32)
+        rows = len(cls)
+
+        c = self.columns
+        c["image_id"] += [det["image_id"]] * rows
+        c["run_key"] += [det.get("run_key")] * rows
+        c["width"] += [det["width"]] * rows
+        c["height"] += [det["height"]] * rows
+        c["cls"] += cls
+        c["name"] += [self.names.get(k, "") for k in cls]
+        c["conf"] += conf
+        for i, key in enumerate(("x1", "y1", "x2", "y2")):
+            c[key] += xyxy[:, i].tolist()
+        self.rows += rows
+        if self.rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        part_path = os.path.join(self.path, f"part-{self.next_part:05d}.parquet")
+        tmp_path = part_path + ".tmp"
+        pq.write_table(pa.table(self.columns, schema=self.schema), tmp_path)
+        os.replace(tmp_path, part_path)
+        self.next_part += 1
+        self._reset()
+
+    def close(self):
+        self.flush()
+
+def image_id_for(folder_name, image_path):
+    """偵測紀錄與完成紀錄共用的圖片代碼：<資料夾>/<檔名 (不含副檔名)>。"""
+    return f"{folder_name}/{os.path.splitext(os.path.basename(image_path))[0]}"
+
+def keyed_records_path(path, key):
+    """
+    每個偵測工作 (權重與設定的代碼) 各自一份偵測紀錄：detections.jsonl -> detections.<key>.jsonl，
+    換了權重或設定時不會與先前的結果寫進同一個檔案。
+    """
+    root, ext = os.path.splitext(str(path).rstrip("/\\"))
+    return f"{root}.{key}{ext}"
+
+def open_record_writer(path, names=None, append=False):
+    """
+    依副檔名開啟 JSONL (.jsonl) 或 Parquet (.parquet 資料夾) 的偵測結果寫入器。
+    append=True (接續中斷的工作) 時保留既有的紀錄並接著寫。
+    """
+    if str(path).lower().endswith(".parquet"):
+        return ParquetWriter(path, names, append=append)
+    return JsonlWriter(path, names, append=append)
+
+class ResultWriter:
+    """
+    推論迴圈之外的輸出階段：
+      - records_path: 以背景執行緒將偵測結果寫成 JSONL / Parquet
+      - render=True : 以 render_workers 個執行緒繪製偵測框並編碼存檔 (最多 max_pending 張等待中)
+      - ledger      : 一張圖的紀錄與標註圖片都寫出後才算完成，
+                      每 chunk_size 張先 flush 偵測紀錄，再附加到完成紀錄
+    render=False 時完全不繪圖，只保留偵測框，適合大量篩檢。
+    """
+
+    def __init__(self, output_root, render=True, records_path=None, names=None, render_workers=4, max_pending=64,
+                 ledger=None, append=False, chunk_size=500):
+        self.output_root = output_root
+        self.records = open_record_writer(records_path, names, append) if records_path else None
+        self.render_pool = ThreadPoolExecutor(max_workers=render_workers) if render else None
+        self.render_slots = threading.BoundedSemaphore(max_pending)
+        self.ledger = ledger
+        self.run_key = ledger.key if ledger is not None else None
+        self.chunk_size = chunk_size
+        self.written = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+        # 紀錄、完成狀態與 ledger 都只由這個背景執行緒處理
+        self.jobs = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._write_records, daemon=True)
+        self.thread.start()
+
+    def submit(self, folder_name, image_path, result):
+        image_id = image_id_for(folder_name, image_path)
+        parts = (self.records is not None) + (self.render_pool is not None)
+        self.jobs.put(("start", image_id, parts))
+        if self.records is not None:
+            det = extract_detections(result, image_id)
+            det["run_key"] = self.run_key
+            self.jobs.put(("record", image_id, det))
+        if self.render_pool is not None:
+            self.render_slots.acquire()
+            future = self.render_pool.submit(self._render, folder_name, image_path, result)
+            future.add_done_callback(lambda f, image_id=image_id: self._render_done(image_id, f))
+
+    def _render(self, folder_name, image_path, result):
+        out_dir = os.path.join(self.output_root, folder_name)
+        os.makedirs(out_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(out_dir, os.path.basename(image_path)), result.plot())
+
+    def _render_done(self, image_id, future):
+        self.render_slots.release()
+        error = future.exception()
+        if error is None:
+            with self.lock:
+                self.written += 1
+        else:
+            print(f"\n❌ 無法寫出 {image_id} 的標註圖片: {error}")
+        self.jobs.put(("done", image_id, error is None))
+
+    def _write_records(self):
+        remaining = {}   # image_id -> 尚未完成的輸出數
+        failed = set()
+        completed = []
+
+        def finish(image_id, ok):
+            if not ok:
+                failed.add(image_id)
+            remaining[image_id] -= 1
+            if remaining[image_id] == 0:
+                del remaining[image_id]
+                if image_id in failed:
+                    failed.discard(image_id)   # 不記為完成，下次接續時會重新偵測
+                else:
+                    completed.append(image_id)
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            kind, image_id, payload = job
+            if kind == "start":
+                remaining[image_id] = payload + 1
+                finish(image_id, True)
+            elif kind == "record":
+                try:
+                    self.records.write(payload)
+                    finish(image_id, True)
+                except Exception as e:
+                    with self.lock:
+                        self.errors += 1
+                    print(f"\n❌ 無法寫入 {image_id} 的偵測紀錄: {e}")
+                    finish(image_id, False)
+            else:  # "done"
+                if not payload:
+                    with self.lock:
+                        self.errors += 1
+                finish(image_id, payload)
+
+            if len(completed) >= self.chunk_size:
+                self._checkpoint(completed)
+                completed = []
+        self._checkpoint(completed)
+
+    def _checkpoint(self, completed):
+        """先讓偵測紀錄落地，再把這批圖片附加到完成紀錄。"""
+        if self.records is not None:
+            self.records.flush()
+        if self.ledger is not None:
+            self.ledger.append(completed)
+
+    def close(self):
+        # 先等所有繪圖完成 (它們會送出 "done" 訊息)，再結束紀錄執行緒
+        if self.render_pool is not None:
+            self.render_pool.shutdown(wait=True)
+        self.jobs.put(None)
+        self.thread.join()
+        if self.records is not None:
+            self.records.close()
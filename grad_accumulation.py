@@ -0,0 +1,144 @@
+import csv
+import os
+import time
+
+import torch
+from torch.utils.checkpoint import checkpoint
+from ultralytics import YOLOv10
+from ultralytics.models.yolov10.train import YOLOv10DetectionTrainer
+from ultralytics.nn.tasks import YOLOv10DetectionModel
+
+# YOLOv10 yaml 中 backbone 為第 0 ~ 10 層 (到 PSA 為止)
+BACKBONE_LAYERS = 11
+
+def accumulation_args(effective_batch, micro_batch, weight_decay=0.0005, nbs=64):
+    """
+    以 micro_batch 張為一步、累積到 effective_batch 張才更新一次的 model.train 參數。
+
+    ultralytics 每 accumulate = max(round(nbs / batch), 1) 步更新一次，並把 weight_decay 乘上 batch * accumulate / nbs；
+    這裡把 nbs 設為直接用 effective_batch 訓練時每次更新的張數，並換算 weight_decay，使更新頻率與實際的衰減都相同。
+    (自動選擇的 optimizer 與學習率也依 max(batch, nbs) 計算，因此不變。)
+    """
+    if effective_batch % micro_batch:
+        raise ValueError(f"effective_batch={effective_batch} 必須是 micro_batch={micro_batch} 的倍數")
+    baseline_accumulate = max(round(nbs / effective_batch), 1)
+    return {
+        "batch": micro_batch,
+        "nbs": effective_batch * baseline_accumulate,
+        "weight_decay": weight_decay * effective_batch * baseline_accumulate / nbs,
+    }
+
+class CheckpointedDetectionModel(YOLOv10DetectionModel):
+    """
+    訓練時前 checkpoint_layers 層 (backbone) 使用 activation checkpointing：
+    forward 不保留中間的 activation，backward 時再重算一次，以約多一次 backbone forward 的時間換取記憶體。
+    (重算時 BatchNorm 的 running stats 會多更新一次，影響可忽略。)
+    """
+
+    checkpoint_layers = BACKBONE_LAYERS
+
+    def _predict_once(self, x, profile=False, visualize=False, embed=None):
+        if not (self.training and torch.is_grad_enabled()):
+            return super()._predict_once(x, profile, visualize, embed)
+        y = []
+        for m in self.model:
+            if m.f != -1:
+                x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]
+            x = checkpoint(m, x, use_reentrant=False) if m.i < self.checkpoint_layers else m(x)
+            y.append(x if m.i in self.save else None)
+        return x
+
+def checkpointed_trainer(layers=BACKBONE_LAYERS, base=YOLOv10DetectionTrainer):
+    """回傳對前 layers 層啟用 activation checkpointing 的 trainer 類別：model.train(trainer=checkpointed_trainer(), ...)。"""
+
+    class CheckpointedTrainer(base):
+        def get_model(self, cfg=None, weights=None, verbose=True):
+            model = super().get_model(cfg, weights, verbose)
+            model.__class__ = CheckpointedDetectionModel
+            model.checkpoint_layers = layers
+            return model
+
+        def save_model(self):
+            # 存檔時換回原本的類別，權重檔不需要這個模組也能載入
+            models = [m for m in (self.model, getattr(self.ema, "ema", None)) if isinstance(m, CheckpointedDetectionModel)]
+            for m in models:
+                m.__class__ = YOLOv10DetectionModel
+            try:
+                super().save_model()
+            finally:
+                for m in models:
+                    m.__class__ = CheckpointedDetectionModel
+
+    return CheckpointedTrainer
+
+def read_results(csv_path):
+    """讀取 ultralytics 的 results.csv (欄位名稱去除空白)，回傳 {欄位: [每個 epoch 的值]}。"""
+    with open(csv_path, "r", encoding="utf-8") as f:
+        rows = [{k.strip(): float(v) for k, v in row.items()} for row in csv.DictReader(f)]
+    return {k: [row[k] for row in rows] for k in rows[0]} if rows else {}
+
+def benchmark_modes(model_path, data, imgsz=256, effective_batch=128, modes=None, epochs=3, fraction=0.1,
+                    device="cuda", workers=8, project="runs/accumulation"):
+    """
+    以相同的 seed 與資料子集 (fraction) 分別訓練 epochs 個 epoch，比較各模式的吞吐量、記憶體峰值，
+    以及 results.csv 中 loss / mAP 曲線與基準 (直接用 effective_batch) 的差距。
+
+    modes: {名稱: (micro_batch 或 None 表示基準, 是否啟用 activation checkpointing)}
+    """
+    modes = modes or {
+        "baseline": (None, False),
+        "accum_32": (32, False),
+        "accum_32_ckpt": (32, True),
+    }
+    reports, curves = {}, {}
+    for name, (micro_batch, use_checkpoint) in modes.items():
+        print(f"\n📊 {name}: micro_batch={micro_batch or effective_batch}, checkpoint={use_checkpoint}")
+        args = accumulation_args(effective_batch, micro_batch) if micro_batch else {"batch": effective_batch}
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats()
+        model = YOLOv10(model_path)
+        start = time.perf_counter()
+        try:
+            model.train(data=data, epochs=epochs, fraction=fraction, imgsz=imgsz, device=device, workers=workers,
+                        project=project, name=name, exist_ok=True, plots=False, **args,
+                        trainer=checkpointed_trainer() if use_checkpoint else None)
+        except torch.cuda.OutOfMemoryError:
+            print(f"❌ {name}: 記憶體不足")
+            reports[name] = {"error": "out of memory"}
+            continue
+        elapsed = time.perf_counter() - start
+
+        images = len(model.trainer.train_loader.dataset) * epochs
+        curves[name] = read_results(os.path.join(model.trainer.save_dir, "results.csv"))
+        reports[name] = {
+            "images_per_sec": round(images / elapsed, 1),
+            "peak_memory_mb": round(torch.cuda.max_memory_allocated() / 2 ** 20) if torch.cuda.is_available() else None,
+            "mAP50-95": curves[name]["metrics/mAP50-95(B)"][-1],
+        }
+
+    base = curves.get("baseline")
+    print(f"\n{'模式':16s} {'張/秒':>8s} {'峰值 MB':>9s} {'mAP50-95':>9s} {'max|Δbox_loss|':>15s} {'max|ΔmAP50-95|':>15s}")
+    for name, r in reports.items():
+        if "error" in r:
+            print(f"{name:16s} ❌ {r['error']}")
+            continue
+        diff_loss = diff_map = 0.0
+        if base and name in curves:
+            diff_loss = max(abs(a - b) for a, b in zip(curves[name]["train/box_loss"], base["train/box_loss"]))
+            diff_map = max(abs(a - b) for a, b in zip(curves[name]["metrics/mAP50-95(B)"], base["metrics/mAP50-95(B)"]))
+        print(f"{name:16s} {r['images_per_sec']:8.1f} {r['peak_memory_mb'] or 0:9d} {r['mAP50-95']:9.4f} "
+              f"{diff_loss:15.4f} {diff_map:15.4f}")
+    return reports
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'runs/detect/train30/weights/best.pt'
+    dataset_path = "./../SIXray_YOLO/dataset.yaml"
+    image_size = 256
+    effective_batch = 128   # train.py 的 batch
+    epochs = 3
+    fraction = 0.1          # 只用 10% 的訓練資料做比較
+
+    benchmark_modes(model_weight, dataset_path, imgsz=image_size, effective_batch=effective_batch,
+                    epochs=epochs, fraction=fraction)
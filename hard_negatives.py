@@ -0,0 +1,201 @@
+import json
+import os
+import random
+import sys
+
+from detect_all import IMAGE_EXTS, detect_all_folders
+from detection_ledger import run_key
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 為選用套件，只有讀取 Parquet 紀錄時需要
+    pq = None
+
+# 共用的檔案放置與清單工具位於 splits/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "splits"))
+from materialize import Materializer
+from split_lists import load_class_names, write_dataset_yaml, write_split_lists
+
+def read_scores(records_path):
+    """
+    讀取 detect_all 的偵測紀錄 (.jsonl 或 .parquet 資料夾)，負樣本上的每個框都是誤報，
+    以最高信心度作為難度分數。同一個 image_id 出現多次 (中斷後重做) 時以最後一筆為準。
+
+    Returns:
+        {image_id: {"score": 最高信心度 (沒有框為 0), "boxes": 框數, "cls": 最高分的類別 (沒有框為 -1)}}
+    """
+    scores = {}
+
+    def add(image_id, cls, conf):
+        if len(conf):
+            best = max(range(len(conf)), key=conf.__getitem__)
+            scores[image_id] = {"score": round(float(conf[best]), 4), "boxes": len(conf), "cls": int(cls[best])}
+        else:
+            scores[image_id] = {"score": 0.0, "boxes": 0, "cls": -1}
+
+    if records_path.endswith(".parquet"):
+        if pq is None:
+            raise ImportError("讀取 Parquet 需要安裝 pyarrow (pip install pyarrow)，或改用 .jsonl")
+        table = pq.read_table(records_path, columns=["image_id", "cls", "conf"]).to_pydict()
+        boxes = {}
+        for image_id, cls, conf in zip(table["image_id"], table["cls"], table["conf"]):
+            c = boxes.setdefault(image_id, ([], []))
+            if cls >= 0:  # cls = -1 為沒有偵測結果的圖
+                c[0].append(cls)
+                c[1].append(conf)
+        for image_id, (cls, conf) in boxes.items():
+            add(image_id, cls, conf)
+        return scores
+
+    with open(records_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:  # 中斷時寫到一半的最後一行
+                continue
+            add(record["image_id"], record["cls"], record["conf"])
+    return scores
+
+def mine_pool(pool_root, pool_folder, output_root, model_path, conf=0.05, imgsz=640, batch_size=16,
+              device=None, records_format="jsonl", **detect_kwargs):
+    """
+    以目前的權重對整個負樣本池 (pool_root/pool_folder) 做批次偵測，回傳 read_scores 的結果。
+
+    結果放在 output_root/<權重與設定的代碼>/，每個權重各自一份；中斷後再執行會接續
+    (沿用 detect_all 的完成紀錄)，只補做缺少的圖片。conf 設得比部署時低，才能區分「差一點就誤報」的圖片。
+    """
+    run_dir = os.path.join(output_root, run_key(model_path, conf, imgsz))
+    records_path = os.path.join(run_dir, f"detections.{records_format}")
+    print(f"ℹ️ 負樣本池 {os.path.join(pool_root, pool_folder)} -> {run_dir}")
+    records_path = detect_all_folders(pool_root, run_dir, model_path, batch_size=batch_size, imgsz=imgsz,
+                                      conf=conf, device=device, render=False, records_path=records_path,
+                                      resume=True, subfolders=[pool_folder], **detect_kwargs)
+    return read_scores(records_path)
+
+def image_stems(sources):
+    """清單檔 (.txt，每行一個圖片路徑) 或資料夾中所有圖片的檔名 (不含副檔名)。"""
+    stems = set()
+    for source in sources:
+        if os.path.isdir(source):
+            paths = [f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTS)]
+        elif os.path.exists(source):
+            with open(source, "r", encoding="utf-8") as f:
+                paths = [line.strip() for line in f if line.strip()]
+        else:
+            print(f"⚠️ 找不到 {source}，略過")
+            continue
+        stems.update(os.path.splitext(os.path.basename(p))[0] for p in paths)
+    return stems
+
+def select_hard_negatives(scores, budget, exclude=(), random_fraction=0.2, seed=42):
+    """
+    依最高誤報信心度由高到低排序，選出 budget 張：
+    (1 - random_fraction) 取最難的，其餘從剩下的圖片隨機抽 (保留一些簡單的負樣本，避免模型只看過難例而整體分數偏高)。
+    exclude 為不可選的檔名 (例如 val / test 的負樣本)。
+
+    Returns:
+        [(image_id, 分數資訊), ...]，依分數由高到低
+    """
+    ranked = sorted(((image_id, s) for image_id, s in scores.items() if image_id.split("/")[-1] not in exclude),
+                    key=lambda item: item[1]["score"], reverse=True)
+    budget = min(budget, len(ranked))
+    n_hard = budget - int(round(budget * random_fraction))
+    rest = ranked[n_hard:]
+    easy = random.Random(seed).sample(rest, budget - n_hard)
+    return sorted(ranked[:n_hard] + easy, key=lambda item: item[1]["score"], reverse=True)
+
+def write_negative_split(selected, pool_dir, output_dir, split_name, eval_lists, positive_list_dir=None,
+                         classes_yaml=None, mode="hardlink", workers=8, info=None):
+    """
+    與 cp_negatives.py 的 "lists" 格式相同：選出的負樣本放到 output_dir/images/negative (空標註在 labels/negative)，
+    並在 output_dir/splits/<split_name>/ 寫出 train.txt；val.txt / test.txt 沿用 eval_lists 中的負樣本清單
+    (評估用的負樣本維持不變，才能與前一輪比較)，有正樣本清單時另外產生合併的 dataset.yaml。
+    """
+    image_dir = os.path.join(output_dir, "images", "negative")
+    label_dir = os.path.join(output_dir, "labels", "negative")
+    os.makedirs(image_dir, exist_ok=True)
+    os.makedirs(label_dir, exist_ok=True)
+
+    files = {os.path.splitext(f)[0]: f for f in os.listdir(pool_dir) if f.lower().endswith(IMAGE_EXTS)}
+    materializer = Materializer(mode, workers=workers, desc="hard negatives")
+    train_images = []
+    for image_id, _ in selected:
+        name = files[image_id.split("/")[-1]]
+        dst_img = os.path.join(image_dir, name)
+        materializer.place(os.path.join(pool_dir, name), dst_img)
+        train_images.append(dst_img)
+        with open(os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"), "w"):
+            pass  # 空檔案
+    materializer.close()
+
+    list_dir = os.path.join(output_dir, "splits", split_name)
+    split_images = {"train": train_images}
+    for split, list_path in eval_lists.items():
+        with open(list_path, "r", encoding="utf-8") as f:
+            split_images[split] = [line.strip() for line in f if line.strip()]
+    list_files = write_split_lists(list_dir, split_images)
+
+    with open(os.path.join(list_dir, "hard_negatives.json"), "w", encoding="utf-8") as f:
+        json.dump({**(info or {}), "selected": [{"image_id": i, **s} for i, s in selected]}, f,
+                  ensure_ascii=False, indent=1)
+
+    if positive_list_dir and os.path.isdir(positive_list_dir):
+        combined = {
+            split: [os.path.join(positive_list_dir, f"{split}.txt"), list_files[split]]
+            for split in list_files
+            if os.path.exists(os.path.join(positive_list_dir, f"{split}.txt"))
+        }
+        write_dataset_yaml(os.path.join(list_dir, "dataset.yaml"), load_class_names(classes_yaml), combined)
+    else:
+        print(f"ℹ️ 找不到正樣本清單資料夾 {positive_list_dir}，只寫出負樣本清單。")
+    return list_dir
+
+def score_summary(scores, thresholds=(0.05, 0.1, 0.25, 0.5)):
+    """印出負樣本池中超過各信心度門檻 (會被當成誤報) 的圖片比例。"""
+    values = [s["score"] for s in scores.values()]
+    print(f"📊 負樣本池 {len(values)} 張")
+    for t in thresholds:
+        n = sum(v >= t for v in values)
+        print(f"   最高信心度 >= {t:<4}: {n:8d} 張 ({n / max(len(values), 1):.2%})")
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'runs/detect/train30/weights/best.pt'   # 目前的權重
+    pool_root = "./../SIXray"
+    pool_folder = "JPEGImages"                              # 負樣本池 (與 cp_negatives.py 的 negative_dir 相同)
+    mining_root = "./../SIXray_YOLO/hard_negative_mining"   # 偵測紀錄 (每個權重一個資料夾，可中斷接續)
+    output_dir = "./../SIXray_YOLO"
+
+    # 推論設定
+    confidence = 0.05    # 比部署時低，才能排序「差一點就誤報」的圖片
+    image_size = 640
+    batch_size = 32
+    device = None
+
+    # 選擇設定
+    budget = 20000           # 下一輪訓練使用的負樣本數
+    random_fraction = 0.2    # 其中隨機抽取 (簡單) 負樣本的比例
+    seed = 42
+    # 目前的負樣本分割 (cp_negatives.py 以 SPLIT_FORMAT = "lists" 產生)：val / test 沿用，且不可被選進 train
+    current_split_dir = os.path.join(output_dir, "splits", "negatives_seed42")
+    split_name = f"hard_negatives_{os.path.basename(os.path.dirname(os.path.dirname(model_weight)))}_n{budget}"
+    positive_list_dir = os.path.join(output_dir, "splits", "stratified_seed42")
+    classes_yaml = os.path.join(output_dir, "dataset.yaml")
+
+    eval_lists = {split: os.path.join(current_split_dir, f"{split}.txt") for split in ("val", "test")}
+    eval_lists = {split: path for split, path in eval_lists.items() if os.path.exists(path)}
+    if not eval_lists:
+        raise SystemExit(f"❌ 找不到 {current_split_dir} 中的 val / test 清單，請先以 cp_negatives.py 產生負樣本分割")
+
+    scores = mine_pool(pool_root, pool_folder, mining_root, model_weight, conf=confidence, imgsz=image_size,
+                       batch_size=batch_size, device=device)
+    score_summary(scores)
+    selected = select_hard_negatives(scores, budget, exclude=image_stems(eval_lists.values()),
+                                     random_fraction=random_fraction, seed=seed)
+    print(f"✅ 選出 {len(selected)} 張負樣本 (最難的分數 {selected[0][1]['score']:.3f}，"
+          f"最低 {selected[-1][1]['score']:.3f})" if selected else "⚠️ 沒有可用的負樣本")
+
+    info = {"model_path": model_weight, "conf": confidence, "imgsz": image_size, "budget": budget,
+            "random_fraction": random_fraction, "seed": seed, "eval_lists": eval_lists}
+    write_negative_split(selected, os.path.join(pool_root, pool_folder), output_dir, split_name, eval_lists,
+                         positive_list_dir=positive_list_dir, classes_yaml=classes_yaml, info=info)
@@ -0,0 +1,254 @@
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+import yaml
+from tqdm import tqdm
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolov10.train import YOLOv10DetectionTrainer
+from ultralytics.models.yolov10.val import YOLOv10DetectionValidator
+from ultralytics.utils import colorstr
+from ultralytics.utils.torch_utils import de_parallel
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+SPLITS = ("train", "val", "test")
+
+# index 每列: 在 images.u8 中的起點、縮放後的高、寬、原圖的高、寬
+INDEX_COLUMNS = ("offset", "height", "width", "orig_height", "orig_width")
+# 與 ultralytics BaseDataset.load_image 相同，寫進 meta.json 以辨認舊版 (INTER_AREA) 的快取
+INTERPOLATION = "linear"
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+def dataset_image_files(yaml_path, splits=SPLITS):
+    """依 ultralytics 的規則解析 dataset.yaml 中各 split 的圖片 (資料夾或 .txt 清單)，回傳去除重複後的路徑列表。"""
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f)
+    root = data.get("path") or os.path.dirname(os.path.abspath(yaml_path))
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(yaml_path)), root)
+
+    files = {}
+    for split in splits:
+        sources = data.get(split) or []
+        for source in sources if isinstance(sources, list) else [sources]:
+            source = os.path.normpath(os.path.join(root, source))
+            if os.path.isdir(source):
+                for dirpath, _, names in os.walk(source):
+                    for name in names:
+                        if name.lower().endswith(IMAGE_EXTS):
+                            path = os.path.join(dirpath, name)
+                            files.setdefault(_key(path), path)
+            elif os.path.isfile(source):
+                parent = os.path.dirname(source) + os.sep
+                with open(source, "r", encoding="utf-8") as f:
+                    for line in f.read().splitlines():
+                        if line.strip():
+                            path = parent + line[2:] if line.startswith("./") else line
+                            files.setdefault(_key(path), path)
+            else:
+                print(f"⚠️ 找不到 {split} 的圖片來源: {source}")
+    return sorted(files.values())
+
+def cache_dir_for(cache_root, imgsz):
+    return os.path.join(cache_root, f"imgsz{imgsz}")
+
+def letterbox_resize(image, imgsz):
+    """
+    與 ultralytics BaseDataset.load_image 相同的縮放：長邊縮放到 imgsz 並保持比例 (補邊留給訓練時的增強處理)。
+    縮小時也使用 INTER_LINEAR (與 load_image 相同)，使用快取與不使用快取的訓練 / 驗證結果才能互相比較。
+    """
+    h0, w0 = image.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+        image = cv2.resize(image, (w, h), interpolation=cv2.INTER_LINEAR)
+    return image
+
+def build_image_cache(yaml_path, cache_root, imgsz=640, splits=SPLITS, workers=8):
+    """
+    將 dataset.yaml 所有 split 的圖片解碼並縮放一次，依序寫入 cache_root/imgsz<imgsz>/ 底下：
+      images.u8  : 所有圖片 (HWC, BGR) 串接成的單一 uint8 檔，訓練時以 memory map 讀取
+      index.npy  : (N, 5) int64，欄位見 INDEX_COLUMNS
+      files.txt  : 第 i 行為第 i 張圖的路徑
+      meta.json  : imgsz、縮放方式、張數與總大小
+    """
+    paths = dataset_image_files(yaml_path, splits)
+    out_dir = cache_dir_for(cache_root, imgsz)
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"ℹ️ {len(paths)} 張圖片 -> {out_dir} (imgsz={imgsz})")
+
+    def load(path):
+        image = cv2.imread(path)
+        if image is None:
+            return None
+        return letterbox_resize(image, imgsz), image.shape[:2]
+
+    index, files, failed = [], [], []
+    offset = 0
+    data_path = os.path.join(out_dir, "images.u8")
+    start = time.perf_counter()
+    # 先寫到暫存檔，完成後才換名，中斷時不會留下不完整的快取
+    with open(data_path + ".tmp", "wb") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, loaded in tqdm(zip(paths, pool.map(load, paths)), total=len(paths), desc=f"cache {imgsz}"):
+            if loaded is None:
+                failed.append(path)
+                continue
+            image, (h0, w0) = loaded
+            f.write(np.ascontiguousarray(image).tobytes())
+            index.append((offset, image.shape[0], image.shape[1], h0, w0))
+            files.append(os.path.abspath(path))
+            offset += image.size
+
+    np.save(os.path.join(out_dir, "index.npy"), np.array(index, dtype=np.int64).reshape(-1, len(INDEX_COLUMNS)))
+    with open(os.path.join(out_dir, "files.txt"), "w", encoding="utf-8") as f:
+        f.write("\n".join(files) + ("\n" if files else ""))
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"imgsz": imgsz, "interpolation": INTERPOLATION, "images": len(files), "bytes": offset, "dataset": os.path.abspath(yaml_path)},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(data_path + ".tmp", data_path)
+
+    print(f"✅ 已快取 {len(files)} 張 ({offset / 2 ** 30:.2f} GB)，耗時 {time.perf_counter() - start:.1f} 秒")
+    for path in failed[:10]:
+        print(f"⚠️ 無法讀取圖片: {path}")
+    if len(failed) > 10:
+        print(f"⚠️ ... 共 {len(failed)} 張無法讀取")
+    return out_dir
+
+class MemmapImageCache:
+    """
+    build_image_cache 產生的快取。images.u8 在各 dataloader worker 中才各自開啟 memory map，
+    圖片頁面由作業系統的 page cache 共用，不會在每個 worker 中複製一份。
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.imgsz = meta["imgsz"]
+        # 沒有紀錄縮放方式的是舊版快取 (縮小時用 INTER_AREA)
+        self.interpolation = meta.get("interpolation", "area")
+        self.index = np.load(os.path.join(cache_dir, "index.npy"))
+        with open(os.path.join(cache_dir, "files.txt"), "r", encoding="utf-8") as f:
+            self.rows = {_key(line): i for i, line in enumerate(f.read().splitlines())}
+        self._data = None
+
+    def __getstate__(self):
+        # 傳給 worker 時不要帶著已開啟的 memmap
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def __contains__(self, path):
+        return _key(path) in self.rows
+
+    def get(self, path):
+        """回傳 (縮放後的影像 (可寫入的副本), (原圖高, 寬), (縮放後高, 寬))；不在快取中時回傳 None。"""
+        row = self.rows.get(_key(path))
+        if row is None:
+            return None
+        if self._data is None:
+            self._data = np.memmap(os.path.join(self.cache_dir, "images.u8"), dtype=np.uint8, mode="r")
+        offset, h, w, h0, w0 = (int(v) for v in self.index[row])
+        image = np.array(self._data[offset:offset + h * w * 3]).reshape(h, w, 3)
+        return image, (h0, w0), (h, w)
+
+class CachedYOLODataset(YOLODataset):
+    """從 MemmapImageCache 讀取已縮放的圖片，取代每個 epoch 重新解碼 JPEG；不在快取中的圖片照常讀檔。"""
+
+    def __init__(self, *args, image_cache=None, **kwargs):
+        self.image_cache = image_cache
+        super().__init__(*args, **kwargs)
+        if self.image_cache is not None and self.image_cache.imgsz != self.imgsz:
+            print(f"⚠️ 快取的 imgsz={self.image_cache.imgsz} 與訓練的 imgsz={self.imgsz} 不同，不使用快取")
+            self.image_cache = None
+        if self.image_cache is not None and self.image_cache.interpolation != INTERPOLATION:
+            print(f"⚠️ 快取 {self.image_cache.cache_dir} 的縮放方式為 {self.image_cache.interpolation}，"
+                  f"與 ultralytics 的 {INTERPOLATION} 不同，不使用快取 (請以 image_cache.py 重新產生)")
+            self.image_cache = None
+        if self.image_cache is not None:
+            hits = sum(f in self.image_cache for f in self.im_files)
+            print(f"ℹ️ {self.prefix}{hits}/{len(self.im_files)} 張圖片由快取讀取 ({self.image_cache.cache_dir})")
+
+    def load_image(self, i, rect_mode=True):
+        cached = self.image_cache.get(self.im_files[i]) if self.image_cache is not None else None
+        if cached is None:
+            return super().load_image(i, rect_mode)
+        image, hw0, hw = cached
+        if not rect_mode and hw != (self.imgsz, self.imgsz):
+            image = cv2.resize(image, (self.imgsz, self.imgsz), interpolation=cv2.INTER_LINEAR)
+            hw = image.shape[:2]
+        if self.augment:
+            # 與 BaseDataset 相同：mosaic 從最近讀過的圖片中挑選
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return image, hw0, hw
+
+def build_cached_dataset(image_cache, cfg, img_path, batch, data, mode="train", rect=False, stride=32):
+    """與 ultralytics build_yolo_dataset 相同的參數，但改用 CachedYOLODataset (不再另外 cache 到 RAM / 磁碟)。"""
+    return CachedYOLODataset(
+        img_path=img_path,
+        imgsz=cfg.imgsz,
+        batch_size=batch,
+        augment=mode == "train",
+        hyp=cfg,
+        rect=cfg.rect or rect,
+        cache=None,
+        single_cls=cfg.single_cls or False,
+        stride=int(stride),
+        pad=0.0 if mode == "train" else 0.5,
+        prefix=colorstr(f"{mode}: "),
+        use_segments=False,
+        use_keypoints=False,
+        classes=cfg.classes,
+        data=data,
+        fraction=cfg.fraction if mode == "train" else 1.0,
+        image_cache=image_cache,
+    )
+
+def cached_trainer(cache_dir, base=YOLOv10DetectionTrainer):
+    """
+    回傳使用 cache_dir 快取的 trainer 類別：model.train(trainer=cached_trainer(...), ...)；訓練中的驗證也使用快取。
+    base 可傳入其他訓練模式的 trainer 類別以組合使用。
+    cache_dir 也可以是 {imgsz: 快取資料夾}：每次建立 dataset 時依當下的 imgsz 選擇 (逐步放大解析度的各階段與驗證各用各的快取)。
+    """
+    cache_dirs = cache_dir if isinstance(cache_dir, dict) else {None: cache_dir}
+    image_caches = {imgsz: MemmapImageCache(d) for imgsz, d in cache_dirs.items()}
+
+    class CachedTrainer(base):
+        def build_dataset(self, img_path, mode="train", batch=None):
+            gs = max(int(de_parallel(self.model).stride.max() if self.model else 0), 32)
+            image_cache = image_caches.get(self.args.imgsz, image_caches.get(None))
+            if image_cache is None:
+                print(f"⚠️ 沒有 imgsz={self.args.imgsz} 的快取，{mode} 照常讀取 JPEG")
+            return build_cached_dataset(image_cache, self.args, img_path, batch, self.data, mode=mode,
+                                        rect=mode == "val", stride=gs)
+
+    return CachedTrainer
+
+def cached_validator(cache_dir):
+    """回傳使用 cache_dir 快取的 validator 類別：model.val(validator=cached_validator(...), ...)。"""
+    image_cache = MemmapImageCache(cache_dir)
+
+    class CachedValidator(YOLOv10DetectionValidator):
+        def build_dataset(self, img_path, mode="val", batch=None):
+            return build_cached_dataset(image_cache, self.args, img_path, batch, self.data, mode=mode,
+                                        stride=self.stride)
+
+    return CachedValidator
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    dataset_path = "./../SIXray_YOLO/dataset.yaml"
+    cache_root = "./../SIXray_YOLO/cache"   # 快取輸出位置 (每個 imgsz 一個子資料夾)
+    image_sizes = [256, 480, 640]           # train.py / val.py / detect_all.py 用到的尺寸
+    workers = 8
+
+    for size in image_sizes:
+        build_image_cache(dataset_path, cache_root, imgsz=size, workers=workers)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+async def _request(reader, writer, host, method, path, body=b""):
+    """在既有的 keep-alive 連線上送出一個 HTTP/1.1 請求，回傳 (狀態碼, JSON)。"""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/octet-stream\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    data = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, json.loads(data)
+
+async def get_json(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        return (await _request(reader, writer, host, "GET", path))[1]
+    finally:
+        writer.close()
+
+async def run_load(host, port, images, total_requests=500, concurrency=16):
+    """
+    以 concurrency 條連線同時送出共 total_requests 個 /predict 請求 (輪流使用 images 中的圖片)，
+    回傳客戶端量測的延遲與吞吐量。
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def client():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, host, "POST", "/predict", images[i % len(images)])
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / max(elapsed, 1e-9), 2),
+        "latency_ms": {f"p{p}": round(float(np.percentile(lat, p)), 2) for p in (50, 95, 99)} if len(lat) else {},
+    }
+
+def load_images(image_dir, limit=64):
+    """讀取 image_dir (含子資料夾) 中最多 limit 張圖片的原始位元組。"""
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        paths += [os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTS)]
+    images = []
+    for path in sorted(paths)[:limit]:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+async def main(host, port, image_dir, total_requests, concurrency_levels):
+    images = load_images(image_dir)
+    if not images:
+        print(f"❌ {image_dir} 中沒有找到圖片")
+        return
+    print(f"ℹ️ 使用 {len(images)} 張圖片對 http://{host}:{port} 施加負載\n")
+
+    for concurrency in concurrency_levels:
+        report = await run_load(host, port, images, total_requests, concurrency)
+        lat = report["latency_ms"]
+        print(f"📊 並行 {concurrency:3d}: {report['throughput_rps']:8.1f} req/s, "
+              f"p50 {lat.get('p50', 0):7.1f} ms, p95 {lat.get('p95', 0):7.1f} ms, p99 {lat.get('p99', 0):7.1f} ms, "
+              f"錯誤 {report['errors']}")
+
+    metrics = await get_json(host, port, "/metrics")
+    print("\n📋 伺服器端統計:", json.dumps(metrics, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    # --- 設定 --- (先執行 inference_server.py)
+    host = "127.0.0.1"
+    port = 8000
+    image_dir = "./../SIXray_YOLO/detections2"
+    total_requests = 500
+    concurrency_levels = [1, 4, 16, 32]   # 依序測試的並行連線數
+
+    asyncio.run(main(host, port, image_dir, total_requests, concurrency_levels))
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from detection_output import extract_detections
+from model_backends import load_model, resolve_backend
+
+class ImageDecodeError(ValueError):
+    """上傳的內容無法解碼成圖片 (客戶端錯誤，回應 400)。"""
+
+class LatencyStats:
+    """最近 window 筆請求的延遲 (p50 / p95 / p99) 與整體吞吐量。"""
+
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)   # 請求進來到回應的秒數
+        self.queue_waits = deque(maxlen=window) # 在批次佇列中等待的秒數
+        self.batch_sizes = Counter()
+        self.completed = 0
+        self.bad_requests = 0   # 無法解碼的上傳 (400)
+        self.server_errors = 0  # 推論失敗等服務端錯誤 (500)
+        self.started = time.perf_counter()
+
+    def add(self, latency, queue_wait):
+        self.latencies.append(latency)
+        self.queue_waits.append(queue_wait)
+        self.completed += 1
+
+    def snapshot(self):
+        uptime = time.perf_counter() - self.started
+        stats = {
+            "completed": self.completed,
+            "errors": self.bad_requests + self.server_errors,
+            "bad_requests": self.bad_requests,
+            "server_errors": self.server_errors,
+            "uptime_s": round(uptime, 1),
+            "throughput_rps": round(self.completed / max(uptime, 1e-9), 2),
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+        }
+        if self.latencies:
+            lat = np.array(self.latencies) * 1000
+            wait = np.array(self.queue_waits) * 1000
+            stats["latency_ms"] = {f"p{p}": round(float(np.percentile(lat, p)), 2) for p in (50, 95, 99)}
+            stats["queue_wait_ms"] = {f"p{p}": round(float(np.percentile(wait, p)), 2) for p in (50, 95, 99)}
+        return stats
+
+class MicroBatcher:
+    """
+    將同時進來的請求合併成動態 micro-batch：
+    收到第一張圖後最多再等 max_latency_ms 毫秒，或湊滿 max_batch 張就送進模型。
+    模型在單一推論執行緒中執行，不會阻塞 event loop。
+    """
+
+    def __init__(self, model, max_batch=16, max_latency_ms=10, conf=0.25, imgsz=640, device=None, stats=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self.predict_kwargs = dict(conf=conf, imgsz=imgsz, device=device, verbose=False)
+        self.stats = stats or LatencyStats()
+        self.queue = asyncio.Queue()
+        self.infer_pool = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, image):
+        """送出一張 BGR 影像，回傳 (ultralytics Results, 在佇列中等待的秒數)。"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            images = [image for image, _, _ in batch]
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(
+                    self.infer_pool, lambda: self.model.predict(source=images, **self.predict_kwargs)
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats.batch_sizes[len(batch)] += 1
+            for (_, future, queued), result in zip(batch, results):
+                if not future.done():
+                    future.set_result((result, start - queued))
+
+class InferenceServer:
+    """
+    以 asyncio 實作的本機 HTTP 推論服務 (只使用標準函式庫，支援 keep-alive)：
+      POST /predict  : body 為圖片檔 (jpg / png ...)，回傳偵測結果 JSON
+      GET  /metrics  : 延遲 p50 / p95 / p99、吞吐量與批次大小分布
+      GET  /health   : 服務狀態
+    """
+
+    def __init__(self, model, max_batch=16, max_latency_ms=10, conf=0.25, imgsz=640, device=None, decode_workers=4):
+        self.names = model.names
+        self.stats = LatencyStats()
+        self.batcher = MicroBatcher(model, max_batch, max_latency_ms, conf, imgsz, device, self.stats)
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+
+    async def predict(self, body):
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(
+            self.decode_pool, lambda: cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_COLOR)
+        )
+        if image is None:
+            raise ImageDecodeError("無法解碼圖片")
+
+        result, queue_wait = await self.batcher.submit(image)
+        det = extract_detections(result, image_id=None)
+        latency = time.perf_counter() - start
+        self.stats.add(latency, queue_wait)
+        return {
+            "width": det["width"],
+            "height": det["height"],
+            "detections": [
+                {"cls": int(c), "name": self.names.get(int(c), ""), "conf": round(float(p), 4),
+                 "xyxy": [round(float(v), 1) for v in box]}
+                for c, p, box in zip(det["cls"], det["conf"], det["xyxy"])
+            ],
+            "latency_ms": round(latency * 1000, 2),
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.route(method, path, body)
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if method == "POST" and path.startswith("/predict"):
+            try:
+                return "200 OK", await self.predict(body)
+            except ImageDecodeError as e:
+                self.stats.bad_requests += 1
+                return "400 Bad Request", {"error": str(e)}
+            except Exception as e:
+                # model.predict 的錯誤由 MicroBatcher 經 future 傳回，屬於服務端錯誤
+                self.stats.server_errors += 1
+                print(f"❌ 推論失敗: {e!r}")
+                return "500 Internal Server Error", {"error": str(e)}
+        if method == "GET" and path.startswith("/metrics"):
+            return "200 OK", self.stats.snapshot()
+        if method == "GET" and path.startswith("/health"):
+            return "200 OK", {"status": "ok"}
+        return "404 Not Found", {"error": f"{method} {path} 不存在"}
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        batcher_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"✅ 推論服務啟動: http://{host}:{port} (POST /predict, GET /metrics, GET /health)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher_task.cancel()
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'savemodel/yolov10n_sixray19.pt'
+    host = "127.0.0.1"
+    port = 8000
+    device = "cpu"        # 有 GPU 時可改為 "cuda" 或 None (自動)
+    image_size = 640
+    confidence = 0.25
+    max_batch = 16        # 每個 micro-batch 最多幾張圖
+    max_latency_ms = 10   # 收到第一張圖後最多等多久再送進模型
+    backend = "auto"      # "pytorch"、"onnx"、"torchscript" 或 "auto" (依 model_backends.py 的測速結果)
+
+    backend, weights = resolve_backend(model_weight, backend, image_size)
+    print(f"ℹ️ 推論後端: {backend}")
+    model = load_model(weights)
+    server = InferenceServer(model, max_batch=max_batch, max_latency_ms=max_latency_ms,
+                             conf=confidence, imgsz=image_size, device=device)
+    try:
+        asyncio.run(server.serve(host, port))
+    except KeyboardInterrupt:
+        print("\n📊 最終統計:", json.dumps(server.stats.snapshot(), ensure_ascii=False))
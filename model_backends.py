@@ -0,0 +1,198 @@
+import importlib.util
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from ultralytics import YOLOv10
+
+# pytorch     : 原本的 .pt 權重 (ultralytics + PyTorch)
+# onnx        : <權重>.onnx，由 ONNX Runtime 執行
+# torchscript : <權重>.torchscript
+# onnx_int8   : <權重>.int8.onnx，quantize.py 產生的 INT8 靜態量化模型 (結果與 FP32 不完全相同，auto 不會選用)
+BACKENDS = ("pytorch", "onnx", "torchscript", "onnx_int8")
+EXPORT_SUFFIX = {"onnx": ".onnx", "torchscript": ".torchscript", "onnx_int8": ".int8.onnx"}
+
+def load_model(model_path):
+    """載入 YOLOv10 權重 (先試 from_pretrained，失敗時改用標準載入方式)；匯出的 .onnx / .torchscript 直接載入。"""
+    print(f"正在載入模型: {model_path} ...")
+    if str(model_path).endswith(tuple(EXPORT_SUFFIX.values())):
+        return YOLOv10(model_path)
+    try:
+        return YOLOv10.from_pretrained(model_path)
+    except Exception as e:
+        # 如果 from_pretrained 失敗，嘗試標準載入方式 (視你的安裝版本而定)
+        print(f"from_pretrained 載入失敗，嘗試直接載入: {e}")
+        return YOLOv10(model_path)
+
+def backend_weights(model_path, backend):
+    """backend 對應的權重檔路徑 (匯出檔與 .pt 放在同一個資料夾)。"""
+    if backend == "pytorch":
+        return model_path
+    return os.path.splitext(model_path)[0] + EXPORT_SUFFIX[backend]
+
+def benchmark_record_path(model_path):
+    return os.path.splitext(model_path)[0] + ".backends.json"
+
+def _runtime_available(backend):
+    if backend.startswith("onnx"):
+        return importlib.util.find_spec("onnxruntime") is not None
+    return True
+
+def resolve_backend(model_path, backend="auto", imgsz=640):
+    """
+    決定實際使用的後端，回傳 (backend, 權重檔路徑)。
+
+    backend="auto" 時：若有 export_and_benchmark 的測速紀錄 (相同 imgsz) 就選其中最快且檔案存在的後端，
+    否則依 onnx > torchscript 的順序選第一個已匯出、執行環境可用且紀錄中通過一致性檢查的後端
+    (一致性檢查與 imgsz 無關)；沒有紀錄或都未通過時使用 pytorch。
+    """
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"未知的 backend: {backend} (可用: auto, {', '.join(BACKENDS)})")
+        path = backend_weights(model_path, backend)
+        if not os.path.exists(path) and backend != "pytorch":
+            script = "quantize.py" if backend == "onnx_int8" else "model_backends.py"
+            raise FileNotFoundError(f"找不到 {path}，請先執行 {script} 產生 {backend} 模型")
+        return backend, path
+
+    candidates = [b for b in BACKENDS
+                  if (b == "pytorch" or os.path.exists(backend_weights(model_path, b))) and _runtime_available(b)]
+    record_path = benchmark_record_path(model_path)
+    record = {}
+    if os.path.exists(record_path):
+        with open(record_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        if record.get("imgsz") == imgsz:
+            speeds = {b: v for b, v in record.get("images_per_sec", {}).items() if b in candidates}
+            if speeds:
+                best = max(speeds, key=speeds.get)
+                return best, backend_weights(model_path, best)
+
+    print(f"⚠️ 沒有 imgsz={imgsz} 的測速紀錄 ({record_path})，只考慮通過一致性檢查的匯出模型")
+    equivalence = record.get("equivalence", {})
+    for b in ("onnx", "torchscript"):
+        if b in candidates and equivalence.get(b, {}).get("equivalent"):
+            return b, backend_weights(model_path, b)
+    return "pytorch", model_path
+
+def export_backends(model_path, formats=("onnx", "torchscript"), imgsz=640):
+    """將 .pt 權重匯出為 ONNX (動態 batch) 與 TorchScript，回傳 {backend: 匯出檔路徑}。"""
+    exported = {}
+    for fmt in formats:
+        model = YOLOv10(model_path)
+        kwargs = dict(format=fmt, imgsz=imgsz, device="cpu")
+        if fmt == "onnx":
+            kwargs.update(dynamic=True, simplify=True)
+        path = model.export(**kwargs)
+        exported[fmt] = str(path)
+        print(f"✅ 已匯出 {fmt}: {path}")
+    return exported
+
+def _predict(model, images, imgsz, conf, batch_size):
+    results = []
+    for i in range(0, len(images), batch_size):
+        results += model.predict(source=images[i:i + batch_size], imgsz=imgsz, conf=conf, device="cpu", verbose=False)
+    return results
+
+def _sorted_boxes(result):
+    boxes = result.boxes
+    conf = boxes.conf.cpu().numpy()
+    order = np.argsort(-conf, kind="stable")
+    return boxes.cls.cpu().numpy()[order], conf[order], boxes.xyxy.cpu().numpy()[order]
+
+def check_equivalence(reference, candidate, images, imgsz=640, conf=0.25, box_atol=1.0, conf_atol=1e-3):
+    """
+    比較兩個模型在相同圖片上的偵測結果 (依信心度排序後逐框比較)。
+
+    Returns:
+        dict: equivalent, 不一致的圖片數, 最大座標差 (像素), 最大信心度差
+    """
+    mismatched = 0
+    max_box = max_conf = 0.0
+    for ref, cand in zip(_predict(reference, images, imgsz, conf, 1), _predict(candidate, images, imgsz, conf, 1)):
+        ref_cls, ref_conf, ref_xyxy = _sorted_boxes(ref)
+        cand_cls, cand_conf, cand_xyxy = _sorted_boxes(cand)
+        if len(ref_cls) != len(cand_cls) or not np.array_equal(ref_cls, cand_cls):
+            mismatched += 1
+            continue
+        if len(ref_cls):
+            box_diff = float(np.abs(ref_xyxy - cand_xyxy).max())
+            conf_diff = float(np.abs(ref_conf - cand_conf).max())
+            max_box, max_conf = max(max_box, box_diff), max(max_conf, conf_diff)
+            if box_diff > box_atol or conf_diff > conf_atol:
+                mismatched += 1
+    return {
+        "equivalent": mismatched == 0,
+        "mismatched_images": mismatched,
+        "max_box_diff_px": round(max_box, 4),
+        "max_conf_diff": round(max_conf, 6),
+    }
+
+def benchmark_model(model, images, imgsz=640, conf=0.25, batch_size=8, repeat=3):
+    """CPU 推論速度 (張/秒，取最佳一次)；先以一個 batch 暖機。"""
+    _predict(model, images[:batch_size], imgsz, conf, batch_size)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _predict(model, images, imgsz, conf, batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(images) / best
+
+def load_sample_images(image_dir, limit=32):
+    """從 image_dir (含子資料夾) 讀取最多 limit 張圖片作為比對與測速用的樣本。"""
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        paths += [os.path.join(root, f) for f in files if f.lower().endswith((".jpg", ".jpeg", ".png", ".bmp"))]
+    images = [cv2.imread(p) for p in sorted(paths)[:limit]]
+    return [im for im in images if im is not None]
+
+def export_and_benchmark(model_path, image_dir, imgsz=640, conf=0.25, batch_size=8, limit=32):
+    """匯出、檢查數值一致性並在 CPU 上測速；結果寫入 <權重>.backends.json 供 backend="auto" 使用。"""
+    exported = export_backends(model_path, imgsz=imgsz)
+    images = load_sample_images(image_dir, limit)
+    if not images:
+        print(f"❌ {image_dir} 中沒有找到圖片，無法比對與測速")
+        return None
+
+    reference = load_model(model_path)
+    models = {"pytorch": reference}
+    equivalence = {}
+    for backend, path in exported.items():
+        if not _runtime_available(backend):
+            print(f"⚠️ 未安裝 {backend} 的執行環境，略過比對與測速")
+            continue
+        models[backend] = load_model(path)
+        equivalence[backend] = check_equivalence(reference, models[backend], images, imgsz, conf)
+        mark = "✅" if equivalence[backend]["equivalent"] else "❌"
+        print(f"{mark} {backend} 與 pytorch 的結果比對: {equivalence[backend]}")
+
+    speeds = {}
+    for backend, model in models.items():
+        speeds[backend] = round(benchmark_model(model, images, imgsz, conf, batch_size), 2)
+        print(f"📊 {backend:12s}: {speeds[backend]:8.2f} 張/秒 ({speeds[backend] / speeds['pytorch']:.2f}x pytorch)")
+
+    # 只有結果一致的後端才列入 auto 的候選
+    usable = {b: v for b, v in speeds.items() if b == "pytorch" or equivalence.get(b, {}).get("equivalent")}
+    record = {
+        "imgsz": imgsz,
+        "batch_size": batch_size,
+        "images_per_sec": usable,
+        "fastest": max(usable, key=usable.get),
+        "equivalence": equivalence,
+    }
+    with open(benchmark_record_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"📝 測速結果已寫入 {benchmark_record_path(model_path)}，backend=\"auto\" 將使用 {record['fastest']}")
+    return record
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'savemodel/yolov10n_sixray19.pt'
+    sample_image_dir = "./../SIXray_YOLO/images/val"   # 比對與測速用的圖片
+    image_size = 640
+    confidence = 0.25
+    batch_size = 8
+
+    export_and_benchmark(model_weight, sample_image_dir, imgsz=image_size, conf=confidence, batch_size=batch_size)
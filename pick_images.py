@@ -1,8 +1,12 @@
 import os
-import shutil
 import random
+import sys
 
-def pick_images_by_list(src_root, dst_root, folder_list, num_per_folder=5):
+# 共用的檔案放置層位於 splits/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "splits"))
+from materialize import Materializer
+
+def pick_images_by_list(src_root, dst_root, folder_list, num_per_folder=5, mode="hardlink", workers=8):
     
     valid_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
     
@@ -22,6 +26,8 @@ def pick_images_by_list(src_root, dst_root, folder_list, num_per_folder=5):
     print(f"來源: {src_root}")
     print(f"輸出: {dst_root}\n")
 
+    materializer = Materializer(mode, workers=workers, desc="pick")
+
     for folder_name in folder_list:
         # 組合路徑
         images_src_path = os.path.join(src_root, folder_name, "images")
@@ -43,19 +49,19 @@ def pick_images_by_list(src_root, dst_root, folder_list, num_per_folder=5):
                 for img_name in selected_images:
                     src_file = os.path.join(images_src_path, img_name)
                     dst_file = os.path.join(target_dir, img_name)
-                    
-                    try:
-                        shutil.copy2(src_file, dst_file)
-                    except shutil.SameFileError:
-                        print(f"    [!] 跳過: 來源與目標是同一個檔案 ({img_name})")
-                    except Exception as e:
-                        print(f"    [X] 錯誤: {e}")
+                    materializer.place(src_file, dst_file)
 
             else:
                 print(f"[!] {folder_name}: 找到了 images 資料夾，但沒有圖片")
         else:
             print(f"[X] 跳過: {folder_name} (路徑不存在: {images_src_path})")
 
+    # 並行模式下檔案在 close() 時才實際放置，跳過 / 失敗的數量由統計取得
+    materializer.close()
+    if materializer.stats["skip"]:
+        print(f"[!] 跳過 {materializer.stats['skip']} 個檔案: 來源與目標是同一個檔案")
+    if materializer.failures:
+        print(f"[X] {len(materializer.failures)} 個檔案放置失敗 (見上方錯誤訊息)")
     print("\n--- 全部完成 ---")
 
 # --- 設定區域 ---
@@ -63,6 +69,8 @@ if __name__ == "__main__":
     source_folder = "./../SIXray_YOLO"  # 你的原始資料夾路徑
     output_folder = "./../SIXray_YOLO/detections_100"  # 輸出路徑
     images_to_take = 100               # 每個資料夾拿幾張
+    materialize_mode = "hardlink"      # "copy", "hardlink", "reflink", "symlink"
+    copy_workers = 8                   # 並行放置檔案的執行緒數 (1 為逐一處理)
     
     # 【重點】請在這裡填入你要的資料夾名稱
     # 只需要填子資料夾的名字，例如 "cat", "dog"
@@ -75,4 +83,4 @@ if __name__ == "__main__":
         "negative_subset"
     ]
     
-    pick_images_by_list(source_folder, output_folder, target_folders, images_to_take)
\ No newline at end of file
+    pick_images_by_list(source_folder, output_folder, target_folders, images_to_take, materialize_mode, copy_workers)
\ No newline at end of file
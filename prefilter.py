@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import time
+
+import cv2
+import numpy as np
+from ultralytics.engine.results import Results
+
+from tiling import load_yolo_labels
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+RECALL_LEVELS = (0.9, 0.95, 0.98, 0.99, 0.995, 1.0)
+
+def prefilter_scores(model, images, imgsz=256, device=None, conf=0.01):
+    """以低解析度 (imgsz) 跑同一個模型，每張圖的違禁品分數 = 最高的偵測信心度 (沒有框為 0)。"""
+    results = model.predict(source=images, conf=conf, imgsz=imgsz, device=device, verbose=False)
+    scores = np.zeros(len(images))
+    for i, result in enumerate(results):
+        conf_values = result.boxes.conf
+        if len(conf_values):
+            scores[i] = float(conf_values.max())
+    return scores
+
+def empty_result(image, names):
+    """被預先篩除的圖片：沒有偵測框的 Results (與一般偵測結果一樣寫出紀錄與圖片)。"""
+    return Results(orig_img=image, path="", names=names, boxes=np.zeros((0, 6), dtype=np.float32))
+
+def screen_and_detect(model, images, detect, threshold, imgsz=256, device=None):
+    """
+    先以低解析度算分數，分數低於 threshold 的圖片直接視為負樣本，其餘才交給 detect 做完整偵測。
+
+    Returns:
+        (每張圖的 Results, 被篩除的張數, 篩選耗時, 完整偵測耗時)
+    """
+    t0 = time.perf_counter()
+    keep = prefilter_scores(model, images, imgsz, device) >= threshold
+    t1 = time.perf_counter()
+    kept = [im for im, k in zip(images, keep) if k]
+    detected = iter(detect(kept) if kept else [])
+    t2 = time.perf_counter()
+    results = [next(detected) if k else empty_result(im, model.names) for im, k in zip(images, keep)]
+    return results, int((~keep).sum()), t1 - t0, t2 - t1
+
+def prefilter_record_path(model_path):
+    return os.path.splitext(model_path)[0] + ".prefilter.json"
+
+def load_threshold(model_path, recall, imgsz):
+    """讀取 calibrate_prefilter 的結果，回傳達到指定 recall 的門檻。"""
+    path = prefilter_record_path(model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"找不到 {path}，請先執行 prefilter.py 校正門檻")
+    with open(path, "r", encoding="utf-8") as f:
+        record = json.load(f)
+    if record["imgsz"] != imgsz:
+        raise ValueError(f"{path} 是以 imgsz={record['imgsz']} 校正的，與目前的 {imgsz} 不同")
+    levels = record["levels"]
+    if str(recall) not in levels:
+        raise ValueError(f"沒有 recall={recall} 的門檻 (可用: {', '.join(levels)})")
+    return levels[str(recall)]["threshold"]
+
+def _sample_paths(image_dir, limit, seed=42):
+    paths = sorted(os.path.join(image_dir, f) for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTS))
+    random.Random(seed).shuffle(paths)
+    return paths[:limit]
+
+def _score_paths(model, paths, imgsz, device, batch_size):
+    scores, elapsed = [], 0.0
+    for i in range(0, len(paths), batch_size):
+        images = [im for im in (cv2.imread(p) for p in paths[i:i + batch_size]) if im is not None]
+        if images:
+            start = time.perf_counter()
+            scores.append(prefilter_scores(model, images, imgsz, device))
+            elapsed += time.perf_counter() - start
+    return (np.concatenate(scores) if scores else np.zeros(0)), elapsed
+
+def calibrate_prefilter(model, model_path, image_dir, label_dir, negative_dir, imgsz=256, full_imgsz=640,
+                        device=None, batch_size=32, limit=2000, recall_levels=RECALL_LEVELS):
+    """
+    以有標註的正樣本 (image_dir + label_dir 中有框的圖) 決定門檻：
+    門檻取正樣本分數的 (1 - recall) 分位數，保證至少 recall 比例的正樣本會進入完整偵測；
+    再以 negative_dir 的負樣本估計各門檻能篩除的比例與吞吐量提升。結果寫入 <權重>.prefilter.json。
+    """
+    positives = []
+    for path in _sample_paths(image_dir, limit):
+        label_path = os.path.join(label_dir, os.path.splitext(os.path.basename(path))[0] + ".txt")
+        if len(load_yolo_labels(label_path, 1, 1)[0]):
+            positives.append(path)
+    negatives = _sample_paths(negative_dir, limit)
+    if not positives or not negatives:
+        print(f"❌ 正樣本 {len(positives)} 張、負樣本 {len(negatives)} 張，無法校正")
+        return None
+
+    pos_scores, _ = _score_paths(model, positives, imgsz, device, batch_size)
+    neg_scores, pre_time = _score_paths(model, negatives, imgsz, device, batch_size)
+    pre_per_image = pre_time / len(neg_scores)
+
+    # 完整偵測每張圖的耗時 (用來估計吞吐量提升)
+    sample = [cv2.imread(p) for p in negatives[:batch_size]]
+    sample = [im for im in sample if im is not None]
+    model.predict(source=sample, imgsz=full_imgsz, device=device, verbose=False)
+    start = time.perf_counter()
+    model.predict(source=sample, imgsz=full_imgsz, device=device, verbose=False)
+    full_per_image = (time.perf_counter() - start) / len(sample)
+
+    print(f"ℹ️ 正樣本 {len(pos_scores)} 張、負樣本 {len(neg_scores)} 張；"
+          f"篩選 {pre_per_image * 1000:.1f} ms/張 (imgsz={imgsz})，完整偵測 {full_per_image * 1000:.1f} ms/張 (imgsz={full_imgsz})")
+    print(f"\n{'recall':>7s} {'門檻':>8s} {'正樣本保留':>10s} {'負樣本篩除':>10s} {'吞吐量 (負樣本)':>14s}")
+
+    levels = {}
+    for recall in recall_levels:
+        threshold = float(np.quantile(pos_scores, 1 - recall, method="lower"))
+        kept = float((pos_scores >= threshold).mean())
+        skipped = float((neg_scores < threshold).mean())
+        # 沒有篩選時每張圖花 full_per_image；篩選後每張圖花 pre_per_image + 未被篩除的比例 * full_per_image
+        speedup = full_per_image / (pre_per_image + (1 - skipped) * full_per_image)
+        levels[str(recall)] = {"threshold": threshold, "positive_recall": round(kept, 4),
+                               "negative_skip_rate": round(skipped, 4), "negative_speedup": round(speedup, 2)}
+        print(f"{recall:7.3f} {threshold:8.4f} {kept:10.2%} {skipped:10.2%} {speedup:13.2f}x")
+
+    record = {"imgsz": imgsz, "full_imgsz": full_imgsz, "positives": len(pos_scores),
+              "negatives": len(neg_scores), "levels": levels}
+    with open(prefilter_record_path(model_path), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 門檻已寫入 {prefilter_record_path(model_path)} (detect_all.py 設定 prefilter_recall 使用)")
+    return record
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    from model_backends import load_model
+
+    model_weight = 'savemodel/yolov10n_sixray19.pt'
+    image_dir = "./../SIXray_YOLO/images/val"          # 有標註的正樣本
+    label_dir = "./../SIXray_YOLO/labels/val"
+    negative_dir = "./../SIXray_YOLO/images/negative"  # cp_negatives.py 複製出的負樣本
+    prefilter_size = 256                               # 低解析度篩選的 imgsz (train.py 的訓練尺寸)
+    detect_size = 640                                  # 完整偵測的 imgsz (detect_all.py)
+    sample_limit = 2000                                # 正負樣本各最多取幾張
+
+    calibrate_prefilter(load_model(model_weight), model_weight, image_dir, label_dir, negative_dir,
+                        imgsz=prefilter_size, full_imgsz=detect_size, limit=sample_limit)
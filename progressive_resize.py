@@ -0,0 +1,189 @@
+import csv
+import glob
+import os
+import re
+import time
+
+import yaml
+from ultralytics.models.yolov10.train import YOLOv10DetectionTrainer
+from ultralytics.utils import LOCAL_RANK, yaml_save
+
+from grad_accumulation import read_results
+
+EPOCH_TIMES = "epoch_times.csv"
+MAP_COLUMN = "metrics/mAP50-95(B)"
+
+def check_stages(stages, stride=32):
+    """stages: [(epochs, imgsz), ...]，依序訓練；imgsz 必須是 stride 的倍數。"""
+    stages = [(int(epochs), int(imgsz)) for epochs, imgsz in stages]
+    if not stages or any(epochs <= 0 for epochs, _ in stages):
+        raise ValueError(f"stages={stages} 每個階段至少要 1 個 epoch")
+    bad = [imgsz for _, imgsz in stages if imgsz % stride]
+    if bad:
+        raise ValueError(f"imgsz {bad} 不是 {stride} 的倍數")
+    return stages
+
+def stage_imgsz(stages, epoch):
+    """第 epoch 個 epoch (從 0 開始) 的訓練解析度。"""
+    end = 0
+    for epochs, imgsz in stages:
+        end += epochs
+        if epoch < end:
+            return imgsz
+    return stages[-1][1]
+
+def progressive_trainer(stages, val_imgsz=None, base=YOLOv10DetectionTrainer):
+    """
+    回傳依 stages 逐步放大訓練解析度的 trainer 類別，例如 [(70, 256), (20, 480), (10, 640)]：
+    前 70 個 epoch 以 256 訓練，接著 480，最後 10 個 epoch 以部署的 640 訓練。
+
+    - epochs 由 stages 的總和決定 (model.train 的 epochs 與 imgsz 會被覆寫)
+    - 進入新階段時以新的 imgsz 重建訓練 dataloader (mosaic 等增強都依 imgsz 建立)；batch 不變，需以最大的階段能放得下為準
+    - 驗證固定使用 val_imgsz (預設為最後一個階段)，各 epoch 的 mAP 才能互相比較
+    - 階段寫進 args.yaml 的 imgsz_schedule / val_imgsz，每個 epoch 的時間 (含驗證) 寫進 results.csv 旁的 epoch_times.csv
+    """
+    stages = check_stages(stages)
+    val_imgsz = val_imgsz or stages[-1][1]
+
+    class ProgressiveTrainer(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.args.epochs = self.epochs = sum(epochs for epochs, _ in stages)
+            self.args.imgsz = stages[0][1]
+            # ultralytics 不認得額外的參數，只寫進 args.yaml 作為紀錄 (resume 讀的是權重檔內的參數，不受影響)
+            yaml_save(self.save_dir / "args.yaml", {**vars(self.args), "imgsz_schedule": [list(s) for s in stages],
+                                                    "val_imgsz": val_imgsz})
+            self.add_callback("on_train_epoch_start", lambda trainer: trainer._start_stage())
+            self.add_callback("on_fit_epoch_end", lambda trainer: trainer._record_epoch_time())
+
+        def get_dataloader(self, dataset_path, batch_size=16, rank=0, mode="train"):
+            if mode == "train":
+                return super().get_dataloader(dataset_path, batch_size, rank, mode)
+            train_imgsz, self.args.imgsz = self.args.imgsz, val_imgsz
+            try:
+                return super().get_dataloader(dataset_path, batch_size, rank, mode)
+            finally:
+                self.args.imgsz = train_imgsz
+
+        def _start_stage(self):
+            self.t_epoch = time.perf_counter()
+            imgsz = stage_imgsz(stages, self.epoch)
+            if self.train_loader.dataset.imgsz == imgsz:
+                return
+            print(f"ℹ️ epoch {self.epoch + 1}: 訓練解析度 {self.train_loader.dataset.imgsz} -> {imgsz}")
+            self.args.imgsz = imgsz
+            self.train_loader = None  # 先釋放舊的 workers
+            self.train_loader = self.get_dataloader(self.trainset, batch_size=self.batch_size, rank=LOCAL_RANK,
+                                                    mode="train")
+            # 重建時 mosaic 又被打開；已過了 close_mosaic 的 epoch 要再關一次 (剛好在該 epoch 時 ultralytics 會自己關)
+            if self.args.close_mosaic and self.epoch > self.epochs - self.args.close_mosaic:
+                self._close_dataloader_mosaic()
+                self.train_loader.reset()
+
+        def _record_epoch_time(self):
+            path = os.path.join(self.save_dir, EPOCH_TIMES)
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["epoch", "imgsz", "seconds"])
+                writer.writerow([self.epoch + 1, self.args.imgsz, round(time.perf_counter() - self.t_epoch, 2)])
+
+    return ProgressiveTrainer
+
+def _duration(text):
+    """tqdm 的 [1:02:03 或 [51:38 -> 秒數。"""
+    seconds = 0
+    for part in text.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+def log_epoch_times(log_dir="training_logs"):
+    """
+    從 training_logs 中的訓練輸出解析每個 epoch 的時間 (訓練 + 驗證進度條)，
+    Returns: {run 名稱: {epoch: 秒數}} (進度條被截斷、沒有時間的 epoch 略過)
+    """
+    epoch_line = re.compile(r"^\s*(\d+)/(\d+)\s+[\d.]+G\s.*\[([\d:]+)<")
+    val_line = re.compile(r"mAP50-95\):\s*100%.*\[([\d:]+)<")
+    runs = {}
+    for path in sorted(glob.glob(os.path.join(log_dir, "**", "*.txt"), recursive=True)):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            lines = f.read().splitlines()
+        name = next((m.group(1) for line in lines for m in [re.search(r"\bname=(\w+)", line)] if m), None)
+        if name is None:
+            continue
+        times = runs.setdefault(name, {})
+        epoch = None
+        for line in lines:
+            m = epoch_line.match(line)
+            if m:
+                epoch = int(m.group(1))
+                times[epoch] = _duration(m.group(3))
+                continue
+            m = val_line.search(line)
+            if m and epoch in times:
+                times[epoch] += _duration(m.group(1))
+                epoch = None
+    return {name: times for name, times in runs.items() if times}
+
+def time_to_target(maps, seconds, target):
+    """第一個 mAP50-95 >= target 的 epoch 與到那時累積的秒數；缺少任何一個 epoch 的時間則秒數為 None。"""
+    for i, value in enumerate(maps):
+        if value >= target:
+            elapsed = [seconds.get(e) for e in range(1, i + 2)]
+            return i + 1, (sum(elapsed) if None not in elapsed else None)
+    return None, None
+
+def _load_args(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def benchmark_time_to_target(target, progressive_runs=(), record_dir="training_record", log_dir="training_logs"):
+    """
+    比較達到 mAP50-95 >= target 所需的 epoch 數與時間：
+      - 固定解析度：training_record/csvs/<run>.results.csv 與 yaml/<run>.args.yaml，每個 epoch 的時間從 training_logs 解析
+      - 逐步放大：progressive_runs 中每個訓練資料夾 (runs/detect/trainNN) 的 results.csv、args.yaml 與 epoch_times.csv
+    注意驗證解析度不同時 mAP 不能直接比較 (固定解析度的訓練以訓練的 imgsz 驗證)，表格中一併列出。
+    """
+    log_times = log_epoch_times(log_dir)
+    rows = []
+    for csv_path in sorted(glob.glob(os.path.join(record_dir, "csvs", "*.results.csv"))):
+        name = os.path.basename(csv_path).split(".")[0]
+        args_path = os.path.join(record_dir, "yaml", f"{name}.args.yaml")
+        args = _load_args(args_path) if os.path.exists(args_path) else {}
+        rows.append((name, str(args.get("imgsz", "?")), args.get("imgsz", "?"),
+                     read_results(csv_path), log_times.get(name, {})))
+    for run_dir in progressive_runs:
+        args = _load_args(os.path.join(run_dir, "args.yaml"))
+        seconds = {}
+        times_path = os.path.join(run_dir, EPOCH_TIMES)
+        if os.path.exists(times_path):
+            with open(times_path, "r", encoding="utf-8") as f:
+                seconds = {int(r["epoch"]): float(r["seconds"]) for r in csv.DictReader(f)}
+        schedule = args.get("imgsz_schedule") or [[args.get("epochs"), args.get("imgsz")]]
+        label = "→".join(f"{imgsz}×{epochs}" for epochs, imgsz in schedule)
+        rows.append((os.path.basename(os.path.normpath(run_dir)), label, args.get("val_imgsz", args.get("imgsz")),
+                     read_results(os.path.join(run_dir, "results.csv")), seconds))
+
+    print(f"📊 達到 mAP50-95 >= {target} 所需時間")
+    print(f"{'訓練':10s} {'解析度':24s} {'驗證':>5s} {'epochs':>7s} {'最佳 mAP':>9s} {'達標 epoch':>10s} {'時間 (小時)':>11s}")
+    report = {}
+    for name, label, val_size, results, seconds in rows:
+        maps = results.get(MAP_COLUMN, [])
+        if not maps:
+            continue
+        epoch, elapsed = time_to_target(maps, seconds, target)
+        report[name] = {"imgsz": label, "val_imgsz": val_size, "epochs": len(maps), "best_map": max(maps),
+                        "target_epoch": epoch, "hours": round(elapsed / 3600, 2) if elapsed is not None else None}
+        hours = f"{elapsed / 3600:11.2f}" if elapsed is not None else f"{'-' if epoch is None else '無紀錄':>11s}"
+        print(f"{name:10s} {label:24s} {str(val_size):>5s} {len(maps):7d} {max(maps):9.4f} "
+              f"{epoch or '-':>10} {hours}")
+    print("ℹ️ 時間包含每個 epoch 的驗證；不同電腦或 batch 的訓練時間不能直接比較")
+    return report
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    target_map = 0.2               # 比較達到這個 mAP50-95 所需的時間
+    progressive_runs = []          # 例如 ["runs/detect/train31"] (train.py 設定 imgsz_schedule 訓練的結果)
+
+    benchmark_time_to_target(target_map, progressive_runs)
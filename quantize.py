@@ -0,0 +1,259 @@
+import gc
+import io
+import json
+import os
+import random
+
+import cv2
+import numpy as np
+import psutil
+import torch
+from torch.ao import quantization as tq
+from ultralytics import YOLOv10
+
+from model_backends import backend_weights, benchmark_model, export_backends, load_model
+
+try:
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+except ImportError:  # onnx / onnxruntime 為選用套件，只有 ONNX 量化需要
+    onnx = None
+    CalibrationDataReader = object
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# val.py 印出的偵測指標 (results.results_dict)
+METRIC_KEYS = {
+    "precision": "metrics/precision(B)",
+    "recall": "metrics/recall(B)",
+    "mAP50": "metrics/mAP50(B)",
+    "mAP50-95": "metrics/mAP50-95(B)",
+}
+
+def calibration_images(image_dir, count=200, seed=42):
+    """從 image_dir (例如 images/val) 隨機抽出 count 張圖片 (BGR) 作為量化校正資料。"""
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        paths += [os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTS)]
+    paths = sorted(paths)
+    random.Random(seed).shuffle(paths)
+    images = [cv2.imread(p) for p in paths[:count]]
+    return [im for im in images if im is not None]
+
+def letterbox(image, imgsz=640):
+    """與推論相同的前處理：等比例縮放、以 114 補邊成 imgsz x imgsz，回傳 (1, 3, H, W) 的 RGB float32 (0~1)。"""
+    h, w = image.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = round(h * r), round(w * r)
+    top, left = (imgsz - nh) // 2, (imgsz - nw) // 2
+    canvas = np.full((imgsz, imgsz, 3), 114, np.uint8)
+    canvas[top:top + nh, left:left + nw] = cv2.resize(image, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    return (canvas[:, :, ::-1].transpose(2, 0, 1)[None] / 255.0).astype(np.float32)
+
+def _quant_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError("此 PyTorch 版本不支援量化運算")
+
+def _fused_model(model_path):
+    yolo = YOLOv10(model_path)
+    yolo.model = yolo.model.fuse(verbose=False).float().eval()
+    return yolo
+
+def quantize_pytorch_dynamic(model_path):
+    """
+    PyTorch 動態量化 (權重 INT8，activation 推論時才量化)。
+    torch 只支援 nn.Linear / RNN 類的動態量化，YOLOv10 幾乎全是卷積層，可量化的層數可能為 0。
+
+    Returns:
+        (YOLOv10, 量化的層數)
+    """
+    yolo = _fused_model(model_path)
+    torch.backends.quantized.engine = _quant_engine()
+    before = sum(isinstance(m, torch.nn.Linear) for m in yolo.model.modules())
+    yolo.model = tq.quantize_dynamic(yolo.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return yolo, before
+
+def quantize_pytorch_static(model_path, calib_images, imgsz=640):
+    """
+    PyTorch 靜態量化 (eager mode)：每個 Conv2d 包成 QuantStub -> INT8 Conv -> DeQuantStub，
+    以校正圖片統計 activation 的範圍；SiLU、Concat 與 DFL 仍維持 FP32。
+
+    Returns:
+        (YOLOv10, 量化的層數)
+    """
+    yolo = _fused_model(model_path)
+    engine = _quant_engine()
+    torch.backends.quantized.engine = engine
+    qconfig = tq.get_default_qconfig(engine)
+
+    targets = []
+    for name, module in yolo.model.named_modules():
+        if "dfl" in name:  # DFL 是固定權重的分布積分，量化會直接影響框的位置
+            continue
+        for attr, child in module.named_children():
+            if isinstance(child, torch.nn.Conv2d):
+                targets.append((module, attr, child))
+    for module, attr, conv in targets:
+        wrapper = tq.QuantWrapper(conv)
+        wrapper.qconfig = qconfig
+        setattr(module, attr, wrapper)
+
+    tq.prepare(yolo.model, inplace=True)
+    with torch.no_grad():
+        for image in calib_images:
+            yolo.model(torch.from_numpy(letterbox(image, imgsz)))
+    tq.convert(yolo.model, inplace=True)
+    return yolo, len(targets)
+
+class _LetterboxReader(CalibrationDataReader):
+    """提供 ONNX Runtime 靜態量化的校正輸入。"""
+
+    def __init__(self, input_name, images, imgsz):
+        self.feeds = iter([{input_name: letterbox(image, imgsz)} for image in images])
+
+    def get_next(self):
+        return next(self.feeds, None)
+
+def _copy_metadata(src, dst):
+    """量化後的 ONNX 保留原本的 metadata (類別名稱、stride、imgsz)，ultralytics 才能正確載入。"""
+    meta = {p.key: p.value for p in onnx.load(src, load_external_data=False).metadata_props}
+    model = onnx.load(dst)
+    del model.metadata_props[:]
+    for key, value in meta.items():
+        model.metadata_props.add(key=key, value=value)
+    onnx.save(model, dst)
+
+def quantize_onnx(onnx_path, calib_images=None, imgsz=640, output_path=None):
+    """
+    ONNX Runtime 量化：calib_images 為 None 時做動態量化 (ConvInteger)，
+    否則以 QDQ 格式做靜態量化 (per-channel 權重，只量化 Conv，後處理維持 FP32)。
+    """
+    if onnx is None:
+        raise ImportError("ONNX 量化需要 onnx 與 onnxruntime 套件")
+    stem = os.path.splitext(onnx_path)[0]
+    if output_path is None:
+        output_path = f"{stem}.int8{'' if calib_images else 'dyn'}.onnx"
+
+    if calib_images is None:
+        quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QUInt8)
+    else:
+        prepared = f"{stem}.preprocessed.onnx"
+        try:
+            quant_pre_process(onnx_path, prepared)
+        except Exception as e:
+            print(f"⚠️ quant_pre_process 失敗，直接量化原始模型: {e}")
+            prepared = onnx_path
+        input_name = onnx.load(prepared, load_external_data=False).graph.input[0].name
+        quantize_static(
+            prepared, output_path, _LetterboxReader(input_name, calib_images, imgsz),
+            quant_format=QuantFormat.QDQ, per_channel=True, op_types_to_quantize=["Conv"],
+            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        )
+        if prepared != onnx_path:
+            os.remove(prepared)
+    _copy_metadata(onnx_path, output_path)
+    return output_path
+
+def _state_dict_mb(module):
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+def evaluate(model, data_yaml, bench_images, imgsz=640, batch=16, conf=0.25, size_mb=None):
+    """
+    量測一個模型的延遲 (batch=1)、記憶體與 val.py 相同的偵測指標 (precision / recall / mAP50 / mAP50-95)。
+    記憶體為模型大小與推論時行程 RSS 的增加量。
+    """
+    process = psutil.Process()
+    gc.collect()
+    rss_before = process.memory_info().rss
+    latency_ms = 1000 / benchmark_model(model, bench_images, imgsz, conf, batch_size=1)
+    rss_mb = (process.memory_info().rss - rss_before) / 2 ** 20
+
+    results = model.val(data=data_yaml, imgsz=imgsz, batch=batch, device="cpu", plots=False, verbose=False)
+    report = {
+        "latency_ms": round(latency_ms, 2),
+        "size_mb": round(size_mb if size_mb is not None else _state_dict_mb(model.model), 2),
+        "rss_increase_mb": round(rss_mb, 1),
+    }
+    report.update({k: round(float(results.results_dict[v]), 4) for k, v in METRIC_KEYS.items()})
+    return report
+
+def quantization_report(model_path, data_yaml, calib_dir, imgsz=640, batch=16, calib_count=200,
+                        bench_count=32, methods=("pytorch_dynamic", "pytorch_static", "onnx_dynamic", "onnx_static")):
+    """
+    對 FP32 權重做各種 INT8 量化，並與 FP32 比較延遲、記憶體與 mAP50-95 (CPU)。
+    結果寫入 <權重>.quant.json；ONNX 靜態量化的模型另存為 <權重>.int8.onnx，可用 backend="onnx_int8" 推論。
+    """
+    calib = calibration_images(calib_dir, calib_count)
+    if not calib:
+        print(f"❌ {calib_dir} 中沒有找到圖片，無法校正")
+        return None
+    bench = calib[:bench_count]
+    print(f"ℹ️ 校正圖片 {len(calib)} 張 (來自 {calib_dir})，測速圖片 {len(bench)} 張")
+
+    reports = {}
+    print("\n📊 FP32 (pytorch)")
+    reports["fp32"] = evaluate(load_model(model_path), data_yaml, bench, imgsz, batch,
+                               size_mb=os.path.getsize(model_path) / 2 ** 20)
+
+    onnx_path = None
+    for method in methods:
+        print(f"\n📊 {method}")
+        try:
+            if method.startswith("pytorch"):
+                if method == "pytorch_dynamic":
+                    model, layers = quantize_pytorch_dynamic(model_path)
+                else:
+                    model, layers = quantize_pytorch_static(model_path, calib, imgsz)
+                if layers == 0:
+                    print(f"⚠️ {method}: 模型中沒有可量化的層，略過")
+                    continue
+                reports[method] = {"quantized_layers": layers, **evaluate(model, data_yaml, bench, imgsz, batch)}
+            else:
+                if onnx_path is None:
+                    onnx_path = export_backends(model_path, formats=("onnx",), imgsz=imgsz)["onnx"]
+                    reports["fp32_onnx"] = evaluate(load_model(onnx_path), data_yaml, bench, imgsz, batch,
+                                                    size_mb=os.path.getsize(onnx_path) / 2 ** 20)
+                if method == "onnx_dynamic":
+                    path = quantize_onnx(onnx_path, None, imgsz)
+                else:
+                    path = quantize_onnx(onnx_path, calib, imgsz, output_path=backend_weights(model_path, "onnx_int8"))
+                reports[method] = {"path": path, **evaluate(load_model(path), data_yaml, bench, imgsz, batch,
+                                                            size_mb=os.path.getsize(path) / 2 ** 20)}
+        except Exception as e:
+            print(f"❌ {method} 失敗: {e}")
+            reports[method] = {"error": str(e)}
+
+    base = reports["fp32"]
+    print(f"\n{'方法':16s} {'延遲 ms':>9s} {'加速':>6s} {'大小 MB':>8s} {'RSS MB':>8s} {'mAP50':>7s} {'mAP50-95':>9s} {'ΔmAP50-95':>10s}")
+    for name, r in reports.items():
+        if "error" in r:
+            print(f"{name:16s} ❌ {r['error']}")
+            continue
+        print(f"{name:16s} {r['latency_ms']:9.2f} {base['latency_ms'] / r['latency_ms']:5.2f}x {r['size_mb']:8.2f} "
+              f"{r['rss_increase_mb']:8.1f} {r['mAP50']:7.4f} {r['mAP50-95']:9.4f} {r['mAP50-95'] - base['mAP50-95']:+10.4f}")
+
+    record_path = os.path.splitext(model_path)[0] + ".quant.json"
+    with open(record_path, "w", encoding="utf-8") as f:
+        json.dump({"imgsz": imgsz, "calibration_dir": calib_dir, "calibration_images": len(calib),
+                   "results": reports}, f, ensure_ascii=False, indent=2)
+    print(f"\n📝 量化報告已寫入 {record_path}")
+    return reports
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    model_weight = 'savemodel/yolov10n_sixray19.pt'
+    dataset_path = "./../SIXray_YOLO/dataset.yaml"      # 與 val.py 相同的資料集設定 (計算 mAP)
+    calibration_dir = "./../SIXray_YOLO/images/val"     # 校正圖片來源
+    image_size = 640
+    batch_size = 16
+    calibration_count = 200                             # 校正圖片數
+
+    quantization_report(model_weight, dataset_path, calibration_dir, imgsz=image_size, batch=batch_size,
+                        calib_count=calibration_count)
@@ -1,24 +1,51 @@
 import os
-import shutil
 import random
 
+from materialize import Materializer
+from split_lists import load_class_names, write_split_lists, write_dataset_yaml
+
 # --------- 設定路徑 (old routes)---------
 negative_dir = "./../SIXray/JPEGImages"  # 原始負樣本資料夾
 output_dir = "./../SIXray_YOLO"  # 最終 YOLO 資料夾
 
+# 圖片放置方式: "copy", "hardlink", "reflink", "symlink" (見 materialize.py)
+MATERIALIZE_MODE = "hardlink"
+COPY_WORKERS = 8  # 並行放置檔案的執行緒數 (1 為逐一處理)
+
+SEED = 42
+NUM_NEGATIVES = None  # 使用的負樣本數 (None 表示全部)，用來調整正負樣本比例
+
+# 分割方式:
+#   "dirs"  : 放到 {split}/images 並在 {split}/labels 產生空 txt (原本的作法)
+#   "lists" : 所有負樣本只放一次到 images/negative (空 labels 在 labels/negative)，
+#             並在 splits/<SPLIT_NAME>/ 寫出 train.txt / val.txt / test.txt
+SPLIT_FORMAT = "dirs"
+SPLIT_NAME = f"negatives_seed{SEED}" + (f"_n{NUM_NEGATIVES}" if NUM_NEGATIVES else "")
+# 正樣本清單資料夾 (split_yolo_data.py 以 SPLIT_FORMAT = "lists" 產生)；
+# 設定後會另外產生合併正負樣本清單的 dataset.yaml，None 則只寫負樣本清單
+POSITIVE_LIST_DIR = os.path.join(output_dir, "splits", "stratified_seed42")
+CLASSES_YAML = os.path.join(output_dir, "dataset.yaml")
+
 splits = {
     "train": 0.8,
     "test": 0.2,
 }
 
 # 先建立資料夾結構
-for split in ["train", "val", "test"]:
+if SPLIT_FORMAT == "lists":
     for folder in ["images", "labels"]:
-        os.makedirs(os.path.join(output_dir, split, folder), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, folder, "negative"), exist_ok=True)
+else:
+    for split in ["train", "val", "test"]:
+        for folder in ["images", "labels"]:
+            os.makedirs(os.path.join(output_dir, split, folder), exist_ok=True)
 
 # --------- 取得所有圖片 ---------
-all_imgs = [f for f in os.listdir(negative_dir) if f.lower().endswith(".jpg")]
+all_imgs = sorted(f for f in os.listdir(negative_dir) if f.lower().endswith(".jpg"))
+random.seed(SEED)
 random.shuffle(all_imgs)
+if NUM_NEGATIVES:
+    all_imgs = all_imgs[:NUM_NEGATIVES]
 
 # --------- 切分 train/test ---------
 num_total = len(all_imgs)
@@ -37,19 +64,47 @@ split_dict = {
     "test": test_imgs
 }
 
-# --------- 複製圖片並產生空的 labels ---------
+# --------- 放置圖片並產生空的 labels ---------
+materializer = Materializer(MATERIALIZE_MODE, workers=COPY_WORKERS, desc="negatives")
+split_images = {}
 for split, imgs in split_dict.items():
+    # 清單模式下所有 split 共用 images/negative 與 labels/negative
+    if SPLIT_FORMAT == "lists":
+        image_dir = os.path.join(output_dir, "images", "negative")
+        label_dir = os.path.join(output_dir, "labels", "negative")
+    else:
+        image_dir = os.path.join(output_dir, split, "images")
+        label_dir = os.path.join(output_dir, split, "labels")
+
+    split_images[split] = []
     for img_name in imgs:
-        # 複製圖片
+        # 放置圖片 (hardlink / copy ...)
         src_img = os.path.join(negative_dir, img_name)
-        dst_img = os.path.join(output_dir, split, "images", img_name)
-        shutil.copy2(src_img, dst_img)
+        dst_img = os.path.join(image_dir, img_name)
+        materializer.place(src_img, dst_img)
+        split_images[split].append(dst_img)
 
         # 生成空 txt
         label_name = os.path.splitext(img_name)[0] + ".txt"
-        label_path = os.path.join(output_dir, split, "labels", label_name)
+        label_path = os.path.join(label_dir, label_name)
         with open(label_path, "w") as f:
             pass  # 空檔案
+materializer.close()
+
+if SPLIT_FORMAT == "lists":
+    list_dir = os.path.join(output_dir, "splits", SPLIT_NAME)
+    list_files = write_split_lists(list_dir, split_images)
+
+    # 與正樣本清單合併成一份 dataset.yaml (ultralytics 的 train/val/test 可以是多個 txt)
+    if POSITIVE_LIST_DIR and os.path.isdir(POSITIVE_LIST_DIR):
+        combined = {
+            split: [os.path.join(POSITIVE_LIST_DIR, f"{split}.txt"), list_files[split]]
+            for split in list_files
+            if os.path.exists(os.path.join(POSITIVE_LIST_DIR, f"{split}.txt"))
+        }
+        write_dataset_yaml(os.path.join(list_dir, "dataset.yaml"), load_class_names(CLASSES_YAML), combined)
+    else:
+        print(f"ℹ️ 找不到正樣本清單資料夾 {POSITIVE_LIST_DIR}，只寫出負樣本清單。")
 
 print("Negative dataset 分割完成！")
 print(f"Train: {len(train_imgs)}張, Val: {len(val_imgs)}張, Test: {len(test_imgs)}張")
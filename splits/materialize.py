@@ -0,0 +1,201 @@
+import errno
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from tqdm import tqdm
+
+# 可用的 materialize 模式
+#   copy     : shutil.copy2 (原本的作法)
+#   hardlink : 硬連結，不佔額外空間；跨檔案系統時自動改為 copy
+#   reflink  : copy-on-write 複製 (Linux btrfs/xfs 等)；不支援或跨檔案系統時改為 copy
+#   symlink  : 符號連結 (Windows 需要開發人員模式或系統管理員權限)
+# 只用清單而不重新放置檔案的分割請用 split_lists.py：圖片仍需放在 .../images/ 底下 (一次)，
+# ultralytics 才能把路徑中的 /images/ 換成 /labels/ 找到標註
+MODES = ("copy", "hardlink", "reflink", "symlink")
+
+# Linux 的 FICLONE ioctl (linux/fs.h)
+FICLONE = 0x40049409
+
+# 代表「無法在這兩個位置之間建立連結/reflink」的錯誤，遇到時改用 copy
+_CROSS_DEVICE_ERRNOS = {errno.EXDEV}
+_REFLINK_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.EINVAL, errno.ENOTTY, errno.EBADF}
+_WINERROR_NOT_SAME_DEVICE = 17
+
+# 外接硬碟 / 網路磁碟上可能只是暫時性的錯誤，會等待後重試
+_TRANSIENT_ERRNOS = {errno.EAGAIN, errno.EBUSY, errno.EINTR, errno.EIO, errno.ETIMEDOUT}
+
+def _is_transient(e):
+    return isinstance(e, (TimeoutError, ConnectionError)) or (isinstance(e, OSError) and e.errno in _TRANSIENT_ERRNOS)
+
+def _is_cross_device(e):
+    return e.errno in _CROSS_DEVICE_ERRNOS or getattr(e, "winerror", None) == _WINERROR_NOT_SAME_DEVICE
+
+def _reflink(src, dst):
+    """以 FICLONE 建立 reflink；不支援的平台丟出 OSError(EOPNOTSUPP)。"""
+    if not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink 目前只支援 Linux")
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+class Materializer:
+    """
+    將來源檔案「放到」資料集目標位置的共用層，取代各腳本中的 shutil.copy2。
+
+    用法:
+        with Materializer("hardlink") as m:
+            m.place(src_img, dst_img)
+        # 離開 with 區塊時會處理佇列中的檔案並印出統計
+
+    workers > 1 時 place() 只把工作排入佇列，flush() / close() 時以執行緒池並行處理
+    (例如複製到外接硬碟時，單檔延遲不再決定總時間)，並顯示 MB/s 與 檔案/s；
+    暫時性的 I/O 錯誤會重試 retries 次。
+    """
+
+    def __init__(self, mode="hardlink", workers=1, retries=3, desc="materialize"):
+        if mode not in MODES:
+            raise ValueError(f"未知的 materialize 模式: {mode} (可用: {', '.join(MODES)})")
+        self.mode = mode
+        self.workers = max(1, int(workers or 1))
+        self.retries = retries
+        self.desc = desc
+        self.stats = Counter()                  # 實際使用的方式 -> 檔案數
+        self.pending = []                       # 並行模式: 等待處理的 (src, dst)
+        self.failures = []                      # (src, dst, 錯誤)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def place(self, src, dst):
+        """
+        依模式將 src 放到 dst，回傳實際使用的方式 ("copy"、"hardlink"...)；並行模式下回傳 "queued"。
+        失敗時 (兩種模式相同) 記錄在 failures 並計入 stats["failed"]，處理結果請在 close() 後由 stats / failures 取得。
+        """
+        if self.workers > 1:
+            self.pending.append((src, dst))
+            return "queued"
+        try:
+            return self._count(self._place_with_retry(src, dst)[0])
+        except Exception as e:
+            self.failures.append((src, dst, e))
+            print(f"❌ 無法放置 {src} -> {dst}: {e}")
+            return self._count("failed")
+
+    def _place(self, src, dst):
+        # 來源與目標是同一個檔案 (例如先前已連結過) 時不需要任何動作
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            return "skip"
+        if os.path.lexists(dst):
+            os.unlink(dst)
+
+        if self.mode == "copy":
+            shutil.copy2(src, dst)
+            return "copy"
+
+        if self.mode == "symlink":
+            os.symlink(os.path.abspath(src), dst)
+            return "symlink"
+
+        if self.mode == "hardlink":
+            try:
+                os.link(src, dst)
+                return "hardlink"
+            except OSError as e:
+                if not _is_cross_device(e):
+                    raise
+        else:  # reflink
+            try:
+                _reflink(src, dst)
+                return "reflink"
+            except OSError as e:
+                if e.errno not in _REFLINK_UNSUPPORTED_ERRNOS and not _is_cross_device(e):
+                    raise
+
+        # 跨檔案系統 (或不支援 reflink) 時才退回複製
+        shutil.copy2(src, dst)
+        return "copy"
+
+    def _place_with_retry(self, src, dst):
+        """執行緒中執行：回傳 (方式, 複製的位元組數)，暫時性錯誤以指數退避重試。"""
+        for attempt in range(self.retries + 1):
+            try:
+                method = self._place(src, dst)
+                return method, (os.path.getsize(dst) if method == "copy" else 0)
+            except Exception as e:
+                if attempt == self.retries or not _is_transient(e):
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def flush(self):
+        """並行處理所有排入佇列的檔案 (同時最多 workers * 4 個進行中)。"""
+        jobs, self.pending = self.pending, []
+        if not jobs:
+            return
+
+        # 一次建立所有目標資料夾，避免每個檔案各自檢查
+        for folder in {os.path.dirname(os.path.abspath(dst)) for _, dst in jobs}:
+            os.makedirs(folder, exist_ok=True)
+
+        n_failed_before = len(self.failures)
+        copied_bytes = 0
+        start = time.perf_counter()
+        max_in_flight = self.workers * 4
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                tqdm(total=len(jobs), desc=f"{self.desc} ({self.mode}, {self.workers} threads)", unit="file") as pbar:
+            in_flight = {}
+            job_iter = iter(jobs)
+            while True:
+                for src, dst in job_iter:
+                    in_flight[pool.submit(self._place_with_retry, src, dst)] = (src, dst)
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    src, dst = in_flight.pop(future)
+                    try:
+                        method, n_bytes = future.result()
+                        self._count(method)
+                        copied_bytes += n_bytes
+                    except Exception as e:
+                        self.failures.append((src, dst, e))
+                        self._count("failed")
+                    pbar.update(1)
+
+                elapsed = max(time.perf_counter() - start, 1e-9)
+                pbar.set_postfix_str(f"{copied_bytes / elapsed / 1e6:.1f} MB/s, {pbar.n / elapsed:.0f} files/s", refresh=False)
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(f"ℹ️ {len(jobs)} 個檔案，{elapsed:.1f} 秒 ({len(jobs) / elapsed:.0f} 檔案/秒，"
+              f"複製 {copied_bytes / 1e6:.1f} MB，{copied_bytes / elapsed / 1e6:.1f} MB/s)")
+        failures = self.failures[n_failed_before:]
+        for src, dst, e in failures[:10]:
+            print(f"❌ 無法放置 {src} -> {dst}: {e}")
+        if len(failures) > 10:
+            print(f"❌ ... 共 {len(failures)} 個檔案失敗")
+
+    def _count(self, method):
+        self.stats[method] += 1
+        return method
+
+    def close(self):
+        self.flush()
+        if self.stats:
+            summary = ", ".join(f"{method}={n}" for method, n in self.stats.most_common())
+            print(f"ℹ️ materialize ({self.mode}): {summary}")
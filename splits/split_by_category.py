@@ -1,12 +1,22 @@
 import os
-import shutil
-import xml.etree.ElementTree as ET
+import sys
+
+from materialize import Materializer
+
+# 共用的標註索引位於 transfers/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+from annotation_index import AnnotationIndex
 
 # ===== 設定路徑 =====(old routes)
 positive_img_dir = "./../SIXray/Image"   # 原始圖片資料夾
 positive_xml_dir = "./../SIXray/positive-Annotation"     # 原始 XML 資料夾
 output_dir = "./../SIXray_Categories"       # 複製後的類別資料夾根目錄
 
+# 檔案放置方式: "copy", "hardlink", "reflink", "symlink" (見 materialize.py)
+# 同一張圖屬於多個類別時，hardlink 不會重複佔用空間
+MATERIALIZE_MODE = "hardlink"
+COPY_WORKERS = 8  # 並行放置檔案的執行緒數 (1 為逐一處理)
+
 # 違禁品種類列表
 categories = ["Gun", "Knife", "Wrench", "Pliers", "Scissors"]
 
@@ -15,41 +25,34 @@ for cat in categories:
     os.makedirs(os.path.join(output_dir, cat, "images"), exist_ok=True)
     os.makedirs(os.path.join(output_dir, cat, "xmls"), exist_ok=True)
 
-# ===== 讀 XML 並複製 =====
-xml_files = [f for f in os.listdir(positive_xml_dir) if f.endswith(".xml")]
+# ===== 讀標註索引並放置檔案 =====
+materializer = Materializer(MATERIALIZE_MODE, workers=COPY_WORKERS, desc="categories")
+
+# 第一次執行時會解析所有 XML 並建立索引
+index = AnnotationIndex.load_or_build(positive_xml_dir)
 
-for xml_file in xml_files:
+for image_id in index.parse_errors():
+    print(f"[ERROR] 無法解析 XML: {image_id}.xml")
+
+for image_id, names in index.names_per_image().items():
+    xml_file = image_id + ".xml"
     xml_path = os.path.join(positive_xml_dir, xml_file)
-    
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        objects = root.findall("object")
-        
-        # 取出該圖裡的所有違禁品種類
-        obj_categories = set()
-        for obj in objects:
-            name_tag = obj.find("name")
-            if name_tag is not None:
-                obj_categories.add(name_tag.text)
-        
-        # 對每個種類複製檔案
-        for cat in obj_categories:
-            if cat in categories:
-                # 對應圖片檔名
-                img_file = os.path.splitext(xml_file)[0] + ".jpg"
-                src_img_path = os.path.join(positive_img_dir, img_file)
-                dst_img_path = os.path.join(output_dir, cat, "images", img_file)
-                dst_xml_path = os.path.join(output_dir, cat, "xmls", xml_file)
-                
-                if os.path.exists(src_img_path):
-                    shutil.copy2(src_img_path, dst_img_path)
-                else:
-                    print(f"[WARNING] 圖片不存在: {img_file}")
-                
-                shutil.copy2(xml_path, dst_xml_path)
-                
-    except ET.ParseError:
-        print(f"[ERROR] 無法解析 XML: {xml_file}")
 
+    # 對每個種類複製檔案
+    for cat in set(names):
+        if cat in categories:
+            # 對應圖片檔名
+            img_file = image_id + ".jpg"
+            src_img_path = os.path.join(positive_img_dir, img_file)
+            dst_img_path = os.path.join(output_dir, cat, "images", img_file)
+            dst_xml_path = os.path.join(output_dir, cat, "xmls", xml_file)
+
+            if os.path.exists(src_img_path):
+                materializer.place(src_img_path, dst_img_path)
+            else:
+                print(f"[WARNING] 圖片不存在: {img_file}")
+
+            materializer.place(xml_path, dst_xml_path)
+
+materializer.close()
 print("複製完成！")
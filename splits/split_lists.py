@@ -0,0 +1,74 @@
+import os
+
+import yaml
+
+# dataset.yaml 讀不到時使用的 SIXray 類別 (順序需與 labels 中的類別代碼一致)
+SIXRAY_CLASSES = ["gun", "knife", "wrench", "pliers", "scissors"]
+
+SPLITS = ("train", "val", "test")
+
+def load_class_names(yaml_path, default=SIXRAY_CLASSES):
+    """從現有的 dataset.yaml 讀取 names (依索引排序)；讀不到時回傳 default。"""
+    try:
+        with open(yaml_path, "r", encoding="utf-8") as f:
+            names = yaml.safe_load(f).get("names", {})
+        if isinstance(names, dict):
+            return [names[i] for i in sorted(names)]
+        return list(names)
+    except Exception as e:
+        print(f"⚠️ 無法讀取 {yaml_path} 的類別 ({e})，使用預設類別: {default}")
+        return list(default)
+
+def write_image_list(list_path, image_paths):
+    """寫出 YOLO 圖片清單 (每行一個圖片絕對路徑)，回傳圖片數。"""
+    os.makedirs(os.path.dirname(os.path.abspath(list_path)), exist_ok=True)
+    paths = [os.path.abspath(p) for p in image_paths]
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paths) + ("\n" if paths else ""))
+    return len(paths)
+
+def write_split_lists(list_dir, split_images):
+    """
+    將 {split: [圖片路徑, ...]} 寫成 list_dir/{split}.txt。
+
+    ultralytics 會把圖片路徑中的 /images/ 換成 /labels/ 來找標註，
+    因此清單內的圖片必須放在 .../images/... 底下，且旁邊有對應的 labels 資料夾。
+
+    Returns:
+        dict: split -> 清單檔路徑
+    """
+    list_files = {}
+    for split, image_paths in split_images.items():
+        list_path = os.path.join(list_dir, f"{split}.txt")
+        n = write_image_list(list_path, image_paths)
+        list_files[split] = list_path
+        print(f"📝 已寫出 {split} 清單: {list_path} ({n} 張)")
+    return list_files
+
+def write_dataset_yaml(yaml_path, names, split_files):
+    """
+    產生 ultralytics 可直接使用的 dataset.yaml。
+
+    Args:
+        yaml_path: 輸出的 dataset.yaml 路徑。
+        names: 類別名稱列表。
+        split_files: split -> 清單檔路徑，或清單檔路徑的列表 (例如正樣本 + 負樣本)。
+    """
+    yaml_dir = os.path.dirname(os.path.abspath(yaml_path))
+
+    def rel(p):
+        return os.path.relpath(os.path.abspath(p), yaml_dir).replace(os.sep, "/")
+
+    data = {"path": yaml_dir.replace(os.sep, "/")}
+    for split in SPLITS:
+        files = split_files.get(split)
+        if not files:
+            continue
+        data[split] = [rel(p) for p in files] if isinstance(files, (list, tuple)) else rel(files)
+    data["names"] = {i: name for i, name in enumerate(names)}
+
+    os.makedirs(yaml_dir, exist_ok=True)
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(data, f, sort_keys=False, allow_unicode=True)
+    print(f"📝 已產生 dataset.yaml: {yaml_path}")
+    return yaml_path
@@ -13,18 +13,25 @@ split_categories_to_yolo.py
         xmls/
 
 - TARGET_DIR: 會建立 images/{train,val,test} 與 xmls/{train,val,test}
+  SPLIT_FORMAT = "lists" 時改為只建立一份 images/all 與 xml_all，
+  並在 splits/<SPLIT_NAME>/ 寫出 train.txt / val.txt / test.txt 與 dataset.yaml
 
 行為:
 - 以圖片 basename (no ext) 當 key 做去重
-- 隨機 shuffle，依 72% / 8% / 20% 分配
-- 複製檔案並印出統計資訊
+- 依 72% / 8% / 20% 分配 (SPLIT_METHOD: 多標籤分層分割或單純隨機 shuffle)
+- 依 MATERIALIZE_MODE 放置檔案 (copy / hardlink / reflink / symlink) 並印出統計資訊
 """
 
 import os
-import shutil
 import random
 from collections import defaultdict, Counter
 
+import numpy as np
+
+from materialize import Materializer
+from stratify import iterative_stratification, balance_report
+from split_lists import load_class_names, write_split_lists, write_dataset_yaml
+
 # ===== 設定 ===== (old routes)
 SOURCE_CATEGORIES_DIR = "./../SIXray_Categories"   # <-- 改成你 categories 根目錄
 TARGET_DIR = "./../SIXray_YOLO"          # <-- 改成你想輸出的資料夾
@@ -36,8 +43,32 @@ TRAIN_RATIO = 0.72
 VAL_RATIO = 0.08
 TEST_RATIO = 0.20
 
+# 分配方式:
+#   "stratified" : 依每張圖所屬的類別集合做多標籤 iterative stratification，各類別在各 split 的比例都接近目標
+#   "random"     : 單純隨機 shuffle (原本的作法)
+SPLIT_METHOD = "stratified"
+
+# 檔案放置方式: "copy", "hardlink", "reflink", "symlink"
+# hardlink / reflink 跨檔案系統時會自動改為 copy；
+# 只想寫清單、不重新放置每個 split 時請用 SPLIT_FORMAT = "lists" (圖片只放一次到 images/all)
+MATERIALIZE_MODE = "hardlink"
+COPY_WORKERS = 8  # 並行放置檔案的執行緒數 (複製到外接硬碟等慢速磁碟時調高；1 為逐一處理)
+
+# 分割方式:
+#   "dirs"  : 將檔案放到 images/{split}、xmls/{split} (原本的作法)
+#   "lists" : 所有圖片只放一次到 images/all (XML 放到 xml_all)，各 split 只是一份圖片清單；
+#             換 SEED 或比例重新分割時只需重寫幾個 txt。
+#             labels 請用 transfers/voc2yolo_image.py 以 split "all" 轉換 (產生 labels/all)
+SPLIT_FORMAT = "dirs"
+SPLIT_NAME = f"{SPLIT_METHOD}_seed{SEED}"                 # 清單輸出到 TARGET_DIR/splits/<SPLIT_NAME>/
+CLASSES_YAML = os.path.join(TARGET_DIR, "dataset.yaml")  # 產生 dataset.yaml 時沿用這裡的 names
+
 # ===== 準備目標資料夾 =====
-for sub in ["images/train", "images/val", "images/test", "xmls/train", "xmls/val", "xmls/test"]:
+if SPLIT_FORMAT == "lists":
+    target_subdirs = ["images/all", "xml_all"]
+else:
+    target_subdirs = ["images/train", "images/val", "images/test", "xmls/train", "xmls/val", "xmls/test"]
+for sub in target_subdirs:
     os.makedirs(os.path.join(TARGET_DIR, sub), exist_ok=True)
 
 # ===== 掃描 categories 資料夾 =====s
@@ -88,23 +119,45 @@ print(f"總共發現唯一圖片數 (basename): {n_total}")
 if n_total == 0:
     raise SystemExit("沒有找到任何圖片，請檢查 SOURCE_CATEGORIES_DIR 路徑與子資料夾結構。")
 
-# ===== 建立可分配的列表並 shuffle =====
-random.seed(SEED)
-all_basenames = list(images_map.keys())
-random.shuffle(all_basenames)
-
-n_train = int(n_total * TRAIN_RATIO)
-n_val = int(n_total * VAL_RATIO)
-# 調整保證總和正確（把剩下都當 test）
-n_test = n_total - n_train - n_val
-
-train_keys = all_basenames[:n_train]
-val_keys = all_basenames[n_train:n_train + n_val]
-test_keys = all_basenames[n_train + n_val:]
+# ===== 建立可分配的列表 =====
+if SPLIT_METHOD == "stratified":
+    all_basenames = sorted(images_map.keys())
+    # 每張圖的類別集合 (multi-hot)，依類別組合分層分配
+    cat_col = {cat: i for i, cat in enumerate(categories)}
+    label_matrix = np.zeros((n_total, len(categories)), dtype=bool)
+    for row, base in enumerate(all_basenames):
+        for cat in images_map[base]["categories"]:
+            label_matrix[row, cat_col[cat]] = True
+
+    assignment = iterative_stratification(label_matrix, (TRAIN_RATIO, VAL_RATIO, TEST_RATIO), SEED)
+    train_keys = [base for base, s in zip(all_basenames, assignment.tolist()) if s == 0]
+    val_keys = [base for base, s in zip(all_basenames, assignment.tolist()) if s == 1]
+    test_keys = [base for base, s in zip(all_basenames, assignment.tolist()) if s == 2]
+
+    print("\n📊 各類別在各 split 的比例:")
+    balance_report(label_matrix, assignment, categories, (TRAIN_RATIO, VAL_RATIO, TEST_RATIO))
+else:
+    # 與原本的作法相同 (os.listdir 的順序再 shuffle)，同一台機器上相同 SEED 可重現既有的分割
+    # 與 training_record/ 中的訓練結果
+    all_basenames = list(images_map.keys())
+    random.seed(SEED)
+    random.shuffle(all_basenames)
+
+    n_train = int(n_total * TRAIN_RATIO)
+    n_val = int(n_total * VAL_RATIO)
+    # 調整保證總和正確（把剩下都當 test）
+    n_test = n_total - n_train - n_val
+
+    train_keys = all_basenames[:n_train]
+    val_keys = all_basenames[n_train:n_train + n_val]
+    test_keys = all_basenames[n_train + n_val:]
 
 print(f"分配結果: train={len(train_keys)}, val={len(val_keys)}, test={len(test_keys)} (總 {n_total})")
 
-# ===== 複製檔案到目標 =====
+# ===== 放置檔案到目標 =====
+image_materializer = Materializer(MATERIALIZE_MODE, workers=COPY_WORKERS, desc="images")
+xml_materializer = Materializer(MATERIALIZE_MODE, workers=COPY_WORKERS, desc="xmls")
+
 def pick_image_path(img_paths_set):
     """從 set 選一個較合適的 image path（優先 jpg，再 jpeg，再 png）"""
     if not img_paths_set:
@@ -112,15 +165,19 @@ def pick_image_path(img_paths_set):
     # 依 extension 優先順序選取
     preferred = [".jpg", ".jpeg", ".png", ".bmp"]
     for ext in preferred:
-        for p in img_paths_set:
+        for p in sorted(img_paths_set):
             if p.lower().endswith(ext):
                 return p
     # fallback
-    return next(iter(img_paths_set))
+    return sorted(img_paths_set)[0]
 
 def copy_for_split(basenames, split_name):
     copied = 0
     missing_xml = 0
+    image_paths = []
+    # 清單模式下所有 split 共用同一份 images/all 與 xml_all (已存在的連結會直接略過)
+    img_dir = os.path.join(TARGET_DIR, "images", "all" if SPLIT_FORMAT == "lists" else split_name)
+    xml_dir = os.path.join(TARGET_DIR, "xml_all") if SPLIT_FORMAT == "lists" else os.path.join(TARGET_DIR, "xmls", split_name)
     for base in basenames:
         entry = images_map[base]
         img_src = pick_image_path(entry["img_paths"])
@@ -133,20 +190,28 @@ def copy_for_split(basenames, split_name):
             print(f"[ERROR] {base} 沒有任何 image path，跳過")
             continue
 
-        img_dst = os.path.join(TARGET_DIR, "images", split_name, os.path.basename(img_src))
-        shutil.copy2(img_src, img_dst)
+        img_dst = os.path.join(img_dir, os.path.basename(img_src))
+        image_materializer.place(img_src, img_dst)
+        image_paths.append(img_dst)
         if xml_src:
-            xml_dst = os.path.join(TARGET_DIR, "xmls", split_name, os.path.basename(xml_src))
-            shutil.copy2(xml_src, xml_dst)
+            xml_dst = os.path.join(xml_dir, os.path.basename(xml_src))
+            xml_materializer.place(xml_src, xml_dst)
         else:
             missing_xml += 1
 
         copied += 1
-    return copied, missing_xml
-
-copied_train, miss_train = copy_for_split(train_keys, "train")
-copied_val, miss_val = copy_for_split(val_keys, "val")
-copied_test, miss_test = copy_for_split(test_keys, "test")
+    return copied, missing_xml, image_paths
+
+copied_train, miss_train, train_images = copy_for_split(train_keys, "train")
+copied_val, miss_val, val_images = copy_for_split(val_keys, "val")
+copied_test, miss_test, test_images = copy_for_split(test_keys, "test")
+image_materializer.close()
+xml_materializer.close()
+
+if SPLIT_FORMAT == "lists":
+    list_dir = os.path.join(TARGET_DIR, "splits", SPLIT_NAME)
+    list_files = write_split_lists(list_dir, {"train": train_images, "val": val_images, "test": test_images})
+    write_dataset_yaml(os.path.join(list_dir, "dataset.yaml"), load_class_names(CLASSES_YAML), list_files)
 
 print("複製完成。")
 print(f"train: copied={copied_train}, missing_xml={miss_train}")
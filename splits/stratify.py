@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+SPLIT_NAMES = ("train", "val", "test")
+DEFAULT_RATIOS = (0.72, 0.08, 0.20)
+
+def _largest_remainder(amounts, total):
+    """將非負實數 amounts 取整數，使總和為 total (小數部分較大的優先進位)。"""
+    floors = np.floor(amounts).astype(np.int64)
+    short = int(total - floors.sum())
+    if short > 0:
+        floors[np.argsort(-(amounts - floors), kind="stable")[:short]] += 1
+    return floors
+
+def _water_fill(desire, m):
+    """
+    將 m 張圖分配到各 split：優先補給「還缺最多」的 split，直到各 split 剩餘需求相等。
+
+    與 iterative stratification 一次分配一張圖到需求最大的 split 的結果相同，
+    但一次算完整個區塊。
+    """
+    d = np.sort(desire)[::-1]
+    csum = np.cumsum(d)
+    for k in range(1, len(d) + 1):
+        level = (csum[k - 1] - m) / k
+        if k == len(d) or level >= d[k]:
+            break
+    return _largest_remainder(np.maximum(desire - level, 0), m)
+
+def iterative_stratification(labels, ratios=DEFAULT_RATIOS, seed=42):
+    """
+    多標籤 iterative stratification (Sechidis et al., 2011) 的向量化版本。
+
+    類別組合相同的圖片對分配結果而言可以互換，因此先依類別組合分組
+    (SIXray 5 類最多 32 組，沒有任何類別的 Negative 也是其中一組)，
+    再依「最稀有類別」的順序逐組分配，每組只做一次水位填充，整體只需一次隨機排列與排序。
+
+    Args:
+        labels: (圖片數, 類別數) bool 矩陣。
+        ratios: 各 split 的比例 (會正規化為總和 1)。
+        seed: 亂數種子，相同輸入與種子會得到相同的分割。
+
+    Returns:
+        (圖片數,) int8 陣列，值為 split 的索引 (對應 ratios 的順序)。
+    """
+    labels = np.asarray(labels, dtype=bool)
+    n, n_classes = labels.shape
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    if n_classes > 62:
+        raise ValueError(f"類別數過多 ({n_classes})，最多支援 62 類")
+
+    # 1. 依類別組合分組，組內順序隨機
+    rng = np.random.default_rng(seed)
+    codes = labels.astype(np.int64) @ (np.int64(1) << np.arange(n_classes, dtype=np.int64))
+    order = rng.permutation(n)
+    order = order[np.argsort(codes[order], kind="stable")]
+    group_codes, starts, sizes = np.unique(codes[order], return_index=True, return_counts=True)
+
+    # 2. 各 split 對每個類別 (與總圖數) 的剩餘需求
+    label_counts = labels.sum(axis=0)
+    desire = ratios[:, None] * label_counts[None, :]
+    desire_total = ratios * n
+
+    # 3. 最稀有類別越少的組越先分配；沒有類別的組 (Negative) 最後依總圖數分配
+    group_labels = ((group_codes[:, None] >> np.arange(n_classes)) & 1).astype(bool)
+    rarity = np.where(group_labels, label_counts[None, :], np.iinfo(np.int64).max)
+    rarest = rarity.argmin(axis=1)
+    rarest_count = rarity.min(axis=1)
+
+    assignment = np.empty(n, dtype=np.int8)
+    for g in np.lexsort((sizes, rarest, rarest_count)):
+        members = order[starts[g]:starts[g] + sizes[g]]
+        cls = group_labels[g]
+        target = desire[:, rarest[g]] if cls.any() else desire_total
+        alloc = _water_fill(target, sizes[g])
+
+        bounds = np.concatenate([[0], np.cumsum(alloc)])
+        for s in range(len(ratios)):
+            assignment[members[bounds[s]:bounds[s + 1]]] = s
+        desire[:, cls] -= alloc[:, None]
+        desire_total -= alloc
+
+    return assignment
+
+def random_split(n, ratios=DEFAULT_RATIOS, seed=42):
+    """單純隨機分割 (與 split_yolo_data.py 原本的作法相同的比例)，作為比較基準。"""
+    ratios = np.asarray(ratios, dtype=np.float64)
+    sizes = _largest_remainder(ratios / ratios.sum() * n, n)
+    assignment = np.repeat(np.arange(len(ratios), dtype=np.int8), sizes)
+    return assignment[np.random.default_rng(seed).permutation(n)]
+
+def split_counts(labels, assignment, n_splits=len(SPLIT_NAMES)):
+    """回傳 (類別數 + 2, split 數) 的圖片數：各類別、Negative (無類別)、全部。"""
+    labels = np.asarray(labels, dtype=bool)
+    rows = [np.bincount(assignment[labels[:, c]], minlength=n_splits) for c in range(labels.shape[1])]
+    rows.append(np.bincount(assignment[~labels.any(axis=1)], minlength=n_splits))
+    rows.append(np.bincount(assignment, minlength=n_splits))
+    return np.array(rows)
+
+def balance_report(labels, assignment, classes, ratios=DEFAULT_RATIOS, split_names=SPLIT_NAMES):
+    """
+    印出各類別在各 split 的圖片數與比例，以及與目標比例的最大偏差 (百分點)。
+
+    Returns:
+        float: 所有類別中與目標比例的最大偏差。
+    """
+    ratios = np.asarray(ratios, dtype=np.float64)
+    ratios = ratios / ratios.sum()
+    counts = split_counts(labels, assignment, len(split_names))
+    names = list(classes) + ["negative", "all"]
+
+    header = f"{'class':10s} {'total':>8s}" + "".join(f" {s:>16s}" for s in split_names) + f" {'max dev':>8s}"
+    target = " " * 19 + "".join(f" {'target ' + format(r * 100, '.1f') + '%':>16s}" for r in ratios)
+    print(header)
+    print(target)
+
+    worst = 0.0
+    for name, row in zip(names, counts):
+        total = row.sum()
+        if total == 0:
+            print(f"{name:10s} {0:8d}" + "".join(f" {'-':>16s}" for _ in split_names))
+            continue
+        share = row / total
+        dev = float(np.abs(share - ratios).max() * 100)
+        if name != "all":
+            worst = max(worst, dev)
+        cells = "".join(f" {f'{n} ({p * 100:.2f}%)':>16s}" for n, p in zip(row, share))
+        print(f"{name:10s} {total:8d}{cells} {dev:7.2f}%")
+    return worst
+
+if __name__ == "__main__":
+    # 共用模組位於 transfers/ (標註索引) 與 splits/ (清單輸出)
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+    from annotation_index import AnnotationIndex
+    from split_lists import SIXRAY_CLASSES, load_class_names, write_split_lists, write_dataset_yaml
+
+    # ===== 設定 ===== (對應 split_yolo_data.py / cp_negatives.py 的 SPLIT_FORMAT = "lists")
+    TARGET_DIR = "./../SIXray_YOLO"
+    XML_DIR = os.path.join(TARGET_DIR, "xml_all")
+    IMAGE_DIRS = [os.path.join(TARGET_DIR, "images", "all"),        # 正樣本
+                  os.path.join(TARGET_DIR, "images", "negative")]   # 負樣本 (沒有 XML 的圖視為 Negative)
+    CLASSES_YAML = os.path.join(TARGET_DIR, "dataset.yaml")
+    IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+    SEED = 42
+    RATIOS = DEFAULT_RATIOS
+    SPLIT_NAME = f"stratified_all_seed{SEED}"   # 輸出到 TARGET_DIR/splits/<SPLIT_NAME>/
+
+    classes = load_class_names(CLASSES_YAML, default=SIXRAY_CLASSES)
+    index = AnnotationIndex.load_or_build(XML_DIR)
+    index_labels = index.label_matrix(classes)
+    lookup = {image_id: i for i, image_id in enumerate(index.image_ids.tolist())}
+
+    image_paths, rows = [], []
+    for image_dir in IMAGE_DIRS:
+        if not os.path.isdir(image_dir):
+            print(f"ℹ️ 找不到 {image_dir}，略過")
+            continue
+        for fn in sorted(os.listdir(image_dir)):
+            stem, ext = os.path.splitext(fn)
+            if ext.lower() in IMAGE_EXTS:
+                image_paths.append(os.path.join(image_dir, fn))
+                rows.append(lookup.get(stem, -1))
+    if not image_paths:
+        raise SystemExit("沒有找到任何圖片，請檢查 IMAGE_DIRS。")
+
+    rows = np.array(rows, dtype=np.int64)
+    labels = np.zeros((len(rows), len(classes)), dtype=bool)
+    labels[rows >= 0] = index_labels[rows[rows >= 0]]
+
+    start = time.perf_counter()
+    assignment = iterative_stratification(labels, RATIOS, SEED)
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(image_paths)} 張圖 (Negative {int((~labels.any(axis=1)).sum())} 張) 分層分割完成，耗時 {elapsed:.2f} 秒\n")
+
+    print("📊 iterative stratification:")
+    stratified_dev = balance_report(labels, assignment, classes, RATIOS)
+    print("\n📊 隨機分割 (比較基準):")
+    random_dev = balance_report(labels, random_split(len(labels), RATIOS, SEED), classes, RATIOS)
+    print(f"\n最大類別比例偏差: stratified {stratified_dev:.2f}%，random {random_dev:.2f}%\n")
+
+    image_paths = np.array(image_paths, dtype=object)
+    list_dir = os.path.join(TARGET_DIR, "splits", SPLIT_NAME)
+    list_files = write_split_lists(
+        list_dir, {name: image_paths[assignment == s].tolist() for s, name in enumerate(SPLIT_NAMES)}
+    )
+    write_dataset_yaml(os.path.join(list_dir, "dataset.yaml"), classes, list_files)
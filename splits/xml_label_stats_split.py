@@ -1,30 +1,24 @@
 import os
-import xml.etree.ElementTree as ET
-from collections import Counter, defaultdict
-import random
+import sys
+from collections import Counter
+
+# 共用的標註索引位於 transfers/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "transfers"))
+from annotation_index import AnnotationIndex
+from split_lists import SIXRAY_CLASSES
+from stratify import iterative_stratification, balance_report
 
 # 設定資料夾路徑 (old routes)
 xml_folder = './../SIXray/positive-Annotation'
 
 category_counter = Counter()
 objects_per_image_counter = Counter()
-xml_files = [f for f in os.listdir(xml_folder) if f.endswith('.xml')]
-image_objects = {}
 
-for xml_file in xml_files:
-    tree = ET.parse(os.path.join(xml_folder, xml_file))
-    root = tree.getroot()
-    objects = root.findall('object')
-    names = []
-    for obj in objects:
-        name_tag = obj.find('name')
-        if name_tag is not None and name_tag.text is not None:
-            names.append(name_tag.text)
-    for name in names:
-        category_counter[name] += 1
-    obj_count = len(names)
-    objects_per_image_counter[obj_count] += 1
-    image_objects[xml_file] = names
+# 從標註索引讀取 (第一次執行時會解析所有 XML 並建立索引)
+index = AnnotationIndex.load_or_build(xml_folder)
+category_counter.update(index.class_counts())
+objects_per_image_counter.update(index.objects_per_image().tolist())
+xml_files = [image_id + '.xml' for image_id in index.image_ids.tolist()]
 
 print("各種類數量:")
 for k, v in category_counter.items():
@@ -37,27 +31,19 @@ for k, v in objects_per_image_counter.items():
 # 分割資料集
 train_ratio = 0.8
 val_ratio = 0.1  # train 裡面再分
+seed = 42
+ratios = (train_ratio * (1 - val_ratio), train_ratio * val_ratio, 1 - train_ratio)
 
-data_by_count = defaultdict(list)
-for xml_file, names in image_objects.items():
-    forbidden_count = sum([1 for name in names if name in ['Knife', 'Gun', 'Explosive']])
-    data_by_count[forbidden_count].append(xml_file)
+# 依每張圖含有的 SIXray 類別集合做多標籤分層分割
+label_matrix = index.label_matrix(SIXRAY_CLASSES)
+assignment = iterative_stratification(label_matrix, ratios, seed)
 
-train_files, val_files, test_files = [], [], []
-for count, files in data_by_count.items():
-    random.shuffle(files)
-    n_total = len(files)
-    n_train = int(n_total * train_ratio)
-    n_test = n_total - n_train
-    train_split = files[:n_train]
-    test_split = files[n_train:]
-    n_val = int(len(train_split) * val_ratio)
-    val_split = train_split[:n_val]
-    train_split_final = train_split[n_val:]
+train_files = [f for f, s in zip(xml_files, assignment.tolist()) if s == 0]
+val_files = [f for f, s in zip(xml_files, assignment.tolist()) if s == 1]
+test_files = [f for f, s in zip(xml_files, assignment.tolist()) if s == 2]
 
-    train_files.extend(train_split_final)
-    val_files.extend(val_split)
-    test_files.extend(test_split)
+print("\n各類別在各 split 的比例:")
+balance_report(label_matrix, assignment, SIXRAY_CLASSES, ratios)
 
 print(f"訓練集: {len(train_files)} 張")
 print(f"驗證集: {len(val_files)} 張")
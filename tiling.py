@@ -0,0 +1,224 @@
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+from ultralytics.engine.results import Results
+
+from detection_output import extract_detections
+
+def check_tiling(tile, overlap):
+    """tile 必須大於 0，overlap 必須在 [0, 1) 之間 (overlap = 1 時切片不會前進)。"""
+    if tile <= 0:
+        raise ValueError(f"tile={tile} 必須大於 0")
+    if not 0 <= overlap < 1:
+        raise ValueError(f"overlap={overlap} 必須介於 0 (含) 與 1 (不含) 之間")
+
+def tile_starts(length, tile, overlap):
+    """一個維度上各切片的起點：相鄰切片至少重疊 overlap 比例，且平均分布到邊界。"""
+    if length <= tile:
+        return np.zeros(1, dtype=int)
+    step = tile * (1 - overlap)
+    n = math.ceil((length - tile) / step) + 1
+    return np.round(np.linspace(0, length - tile, n)).astype(int)
+
+def tile_grid(width, height, tile=640, overlap=0.2):
+    """回傳所有切片的 (x0, y0, x1, y1)，形狀 (N, 4)。"""
+    check_tiling(tile, overlap)
+    xs = tile_starts(width, tile, overlap)
+    ys = tile_starts(height, tile, overlap)
+    x0, y0 = np.meshgrid(xs, ys)
+    x0, y0 = x0.ravel(), y0.ravel()
+    return np.stack([x0, y0, np.minimum(x0 + tile, width), np.minimum(y0 + tile, height)], axis=1)
+
+def box_overlap(a, b, metric="iou"):
+    """
+    兩組框 (xyxy) 兩兩之間的重疊比例，形狀 (len(a), len(b))。
+    metric="ios" 為交集 / 較小框的面積，切片邊緣被截斷的框與完整的框也能配對。
+    """
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(axis=1)
+    if metric == "ios":
+        denom = np.minimum(area_a[:, None], area_b[None, :])
+    else:
+        denom = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(denom, 1e-9)
+
+def _cluster(xyxy, conf, cls, threshold, metric):
+    """依信心度由高到低，把同類別且重疊超過 threshold 的框歸到同一群；回傳 (排序, 每個框所屬的群首)。"""
+    order = np.argsort(-conf, kind="stable")
+    boxes, classes = xyxy[order], cls[order]
+    same = (box_overlap(boxes, boxes, metric) > threshold) & (classes[:, None] == classes[None, :])
+    leader = np.full(len(order), -1)
+    for i in range(len(order)):
+        if leader[i] >= 0:
+            continue
+        leader[same[i] & (leader < 0)] = i
+        leader[i] = i
+    return order, leader
+
+def merge_detections(xyxy, conf, cls, method="nms", threshold=0.5, metric="ios"):
+    """
+    合併所有切片 (與整張圖) 的偵測框。
+
+    method="nms": 每群只保留信心度最高的框。
+    method="wbf": 以信心度加權平均同一群的框座標，信心度取該群最大值。
+
+    Returns:
+        (xyxy (M, 4), conf (M,), cls (M,))
+    """
+    if len(conf) == 0:
+        return xyxy.reshape(0, 4), conf, cls
+    order, leader = _cluster(xyxy, conf, cls, threshold, metric)
+    heads = np.flatnonzero(leader == np.arange(len(order)))
+    if method == "nms":
+        keep = order[heads]
+        return xyxy[keep], conf[keep], cls[keep]
+    if method != "wbf":
+        raise ValueError(f"未知的合併方式: {method} (可用: nms, wbf)")
+
+    weights = conf[order]
+    group = np.searchsorted(heads, leader)
+    weighted = np.zeros((len(heads), 4))
+    total = np.zeros(len(heads))
+    np.add.at(weighted, group, xyxy[order] * weights[:, None])
+    np.add.at(total, group, weights)
+    return weighted / total[:, None], conf[order][heads], cls[order][heads]
+
+def predict_tiled(model, images, tile=640, overlap=0.2, imgsz=640, conf=0.25, device=None,
+                  merge="nms", merge_threshold=0.5, include_full=True):
+    """
+    切片推論：每張圖切成重疊的 tile x tile 切片，這個 batch 所有圖片的切片 (以及整張圖本身，
+    用來保留大物件) 一次送進模型，框平移回原圖座標後以 merge_detections 合併。
+
+    Returns:
+        每張圖一個 ultralytics Results，可直接交給 ResultWriter / extract_detections。
+    """
+    check_tiling(tile, overlap)
+    crops, owners, offsets = [], [], []
+    for i, image in enumerate(images):
+        height, width = image.shape[:2]
+        for x0, y0, x1, y1 in tile_grid(width, height, tile, overlap):
+            crops.append(image[y0:y1, x0:x1])
+            owners.append(i)
+            offsets.append((x0, y0))
+        if include_full and (width > tile or height > tile):
+            crops.append(image)
+            owners.append(i)
+            offsets.append((0, 0))
+
+    results = model.predict(source=crops, conf=conf, imgsz=imgsz, device=device, verbose=False)
+
+    per_image = [[] for _ in images]
+    for owner, (x0, y0), result in zip(owners, offsets, results):
+        det = extract_detections(result, image_id=None)
+        if len(det["conf"]):
+            boxes = det["xyxy"] + np.array([x0, y0, x0, y0], dtype=np.float32)
+            per_image[owner].append(np.column_stack([boxes, det["conf"], det["cls"]]))
+
+    merged = []
+    for image, parts in zip(images, per_image):
+        rows = np.concatenate(parts) if parts else np.zeros((0, 6), dtype=np.float32)
+        xyxy, scores, classes = merge_detections(rows[:, :4], rows[:, 4], rows[:, 5], merge, merge_threshold)
+        height, width = image.shape[:2]
+        xyxy = np.clip(xyxy, 0, [width, height, width, height])
+        data = np.column_stack([xyxy, scores, classes]).astype(np.float32).reshape(-1, 6)
+        merged.append(Results(orig_img=image, path="", names=model.names, boxes=data))
+    return merged
+
+def load_yolo_labels(label_path, width, height):
+    """讀取 YOLO 標註 (class cx cy w h，0~1)，回傳 (cls (N,), xyxy (N, 4)，像素座標)。"""
+    if not os.path.exists(label_path):
+        return np.zeros(0), np.zeros((0, 4))
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros(0), np.zeros((0, 4))
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    return rows[:, 0], np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+def match_counts(pred_cls, pred_conf, pred_xyxy, gt_cls, gt_xyxy, iou=0.5):
+    """依信心度貪婪配對同類別且 IoU >= iou 的框，回傳每個標註框是否被偵測到 (bool (N,))。"""
+    found = np.zeros(len(gt_cls), dtype=bool)
+    if len(gt_cls) == 0 or len(pred_cls) == 0:
+        return found
+    overlap = box_overlap(pred_xyxy, gt_xyxy) * (pred_cls[:, None] == gt_cls[None, :])
+    for p in np.argsort(-pred_conf, kind="stable"):
+        candidates = np.where(found, 0, overlap[p])
+        g = int(candidates.argmax())
+        if candidates[g] >= iou:
+            found[g] = True
+    return found
+
+def benchmark_tiling(model, image_dir, label_dir, imgsz=640, conf=0.25, batch_size=8, limit=200,
+                     tile_sizes=(640, 480), overlap=0.2, merge="nms", small_area=32 * 32):
+    """
+    在有標註的資料 (例如 images/val + labels/val) 上比較整張圖推論與切片推論：
+    吞吐量 (張/秒)、recall、小物件 (面積 < small_area 像素) 的 recall 與 precision (IoU 0.5)。
+    """
+    names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp')))[:limit]
+    images = [cv2.imread(os.path.join(image_dir, f)) for f in names]
+    samples = [(f, im) for f, im in zip(names, images) if im is not None]
+    truth = [load_yolo_labels(os.path.join(label_dir, os.path.splitext(f)[0] + ".txt"), im.shape[1], im.shape[0])
+             for f, im in samples]
+    gt_total = sum(len(c) for c, _ in truth)
+    print(f"ℹ️ {len(samples)} 張圖片、{gt_total} 個標註框")
+
+    def full(batch):
+        return model.predict(source=batch, conf=conf, imgsz=imgsz, verbose=False)
+
+    configs = [("full", full)]
+    for tile in tile_sizes:
+        configs.append((f"tile{tile}", lambda batch, tile=tile: predict_tiled(
+            model, batch, tile=tile, overlap=overlap, imgsz=imgsz, conf=conf, merge=merge)))
+
+    reports = {}
+    for name, run in configs:
+        run([im for _, im in samples[:batch_size]])  # 暖機
+        start = time.perf_counter()
+        results = []
+        for i in range(0, len(samples), batch_size):
+            results += run([im for _, im in samples[i:i + batch_size]])
+        elapsed = time.perf_counter() - start
+
+        predictions = small_found = small_total = found_total = 0
+        for result, (gt_cls, gt_xyxy) in zip(results, truth):
+            det = extract_detections(result, image_id=None)
+            found = match_counts(det["cls"], det["conf"], det["xyxy"], gt_cls, gt_xyxy)
+            small = (gt_xyxy[:, 2:] - gt_xyxy[:, :2]).prod(axis=1) < small_area
+            found_total += found.sum()
+            small_found += found[small].sum()
+            small_total += small.sum()
+            predictions += len(det["conf"])
+        reports[name] = {
+            "images_per_sec": round(len(samples) / elapsed, 2),
+            "recall": round(found_total / max(gt_total, 1), 4),
+            "small_recall": round(small_found / max(small_total, 1), 4),
+            "precision": round(found_total / max(predictions, 1), 4),
+        }
+
+    base = reports["full"]
+    print(f"\n{'模式':10s} {'張/秒':>8s} {'成本':>7s} {'recall':>7s} {'Δrecall':>8s} {'小物件':>7s} {'precision':>9s}")
+    for name, r in reports.items():
+        print(f"{name:10s} {r['images_per_sec']:8.2f} {base['images_per_sec'] / r['images_per_sec']:6.2f}x "
+              f"{r['recall']:7.4f} {r['recall'] - base['recall']:+8.4f} {r['small_recall']:7.4f} {r['precision']:9.4f}")
+    return reports
+
+if __name__ == "__main__":
+    # --- 設定 ---
+    from model_backends import load_model
+
+    model_weight = 'savemodel/yolov10n_sixray19.pt'
+    image_dir = "./../SIXray_YOLO/images/val"
+    label_dir = "./../SIXray_YOLO/labels/val"
+    image_size = 640
+    confidence = 0.25
+    tile_sizes = (640, 480)   # 要比較的切片大小
+    tile_overlap = 0.2
+    merge_method = "nms"      # "nms" 或 "wbf"
+
+    benchmark_tiling(load_model(model_weight), image_dir, label_dir, imgsz=image_size, conf=confidence,
+                     tile_sizes=tile_sizes, overlap=tile_overlap, merge=merge_method)
@@ -1,6 +1,15 @@
 # import ultralytics
+import os
+
 from ultralytics import YOLOv10
+from ultralytics.models.yolov10.train import YOLOv10DetectionTrainer
 import torch
+
+from batch_autotune import tuned_batch
+from dataloader_profile import profiled_trainer
+from grad_accumulation import accumulation_args, checkpointed_trainer
+from image_cache import cache_dir_for, cached_trainer
+from progressive_resize import progressive_trainer
 # import inspect
 # import ultralytics.nn.modules
 # import torch.nn as nn
@@ -22,9 +31,44 @@ import torch
 
 def main():
     dataset_path = "./../SIXray_YOLO/dataset.yaml" 
+    image_size = 256
+    # 逐步放大解析度 [(epochs, imgsz), ...]，例如 [(70, 256), (20, 480), (10, 640)]；epochs 以總和為準，驗證用最後一個解析度
+    imgsz_schedule = None
+    # 先執行 image_cache.py 產生解碼好的快取 (None 則每個 epoch 重新解碼 JPEG)
+    image_cache_root = None  # "./../SIXray_YOLO/cache"
+    trainer = YOLOv10DetectionTrainer
+    if image_cache_root:
+        # 逐步放大時每個階段 (與驗證) 的解析度都要有各自的快取
+        cache_sizes = sorted({imgsz for _, imgsz in imgsz_schedule}) if imgsz_schedule else [image_size]
+        cache_dirs = {imgsz: cache_dir_for(image_cache_root, imgsz) for imgsz in cache_sizes}
+        missing = [d for d in cache_dirs.values() if not os.path.exists(os.path.join(d, "meta.json"))]
+        if missing:
+            raise SystemExit(f"❌ 找不到快取 {missing}，請先以 image_cache.py 產生 (image_sizes 需包含 {cache_sizes})")
+        trainer = cached_trainer(cache_dirs, base=trainer)
     # model = YOLOv10.from_pretrained('jameslahm/yolov10s')
     # model = YOLOv10('savemodel/yolov10s_sixray28.pt')  
-    model = YOLOv10 ('runs/detect/train30/weights/best.pt')
+    model_path = 'runs/detect/train30/weights/best.pt'
+    model = YOLOv10 (model_path)
+    # "auto": 用 batch_autotune.py 量測出不超過 80% 記憶體的最大 batch (沒有紀錄時先量測，會寫進這次訓練的 args.yaml)
+    batch_size = 128
+    if batch_size == "auto":
+        largest = max(imgsz for _, imgsz in imgsz_schedule) if imgsz_schedule else image_size
+        batch_size = tuned_batch(model_path, largest, device="cuda", amp=True)
+        print(f"ℹ️ 自動選擇 batch={batch_size}")
+    # 記憶體不夠時：每步只放 micro_batch 張，累積到 batch_size 張才更新 (等效 batch 不變)
+    micro_batch = None  # 例如 32
+    batch_args = accumulation_args(batch_size, micro_batch) if micro_batch else {"batch": batch_size}
+    # True: backbone 使用 activation checkpointing (省記憶體，但每步較慢)
+    activation_checkpoint = False
+    if activation_checkpoint:
+        trainer = checkpointed_trainer(base=trainer)
+    # True: 記錄每一步等待資料 / 複製 / 計算的時間 (寫在 results.csv 旁)；workers 與 prefetch 可用 dataloader_profile.py 量測
+    profile_dataloader = False
+    prefetch_factor = 2
+    if profile_dataloader or prefetch_factor != 2:
+        trainer = profiled_trainer(prefetch_factor, profile=profile_dataloader, base=trainer)
+    if imgsz_schedule:
+        trainer = progressive_trainer(imgsz_schedule, base=trainer)
     
     print(f"Model loaded successfully: {type(model)}")
     print(torch.version.cuda)
@@ -35,8 +79,8 @@ def main():
         # resume=True, 
         # epochs=14,
         # batch=128, #try 128 for m model
-        batch = 128, #try 128 for s model, 256 crashed at epoch 10
-        imgsz=256,
+        **batch_args, #try 128 for s model, 256 crashed at epoch 10
+        imgsz=image_size,
         device="cuda",
         amp=True,
         workers=8,        # 開啟多線程 dataloader
@@ -44,6 +88,7 @@ def main():
         lr0=0.01,
         lrf=0.01,
         # cache="disk"
+        trainer=trainer,
     )
     # model.save("./SIXray_YOLOv10/savemodel/yolov10n_sixray3.pt")  # 改成絕對路徑
     model.save("C:\\Users\\JohnsonKu\\Desktop\\SIXray_YOLOv10\\savemodel\\yolov10s_sixray31.pt")  # 改成絕對路徑
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from voc_reader import VocAnnotation, read_voc, STATUS_PARSE_ERROR
+
+# 索引檔預設放在 XML 資料夾內 (其他腳本只讀取 *.xml，不受影響)
+INDEX_NAME = ".annotation_index.npz"
+INDEX_VERSION = 1
+
+def xml_dir_signature(xml_dir):
+    """以所有 XML 的檔名 / 大小 / mtime 計算簽章，用來判斷索引是否過期。"""
+    h = hashlib.sha1()
+    entries = sorted(
+        (e.name, e.stat().st_size, e.stat().st_mtime_ns)
+        for e in os.scandir(xml_dir) if e.name.endswith(".xml")
+    )
+    for name, size, mtime in entries:
+        h.update(f"{name}:{size}:{mtime}\n".encode("utf-8"))
+    return h.hexdigest(), len(entries)
+
+class AnnotationIndex:
+    """
+    SIXray VOC XML 的欄位式 (columnar) 索引：所有 XML 只解析一次，存成 NumPy 陣列。
+
+    圖片層級 (長度 = 圖片數):
+        image_ids   : XML 檔名 (不含副檔名)，例如 P00001
+        filenames   : <filename> 內容 (沒有時為空字串)
+        width/height: 圖片尺寸 (缺少或有誤時為 NaN)
+        status      : STATUS_* 常數
+        obj_offsets : 長度 = 圖片數 + 1，第 i 張圖的物件為 [obj_offsets[i], obj_offsets[i+1])
+
+    物件層級 (長度 = 物件數):
+        obj_image   : 所屬圖片的索引
+        obj_class   : class_names 中的索引 (<name> 為空時為 -1)
+        boxes       : (N, 4) 的 xmin, ymin, xmax, ymax (無效時為 NaN)
+        box_status  : BOX_* 常數
+
+    class_names 保留 XML 中 <name> 的原始文字 (未轉小寫)，由使用端決定如何比對。
+    """
+
+    def __init__(self, arrays, meta):
+        self.image_ids = arrays["image_ids"]
+        self.filenames = arrays["filenames"]
+        self.width = arrays["width"]
+        self.height = arrays["height"]
+        self.status = arrays["status"]
+        self.obj_offsets = arrays["obj_offsets"]
+        self.obj_class = arrays["obj_class"]
+        self.boxes = arrays["boxes"]
+        self.box_status = arrays["box_status"]
+        self.class_names = arrays["class_names"]
+        self.obj_image = np.repeat(np.arange(len(self.image_ids)), np.diff(self.obj_offsets))
+        self.meta = meta
+        self._lookup = None
+
+    # --- 建立 / 存取 ---
+
+    @classmethod
+    def build(cls, xml_dir, backend=None):
+        """解析 xml_dir 內所有 XML 並建立索引；backend 見 voc_reader.read_voc。"""
+        xml_dir = Path(xml_dir)
+        start = time.perf_counter()
+        signature, _ = xml_dir_signature(xml_dir)
+        xml_files = sorted(f for f in os.listdir(xml_dir) if f.endswith(".xml"))
+
+        image_ids, filenames, widths, heights, statuses = [], [], [], [], []
+        obj_offsets = [0]
+        obj_names, boxes, box_statuses = [], [], []
+
+        for xml_file in xml_files:
+            ann = read_voc(xml_dir / xml_file, backend)
+            image_ids.append(os.path.splitext(xml_file)[0])
+            filenames.append(ann.filename or "")
+            widths.append(ann.width)
+            heights.append(ann.height)
+            statuses.append(ann.status)
+            obj_names.extend(ann.names)
+            boxes.append(ann.boxes)
+            box_statuses.append(ann.box_status)
+            obj_offsets.append(len(obj_names))
+
+        class_names = sorted({n for n in obj_names if n is not None})
+        class_lookup = {n: i for i, n in enumerate(class_names)}
+
+        arrays = {
+            "image_ids": np.array(image_ids, dtype=str),
+            "filenames": np.array(filenames, dtype=str),
+            "width": np.array(widths, dtype=np.float64),
+            "height": np.array(heights, dtype=np.float64),
+            "status": np.array(statuses, dtype=np.int8),
+            "obj_offsets": np.array(obj_offsets, dtype=np.int64),
+            "obj_class": np.array([class_lookup.get(n, -1) for n in obj_names], dtype=np.int32),
+            "boxes": np.concatenate(boxes) if boxes else np.empty((0, 4), dtype=np.float64),
+            "box_status": np.concatenate(box_statuses) if box_statuses else np.empty(0, dtype=np.int8),
+            "class_names": np.array(class_names, dtype=str),
+        }
+        meta = {
+            "version": INDEX_VERSION,
+            "xml_dir": str(xml_dir.resolve()),
+            "signature": signature,
+            "build_seconds": time.perf_counter() - start,
+        }
+        return cls(arrays, meta)
+
+    def save(self, path):
+        path = Path(path)
+        arrays = {
+            "image_ids": self.image_ids,
+            "filenames": self.filenames,
+            "width": self.width,
+            "height": self.height,
+            "status": self.status,
+            "obj_offsets": self.obj_offsets,
+            "obj_class": self.obj_class,
+            "boxes": self.boxes,
+            "box_status": self.box_status,
+            "class_names": self.class_names,
+            "meta": np.array(json.dumps(self.meta)),
+        }
+        # np.savez 會自動補 .npz，因此暫存檔名也需以 .npz 結尾
+        tmp_path = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files if k != "meta"}
+            meta = json.loads(str(data["meta"]))
+        return cls(arrays, meta)
+
+    @classmethod
+    def load_or_build(cls, xml_dir, index_path=None):
+        """讀取既有索引；索引不存在或 XML 有變動時重新建立並存檔。"""
+        xml_dir = Path(xml_dir)
+        index_path = Path(index_path) if index_path else xml_dir / INDEX_NAME
+
+        if index_path.exists():
+            try:
+                index = cls.load(index_path)
+                signature, _ = xml_dir_signature(xml_dir)
+                if index.meta.get("version") == INDEX_VERSION and index.meta.get("signature") == signature:
+                    return index
+                print(f"ℹ️ {xml_dir} 的 XML 有變動，重新建立索引...")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ 無法讀取索引 {index_path} ({e})，重新建立...")
+
+        index = cls.build(xml_dir)
+        index.save(index_path)
+        print(f"✅ 已建立標註索引: {index_path} ({len(index)} 個 XML, {index.num_objects} 個物件, "
+              f"{index.meta['build_seconds']:.2f} 秒)")
+        return index
+
+    # --- 查詢 ---
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def __contains__(self, image_id):
+        return image_id in self._image_lookup()
+
+    @property
+    def num_objects(self):
+        return len(self.obj_class)
+
+    def _image_lookup(self):
+        if self._lookup is None:
+            self._lookup = {image_id: i for i, image_id in enumerate(self.image_ids.tolist())}
+        return self._lookup
+
+    def image_index(self, image_id):
+        """回傳 image_id 在索引中的位置，不存在時回傳 None。"""
+        return self._image_lookup().get(image_id)
+
+    def object_slice(self, image_id):
+        i = self._image_lookup()[image_id]
+        return slice(self.obj_offsets[i], self.obj_offsets[i + 1])
+
+    def annotation(self, image_id):
+        """以 voc_reader.VocAnnotation 的形式回傳單張圖的標註，不存在時回傳 None。"""
+        i = self.image_index(image_id)
+        if i is None:
+            return None
+        objs = slice(self.obj_offsets[i], self.obj_offsets[i + 1])
+        class_names = self.class_names.tolist()
+        return VocAnnotation(
+            self.filenames[i].item() or None,
+            float(self.width[i]),
+            float(self.height[i]),
+            int(self.status[i]),
+            [class_names[c] if c >= 0 else None for c in self.obj_class[objs].tolist()],
+            self.boxes[objs],
+            self.box_status[objs],
+        )
+
+    def object_names(self, image_id):
+        """回傳該圖所有物件的 <name> (<name> 為空時為 None)。"""
+        return [self.class_names[c] if c >= 0 else None for c in self.obj_class[self.object_slice(image_id)]]
+
+    def names_per_image(self):
+        """image_id -> 物件名稱列表 (略過空的 <name>)。"""
+        image_ids = self.image_ids.tolist()
+        class_names = self.class_names.tolist()
+        result = {image_id: [] for image_id in image_ids}
+        for image_i, class_id in zip(self.obj_image.tolist(), self.obj_class.tolist()):
+            if class_id >= 0:
+                result[image_ids[image_i]].append(class_names[class_id])
+        return result
+
+    def objects_per_image(self):
+        """每張圖的有效 (有名稱) 物件數量。"""
+        valid = self.obj_class >= 0
+        return np.bincount(self.obj_image[valid], minlength=len(self))
+
+    def class_counts(self):
+        """各類別的物件總數。"""
+        valid = self.obj_class >= 0
+        counts = np.bincount(self.obj_class[valid], minlength=len(self.class_names))
+        return Counter({name: int(n) for name, n in zip(self.class_names.tolist(), counts) if n})
+
+    def image_class_counts(self):
+        """各類別出現在幾張圖中。"""
+        valid = self.obj_class >= 0
+        pairs = np.unique(np.stack([self.obj_image[valid], self.obj_class[valid]]), axis=1)
+        counts = np.bincount(pairs[1], minlength=len(self.class_names))
+        return Counter({name: int(n) for name, n in zip(self.class_names.tolist(), counts) if n})
+
+    def label_matrix(self, classes):
+        """(圖片數, len(classes)) 的 bool 矩陣：每張圖是否含有各類別 (名稱 strip 後不分大小寫比對)。"""
+        lookup = {name.lower(): i for i, name in enumerate(classes)}
+        columns = np.array([lookup.get(name.strip().lower(), -1) for name in self.class_names.tolist()],
+                           dtype=np.int64)
+        matrix = np.zeros((len(self), len(classes)), dtype=bool)
+        valid = self.obj_class >= 0
+        cols = columns[self.obj_class[valid]]
+        known = cols >= 0
+        matrix[self.obj_image[valid][known], cols[known]] = True
+        return matrix
+
+    def images_with_class(self, name, case_sensitive=True):
+        """回傳含有指定類別的 image_id 陣列。"""
+        if case_sensitive:
+            class_ids = np.flatnonzero(self.class_names == name)
+        else:
+            class_ids = np.flatnonzero(np.char.lower(np.char.strip(self.class_names)) == name.lower())
+        mask = np.isin(self.obj_class, class_ids)
+        return self.image_ids[np.unique(self.obj_image[mask])]
+
+    def empty_images(self):
+        """可以解析但沒有任何有效物件的 image_id。"""
+        mask = (self.objects_per_image() == 0) & (self.status != STATUS_PARSE_ERROR)
+        return self.image_ids[mask]
+
+    def parse_errors(self):
+        return self.image_ids[self.status == STATUS_PARSE_ERROR]
+
+if __name__ == "__main__":
+    # 預先為 XML 資料夾建立 (或更新) 標註索引
+    XML_DIRS = [
+        Path("./../../SIXray_YOLO/xml_all"),
+    ]
+
+    for xml_dir in XML_DIRS:
+        if not xml_dir.is_dir():
+            print(f"❌ 找不到 XML 資料夾: {xml_dir}")
+            continue
+        index = AnnotationIndex.load_or_build(xml_dir)
+        print(f"ℹ️ {xml_dir}: {len(index)} 張圖, {index.num_objects} 個物件")
+        for name, n in sorted(index.class_counts().items()):
+            print(f"    - {name}: {n}")
@@ -0,0 +1,65 @@
+import time
+from pathlib import Path
+
+import numpy as np
+
+from voc_reader import BACKENDS, lxml_etree, read_voc
+
+def same_annotation(a, b):
+    return (
+        a.filename == b.filename
+        and a.status == b.status
+        and a.names == b.names
+        and np.array_equal([a.width, a.height], [b.width, b.height], equal_nan=True)
+        and np.array_equal(a.boxes, b.boxes, equal_nan=True)
+        and np.array_equal(a.box_status, b.box_status)
+    )
+
+def benchmark_backends(xml_dir, repeat=3, limit=None):
+    """以每個可用的解析後端讀取 xml_dir 內所有 XML，回傳 {backend: 每秒檔案數} (取最佳一次)。"""
+    xml_files = sorted(Path(xml_dir).glob("*.xml"))
+    if limit:
+        xml_files = xml_files[:limit]
+    if not xml_files:
+        print(f"ℹ️ {xml_dir} 中沒有找到 XML 檔案。")
+        return {}
+
+    backends = [b for b in BACKENDS if b != "lxml" or lxml_etree is not None]
+    if lxml_etree is None:
+        print("ℹ️ 未安裝 lxml，略過 lxml 後端")
+
+    print(f"--- 測試 {len(xml_files)} 個 XML，每個後端重複 {repeat} 次 ---")
+
+    results = {}
+    reference = None
+    for backend in backends:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            annotations = [read_voc(f, backend) for f in xml_files]
+            best = min(best, time.perf_counter() - start)
+        results[backend] = len(xml_files) / best
+
+        # 確認每個後端的解析結果與第一個後端相同
+        if reference is None:
+            reference = annotations
+        else:
+            mismatches = [f.name for f, a, b in zip(xml_files, reference, annotations) if not same_annotation(a, b)]
+            if mismatches:
+                print(f"⚠️ {backend} 有 {len(mismatches)} 個檔案的結果與 {backends[0]} 不同，例如: {mismatches[:5]}")
+
+    baseline = results.get("etree")
+    for backend, rate in results.items():
+        speedup = f" ({rate / baseline:.2f}x etree)" if baseline else ""
+        print(f"    - {backend:10s}: {rate:10.1f} 檔案/秒{speedup}")
+    return results
+
+if __name__ == "__main__":
+    # SIXray 標註資料夾
+    XML_DIR = Path("./../../SIXray_YOLO/xml_all")
+    REPEAT = 3
+
+    if not XML_DIR.is_dir():
+        print(f"❌ 找不到 XML 資料夾: {XML_DIR}")
+    else:
+        benchmark_backends(XML_DIR, repeat=REPEAT)
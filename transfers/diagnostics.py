@@ -0,0 +1,102 @@
+import csv
+import json
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+def _display_width(text):
+    """終端機顯示寬度 (中文等全形字元佔兩格)。"""
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+def _pad(text, width, align_right=False):
+    padding = " " * (width - _display_width(text))
+    return padding + text if align_right else text + padding
+
+class Diagnostics:
+    """
+    轉換過程中的問題收集器：依問題類型與檔案累計次數，最後輸出一份 JSON / CSV 報告。
+
+    verbose=True 時才會逐筆印出訊息 (例如單檔轉換或除錯時)；
+    平常只在結束時印出一張摘要表，避免大量 print 拖慢轉換速度。
+    """
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.counts = Counter()                 # 問題類型 -> 次數
+        self.by_file = defaultdict(Counter)     # 檔案 -> 問題類型 -> 次數
+        self.items = []                         # (檔案, 物件索引, 問題類型, 細節)
+
+    def __len__(self):
+        return len(self.items)
+
+    def record(self, file, reason, object_index=-1, detail="", message=None):
+        """記錄一筆問題；verbose 模式下同時印出 message。"""
+        file = str(file)
+        self.counts[reason] += 1
+        self.by_file[file][reason] += 1
+        self.items.append((file, int(object_index), reason, detail or ""))
+        if self.verbose and message:
+            print(message)
+
+    def file_items(self):
+        """檔案 -> [(物件索引, 問題類型, 細節), ...]，用來存進 manifest。"""
+        items = defaultdict(list)
+        for file, obj, reason, detail in self.items:
+            items[file].append((obj, reason, detail))
+        return items
+
+    def replay(self, file, items):
+        """加回先前記錄的問題 (增量轉換時未重新轉換的檔案)，不印出訊息。"""
+        for obj, reason, detail in items:
+            self.record(file, reason, obj, detail)
+
+    def merge(self, other):
+        """合併另一個收集器 (例如子進程回傳的結果)。"""
+        self.counts.update(other.counts)
+        for file, counts in other.by_file.items():
+            self.by_file[file].update(counts)
+        self.items.extend(other.items)
+
+    def summary_table(self):
+        if not self.counts:
+            return "✅ 沒有發現任何問題。"
+        files_per_reason = Counter()
+        for counts in self.by_file.values():
+            files_per_reason.update(counts.keys())
+
+        rows = [("問題類型", "次數", "檔案數")]
+        rows += [(reason, str(n), str(files_per_reason[reason])) for reason, n in self.counts.most_common()]
+        rows.append(("總計", str(sum(self.counts.values())), str(len(self.by_file))))
+        widths = [max(_display_width(row[i]) for row in rows) for i in range(3)]
+        return "\n".join(
+            f"{_pad(row[0], widths[0])}  {_pad(row[1], widths[1], True)}  {_pad(row[2], widths[2], True)}"
+            for row in rows
+        )
+
+    def print_summary(self, title="轉換問題摘要"):
+        print(f"\n📋 {title}:")
+        print(self.summary_table())
+
+    def write_report(self, path):
+        """依副檔名寫出 JSON (.json) 或 CSV (.csv) 報告。"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if path.suffix.lower() == ".csv":
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["file", "object", "reason", "detail"])
+                writer.writerows(self.items)
+        else:
+            report = {
+                "summary": dict(self.counts.most_common()),
+                "files": {file: dict(counts) for file, counts in sorted(self.by_file.items())},
+                "items": [
+                    {"file": file, "object": obj, "reason": reason, "detail": detail}
+                    for file, obj, reason, detail in self.items
+                ],
+            }
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        print(f"📝 已寫出問題報告: {path} ({len(self.items)} 筆)")
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+# manifest 檔名，放在各 labels/{split} 資料夾內 (ultralytics 只讀取 *.txt，不受影響)
+MANIFEST_NAME = ".label_manifest.json"
+MANIFEST_VERSION = 2  # 2: 新增 issues
+
+def file_hash(path):
+    """計算檔案內容的 SHA-1。"""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def classes_hash(CLASSES_list):
+    """類別列表的雜湊值；dataset.yaml 的 names 改變時，所有標註都需要重新產生。"""
+    return hashlib.sha1("\n".join(CLASSES_list).encode("utf-8")).hexdigest()
+
+def file_state(xml_file, txt_file):
+    """XML 與 label 目前的 mtime/size/hash (可在轉換的 worker 中計算，再交給 LabelManifest.record)。"""
+    if xml_file.exists():
+        st = xml_file.stat()
+        xml_mtime, xml_size, xml_hash = st.st_mtime_ns, st.st_size, file_hash(xml_file)
+    else:
+        xml_mtime = xml_size = xml_hash = None
+
+    if txt_file.exists():
+        label_size, label_hash = txt_file.stat().st_size, file_hash(txt_file)
+    else:
+        label_size = label_hash = None
+
+    return {
+        "xml_mtime": xml_mtime,
+        "xml_size": xml_size,
+        "xml_hash": xml_hash,
+        "label_size": label_size,
+        "label_hash": label_hash,
+    }
+
+class LabelManifest:
+    """
+    記錄每個 label 檔案是由哪一個 XML (mtime/size/hash) 及哪一組類別列表產生的，
+    讓 voc2yolo.py / voc2yolo_image.py 重跑時只轉換新增或修改過的標註。
+
+    每筆紀錄:
+        stem -> {
+            "xml_mtime": int | None,   # XML 不存在 (Negative 樣本) 時為 None
+            "xml_size": int | None,
+            "xml_hash": str | None,
+            "classes_hash": str,
+            "label_size": int | None,  # 沒有產生 label 檔案時為 None
+            "label_hash": str | None,
+            "issues": [[物件索引, 問題類型, 細節], ...],  # 轉換時記錄的問題，未重新轉換時用來重建報告
+        }
+    """
+
+    def __init__(self, label_dir, CLASSES_list):
+        self.path = Path(label_dir) / MANIFEST_NAME
+        self.classes_hash = classes_hash(CLASSES_list)
+        self.entries = {}
+        self.dirty = False
+
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.entries = data.get("entries", {})
+                else:
+                    print(f"ℹ️ {self.path} 版本不符，將重新建立 manifest")
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 無法讀取 manifest {self.path} ({e})，將重新建立")
+
+    def __contains__(self, stem):
+        return stem in self.entries
+
+    def stems(self):
+        return set(self.entries)
+
+    def is_up_to_date(self, stem, xml_file, txt_file):
+        """XML、類別列表與輸出的 label 都沒有改變時回傳 True。"""
+        entry = self.entries.get(stem)
+        if entry is None or entry["classes_hash"] != self.classes_hash:
+            return False
+
+        # 1. 檢查 XML：先比 mtime/size，只有 mtime 變了但大小相同時才計算 hash
+        if xml_file.exists():
+            st = xml_file.stat()
+            if entry["xml_size"] != st.st_size:
+                return False
+            if entry["xml_mtime"] != st.st_mtime_ns:
+                if entry["xml_hash"] != file_hash(xml_file):
+                    return False
+                # 內容相同 (例如被重新複製過)，只更新 mtime
+                entry["xml_mtime"] = st.st_mtime_ns
+                self.dirty = True
+        elif entry["xml_size"] is not None:
+            return False
+
+        # 2. 檢查輸出的 label 是否仍存在且未被改動
+        if entry["label_size"] is None:
+            return not txt_file.exists()
+        return txt_file.exists() and txt_file.stat().st_size == entry["label_size"]
+
+    def issues(self, stem):
+        """該筆標註上次轉換時記錄的問題 [(物件索引, 問題類型, 細節), ...]。"""
+        return [tuple(item) for item in self.entries.get(stem, {}).get("issues", [])]
+
+    def record(self, stem, xml_file, txt_file, issues=(), state=None):
+        """在轉換完成後記錄該筆標註的狀態與轉換問題；state 為已算好的 file_state (未傳入時在這裡計算)。"""
+        state = state or file_state(xml_file, txt_file)
+        self.entries[stem] = {
+            **state,
+            "classes_hash": self.classes_hash,
+            "issues": [list(item) for item in issues],
+        }
+        self.dirty = True
+
+    def remove_orphans(self, valid_stems, label_dir):
+        """刪除 manifest 中已不存在於輸入清單的 label 檔案，回傳刪除的數量。"""
+        label_dir = Path(label_dir)
+        removed = 0
+        for stem in sorted(self.stems() - set(valid_stems)):
+            txt_file = label_dir / f"{stem}.txt"
+            if txt_file.exists():
+                txt_file.unlink()
+                removed += 1
+            del self.entries[stem]
+            self.dirty = True
+        return removed
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # 先寫入暫存檔再取代，避免中斷時留下損壞的 manifest
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
@@ -1,8 +1,14 @@
 import os
-import xml.etree.ElementTree as ET
 from pathlib import Path
 from tqdm import tqdm
 import yaml
+from label_manifest import LabelManifest
+from annotation_index import AnnotationIndex
+from voc_reader import read_voc
+from diagnostics import Diagnostics
+from yolo_boxes import (convert_to_yolo, REJECT_REASONS, REJECT_PARSE_ERROR, REJECT_NO_SIZE, REJECT_BAD_SIZE, REJECT_NO_NAME,
+                        REJECT_UNKNOWN_CLASS, REJECT_NO_BNDBOX, REJECT_BAD_COORDS, REJECT_INVALID_BOX,
+                        REJECT_OUT_OF_RANGE)
 
 # 從 dataset.yaml 載入類別
 def load_classes_from_yaml(yaml_path):
@@ -24,85 +30,73 @@ def load_classes_from_yaml(yaml_path):
 # 預先定義一個空的 CLASSES 列表，稍後會從 YAML 載入
 CLASSES = []
 
-def convert_annotation(xml_file, txt_file, CLASSES_list):
-    try:
-        tree = ET.parse(xml_file)
-    except ET.ParseError:
-        print(f"⚠️ 無法解析 {xml_file}")
-        return
-    
-    root = tree.getroot()
-    size = root.find("size")
-    if size is None:
-        print(f"⚠️ {xml_file} 缺少 <size> 標籤，跳過")
-        return
-    
-    try:
-        w = float(size.find("width").text)
-        h = float(size.find("height").text)
-    except:
-        print(f"⚠️ {xml_file} 的 <size> 內容有問題，跳過")
-        return
-
-    lines = []
-    for obj in root.findall("object"):
-        name_tag = obj.find("name")
-        if name_tag is None or name_tag.text is None:
-            print(f"⚠️ {xml_file} 有空的 <object> 名稱，跳過")
-            continue
-
-        # 將類別名稱轉為小寫，並去除前後空白，以匹配
-        cls = name_tag.text.strip().lower()
-        
-        # 使用傳入的 CLASSES_list 進行檢查
-        if cls not in CLASSES_list:
-            # *重要提醒：您的 dataset.yaml 中是 'pilers'，但一般應為 'pliers'。*
-            # 為了讓程式正常運作，這裡會依據 YAML 檔案中讀到的為準。
-            print(f"⚠️ {xml_file} 出現未知類別: {cls} (請確認它是否在 dataset.yaml 中)，跳過")
-            continue
-
-        cls_id = CLASSES_list.index(cls)
-
-        bndbox = obj.find("bndbox")
-        if bndbox is None:
-            print(f"⚠️ {xml_file} 的 <object> 沒有 bndbox，跳過")
-            continue
-
-        try:
-            # 確保座標轉換為 float
-            xmin = float(bndbox.find("xmin").text)
-            ymin = float(bndbox.find("ymin").text)
-            xmax = float(bndbox.find("xmax").text)
-            ymax = float(bndbox.find("ymax").text)
-        except Exception as e:
-            print(f"⚠️ {xml_file} 的 bndbox 座標有問題 ({e})，跳過")
-            continue
-            
-        # 進行邊界檢查，避免除以零或寬高為負
-        if w <= 0 or h <= 0 or xmax <= xmin or ymax <= ymin:
-            print(f"⚠️ {xml_file} 的尺寸或邊界框無效 (W:{w}, H:{h}, Xmin:{xmin}, Ymax:{ymax})，跳過")
-            continue
-
-        # YOLO 格式轉換
-        x_center = (xmin + xmax) / 2 / w
-        y_center = (ymin + ymax) / 2 / h
-        width = (xmax - xmin) / w
-        height = (ymax - ymin) / h
-        
-        # 檢查 YOLO 座標是否在 0 到 1 之間
-        if not (0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 <= width <= 1 and 0 <= height <= 1):
-             print(f"⚠️ {xml_file} 轉換後的 YOLO 座標超出範圍，可能原始座標有誤: {x_center:.3f}, {y_center:.3f}, {width:.3f}, {height:.3f}，跳過")
-             continue
-
-
-        lines.append(f"{cls_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}")
-
+# 拒絕原因 -> verbose 模式下逐筆印出的訊息
+REJECT_MESSAGES = {
+    REJECT_PARSE_ERROR: "⚠️ 無法解析 {xml}",
+    REJECT_NO_SIZE: "⚠️ {xml} 缺少 <size> 標籤，跳過",
+    REJECT_BAD_SIZE: "⚠️ {xml} 的 <size> 內容有問題，跳過",
+    REJECT_NO_NAME: "⚠️ {xml} 有空的 <object> 名稱，跳過",
+    # *重要提醒：您的 dataset.yaml 中是 'pilers'，但一般應為 'pliers'。*
+    # 為了讓程式正常運作，這裡會依據 YAML 檔案中讀到的為準。
+    REJECT_UNKNOWN_CLASS: "⚠️ {xml} 出現未知類別: {cls} (請確認它是否在 dataset.yaml 中)，跳過",
+    REJECT_NO_BNDBOX: "⚠️ {xml} 的 <object> 沒有 bndbox，跳過",
+    REJECT_BAD_COORDS: "⚠️ {xml} 的 bndbox 座標有問題，跳過",
+    REJECT_INVALID_BOX: "⚠️ {xml} 的尺寸或邊界框無效 (W:{w}, H:{h}, Xmin:{xmin}, Ymax:{ymax})，跳過",
+    REJECT_OUT_OF_RANGE: "⚠️ {xml} 轉換後的 YOLO 座標超出範圍，可能原始座標有誤，跳過",
+}
+
+def report_rejections(rejections, annotations, xml_files, diagnostics):
+    """將 convert_to_yolo 回傳的結構化拒絕紀錄加入 diagnostics。"""
+    for image_i, object_i, reason in rejections.tolist():
+        ann = annotations[image_i]
+        fields = {"xml": xml_files[image_i], "cls": None, "w": ann.width, "h": ann.height,
+                  "xmin": None, "ymax": None}
+        if object_i >= 0:
+            name = ann.names[object_i]
+            fields["cls"] = name.strip().lower() if name is not None else None
+            fields["xmin"] = ann.boxes[object_i, 0]
+            fields["ymax"] = ann.boxes[object_i, 3]
+        message = REJECT_MESSAGES[reason].format(**fields) if diagnostics.verbose else None
+        diagnostics.record(xml_files[image_i], REJECT_REASONS[reason], object_i, fields["cls"], message)
+
+def write_label(lines, txt_file):
     if lines:
         txt_file.parent.mkdir(parents=True, exist_ok=True)
         with open(txt_file, "w") as f:
             f.write("\n".join(lines))
 
-def process_split(xml_dir, label_dir, CLASSES_list):
+def convert_annotations(annotations, xml_files, txt_files, CLASSES_list, diagnostics=None):
+    """以向量化方式一次轉換多個 XML 的標註並寫出 label (沒有有效物件時不寫檔)。
+
+    diagnostics 為 None 時逐筆印出問題 (等同 verbose 的 Diagnostics)。
+    """
+    if diagnostics is None:
+        diagnostics = Diagnostics(verbose=True)
+    lines_per_image, rejections = convert_to_yolo(annotations, CLASSES_list)
+    report_rejections(rejections, annotations, xml_files, diagnostics)
+    for lines, txt_file in zip(lines_per_image, txt_files):
+        write_label(lines, txt_file)
+
+def convert_annotation(xml_file, txt_file, CLASSES_list, backend=None):
+    convert_annotations([read_voc(xml_file, backend)], [xml_file], [txt_file], CLASSES_list)
+
+def convert_from_index(index, xml_file, txt_file, CLASSES_list):
+    """與 convert_annotation 相同，但從 AnnotationIndex 讀取已解析好的標註。"""
+    ann = index.annotation(xml_file.stem)
+    if ann is None:
+        # 索引建立後才新增的 XML，直接解析
+        ann = read_voc(xml_file)
+    convert_annotations([ann], [xml_file], [txt_file], CLASSES_list)
+
+def process_split(xml_dir, label_dir, CLASSES_list, incremental=True, use_index=True, chunk_size=500,
+                  diagnostics=None):
+    """轉換 xml_dir 內所有 XML。
+
+    incremental=True 時只轉換新增或修改過的 XML，並刪除孤立的 label。
+    use_index=True 時先以 AnnotationIndex 一次解析 (或直接讀取已建立的) 所有 XML。
+    每 chunk_size 個 XML 為一批進行向量化轉換。
+    轉換問題記錄在 diagnostics；未傳入時於結束後印出摘要。
+    """
     xml_dir = Path(xml_dir)
     label_dir = Path(label_dir)
     
@@ -116,10 +110,60 @@ def process_split(xml_dir, label_dir, CLASSES_list):
         print(f"ℹ️ {xml_dir} 中沒有找到 XML 檔案。")
         return
         
-    for xml_file in tqdm(xml_files, desc=f"Processing {xml_dir.parts[-2]}/{xml_dir.parts[-1]}"):
-        txt_file = label_dir / (xml_file.stem + ".txt")
-        # 傳入類別列表
-        convert_annotation(xml_file, txt_file, CLASSES_list)
+    own_diagnostics = diagnostics is None
+    if own_diagnostics:
+        diagnostics = Diagnostics()
+
+    index = AnnotationIndex.load_or_build(xml_dir) if use_index else None
+    manifest = LabelManifest(label_dir, CLASSES_list) if incremental else None
+
+    todo = xml_files
+    if manifest is not None:
+        todo = []
+        for xml_file in xml_files:
+            txt_file = label_dir / (xml_file.stem + ".txt")
+            if manifest.is_up_to_date(xml_file.stem, xml_file, txt_file):
+                continue
+            # 沒有有效物件時不會寫檔，先移除舊的 label 以免殘留
+            if txt_file.exists():
+                txt_file.unlink()
+            todo.append(xml_file)
+
+    with tqdm(total=len(todo), desc=f"Processing {xml_dir.parts[-2]}/{xml_dir.parts[-1]}") as pbar:
+        for i in range(0, len(todo), chunk_size):
+            chunk = todo[i:i + chunk_size]
+            txt_files = [label_dir / (xml_file.stem + ".txt") for xml_file in chunk]
+
+            annotations = []
+            for xml_file in chunk:
+                ann = index.annotation(xml_file.stem) if index is not None else None
+                # 沒有索引，或索引建立後才新增的 XML，直接解析
+                annotations.append(ann if ann is not None else read_voc(xml_file))
+
+            # 傳入類別列表 (每批各自收集問題，才能存進 manifest)
+            chunk_diagnostics = Diagnostics(verbose=diagnostics.verbose)
+            convert_annotations(annotations, chunk, txt_files, CLASSES_list, chunk_diagnostics)
+            diagnostics.merge(chunk_diagnostics)
+            pbar.update(len(chunk))
+
+            if manifest is not None:
+                issues = chunk_diagnostics.file_items()
+                for xml_file, txt_file in zip(chunk, txt_files):
+                    manifest.record(xml_file.stem, xml_file, txt_file, issues.get(str(xml_file), ()))
+
+    if manifest is not None:
+        # 未重新轉換的 XML 沿用 manifest 中上次記錄的問題，報告才會涵蓋整個資料夾
+        converted = set(todo)
+        for xml_file in xml_files:
+            if xml_file not in converted:
+                diagnostics.replay(str(xml_file), manifest.issues(xml_file.stem))
+        removed = manifest.remove_orphans([f.stem for f in xml_files], label_dir)
+        manifest.save()
+        print(f"ℹ️ 轉換 {len(todo)} 個、略過 {len(xml_files) - len(todo)} 個未變更的 XML (問題沿用 manifest 中的紀錄)，"
+              f"刪除 {removed} 個孤立 label")
+
+    if own_diagnostics:
+        diagnostics.print_summary(f"{xml_dir.name} 轉換問題摘要")
 
 if __name__ == "__main__":
     
@@ -151,13 +195,20 @@ if __name__ == "__main__":
     # 設定 B (使用相對路徑，較靈活)：如果您的 voc2yolo.py 在某個目錄下，而 SIXray_YOLO 在其同級或上一級
     base_dir = Path("./../../SIXray_YOLO") # 保持您原來的相對路徑設定
 
+    VERBOSE = False   # True: 逐筆印出每個問題；False: 只在最後印出摘要
+    REPORT_PATH = base_dir / "labels" / "conversion_report.json"  # 副檔名改為 .csv 則輸出 CSV
+    DIAGNOSTICS = Diagnostics(verbose=VERBOSE)
+
     for split in ["train", "val", "test"]:
         # XML 檔案應在 base_dir/xmls/split_name
         xml_dir = base_dir / "xmls" / split
         # 輸出 YOLO label 檔案到 base_dir/labels/split_name
         label_dir = base_dir / "labels" / split
         # 將類別列表傳入
-        process_split(xml_dir, label_dir, GLOBAL_CLASSES)
+        process_split(xml_dir, label_dir, GLOBAL_CLASSES, diagnostics=DIAGNOSTICS)
+
+    DIAGNOSTICS.print_summary()
+    DIAGNOSTICS.write_report(REPORT_PATH)
 
     print("---")
     print("✅ VOC -> YOLO 轉換完成！")
\ No newline at end of file
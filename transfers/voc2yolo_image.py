@@ -1,8 +1,17 @@
 import os
-import xml.etree.ElementTree as ET
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from tqdm import tqdm
 import yaml
+from label_manifest import LabelManifest, file_state
+from annotation_index import AnnotationIndex
+from voc_reader import read_voc
+from diagnostics import Diagnostics
+from yolo_boxes import (convert_to_yolo, REJECT_REASONS, REJECT_PARSE_ERROR, REJECT_NO_SIZE, REJECT_BAD_SIZE, REJECT_NO_NAME,
+                        REJECT_UNKNOWN_CLASS, REJECT_NO_BNDBOX, REJECT_BAD_COORDS, REJECT_INVALID_BOX,
+                        REJECT_OUT_OF_RANGE)
 
 # --- 輔助函式：從 YAML 載入類別 ---
 
@@ -21,81 +30,126 @@ def load_classes_from_yaml(yaml_path):
 
 # --- 轉換邏輯 ---
 
-def convert_annotation(xml_file, txt_file, CLASSES_list):
+# 拒絕原因 -> verbose 模式下逐筆印出的訊息 (None 表示不顯示，例如沒有名稱的物件)
+REJECT_MESSAGES = {
+    REJECT_PARSE_ERROR: "⚠️ 無法解析 XML 檔案，跳過標註轉換: {xml}",
+    REJECT_NO_SIZE: "⚠️ {xml} 缺少 <size> 標籤，無法計算座標，跳過",
+    REJECT_BAD_SIZE: "⚠️ {xml} 的 <size> 內容有問題，無法計算座標，跳過",
+    REJECT_NO_NAME: None,
+    REJECT_UNKNOWN_CLASS: "⚠️ {xml} 出現未知類別: {cls}，跳過物件",
+    REJECT_NO_BNDBOX: "⚠️ {xml} 的 <object> 沒有 bndbox，跳過物件",
+    REJECT_BAD_COORDS: "⚠️ {xml} 的 bndbox 座標有問題，跳過物件",
+    REJECT_INVALID_BOX: "⚠️ {xml} 的尺寸或邊界框無效，跳過物件",
+    REJECT_OUT_OF_RANGE: "⚠️ {xml} 轉換後的 YOLO 座標超出範圍，跳過物件",
+}
+
+def report_rejections(rejections, annotations, xml_names, diagnostics):
+    """將 convert_to_yolo 回傳的結構化拒絕紀錄加入 diagnostics。"""
+    for image_i, object_i, reason in rejections.tolist():
+        name = annotations[image_i].names[object_i] if object_i >= 0 else None
+        cls = name.strip().lower() if name is not None else None
+        message = REJECT_MESSAGES[reason]
+        if message is not None and diagnostics.verbose:
+            message = message.format(xml=xml_names[image_i], cls=cls)
+        diagnostics.record(xml_names[image_i], REJECT_REASONS[reason], object_i, cls, message)
+
+def convert_annotations(annotations, xml_names, CLASSES_list, diagnostics=None):
+    """以向量化方式一次轉換多張圖的標註，回傳每張圖的 YOLO 標註行列表。
+
+    diagnostics 為 None 時逐筆印出問題 (等同 verbose 的 Diagnostics)。
+    """
+    if diagnostics is None:
+        diagnostics = Diagnostics(verbose=True)
+    lines_per_image, rejections = convert_to_yolo(annotations, CLASSES_list)
+    report_rejections(rejections, annotations, xml_names, diagnostics)
+    return lines_per_image
+
+def load_annotations(file_stems, unified_xml_dir, index=None):
+    """讀取一批圖片的標註；沒有 XML 的圖片 (Negative 樣本) 為 None。"""
+    annotations = []
+    for file_stem in file_stems:
+        if index is not None:
+            annotations.append(index.annotation(file_stem))
+        else:
+            xml_file = unified_xml_dir / f"{file_stem}.xml"
+            annotations.append(read_voc(xml_file) if xml_file.exists() else None)
+    return annotations
+
+def write_labels(label_dir, file_stems, lines_per_image):
+    """寫入 TXT 檔案 (無論是否有物件都寫入，以覆蓋或生成空白 TXT)。"""
+    for file_stem, lines in zip(file_stems, lines_per_image):
+        with open(label_dir / f"{file_stem}.txt", "w") as f:
+            f.write("\n".join(lines))
+
+def convert_annotation(xml_file, txt_file, CLASSES_list, backend=None):
     """將單個 VOC XML 轉換為 YOLO TXT 格式，並返回標註行列表。"""
     
     # 檢查 XML 檔案是否存在。若不存在，直接返回空列表 (作為 Negative 樣本)
     if not xml_file.exists():
         return [] 
-    
-    lines = []
-    
-    try:
-        tree = ET.parse(xml_file)
-    except ET.ParseError:
-        print(f"⚠️ 無法解析 XML 檔案，跳過標註轉換: {xml_file.name}")
-        return lines
-
-    root = tree.getroot()
-    size = root.find("size")
-    if size is None:
-        print(f"⚠️ {xml_file.name} 缺少 <size> 標籤，無法計算座標，跳過")
-        return lines
-    
-    try:
-        w = float(size.find("width").text)
-        h = float(size.find("height").text)
-    except:
-        print(f"⚠️ {xml_file.name} 的 <size> 內容有問題，無法計算座標，跳過")
-        return lines
-
-    for obj in root.findall("object"):
-        name_tag = obj.find("name")
-        cls = name_tag.text.strip().lower() if name_tag is not None and name_tag.text is not None else None
-
-        if cls is None or cls not in CLASSES_list:
-            if cls is not None:
-                 print(f"⚠️ {xml_file.name} 出現未知類別: {cls}，跳過物件")
-            continue
-
-        cls_id = CLASSES_list.index(cls)
-
-        bndbox = obj.find("bndbox") 
-        if bndbox is None:
-            print(f"⚠️ {xml_file.name} 的 <object> 沒有 bndbox，跳過物件")
-            continue
-
-        try:
-            xmin = float(bndbox.find("xmin").text)
-            ymin = float(bndbox.find("ymin").text)
-            xmax = float(bndbox.find("xmax").text)
-            ymax = float(bndbox.find("ymax").text)
-        except:
-            print(f"⚠️ {xml_file.name} 的 bndbox 座標有問題，跳過物件")
-            continue
-            
-        # 邊界檢查：避免除以零或寬高為零/負數
-        if w <= 0 or h <= 0 or xmax <= xmin or ymax <= ymin:
-            print(f"⚠️ {xml_file.name} 的尺寸或邊界框無效，跳過物件")
-            continue
-
-        # YOLO 格式轉換
-        x_center = (xmin + xmax) / 2 / w
-        y_center = (ymin + ymax) / 2 / h
-        width = (xmax - xmin) / w
-        height = (ymax - ymin) / h
-        
-        # 檢查 YOLO 座標是否在 0 到 1 之間
-        if not (0 <= x_center <= 1 and 0 <= y_center <= 1 and 0 <= width <= 1 and 0 <= height <= 1):
-             print(f"⚠️ {xml_file.name} 轉換後的 YOLO 座標超出範圍，跳過物件")
-             continue
 
-        lines.append(f"{cls_id} {x_center:.6f} {y_center:.6f} {width:.6f} {height:.6f}")
-        
-    return lines # 返回標註行列表
+    return convert_annotations([read_voc(xml_file, backend)], [xml_file.name], CLASSES_list)[0]
+
+def convert_from_index(index, file_stem, CLASSES_list):
+    """與 convert_annotation 相同的轉換邏輯，但從 AnnotationIndex 讀取已解析好的標註，不再重新解析 XML。"""
+
+    ann = index.annotation(file_stem)
+
+    # 索引中沒有這個 XML，直接返回空列表 (作為 Negative 樣本)
+    if ann is None:
+        return []
 
-def process_split(base_dir, split, CLASSES_list, unified_xml_dir):
-    """根據 images/{split} 資料夾的檔案清單，從統一的 XML 資料夾中進行轉換。"""
+    return convert_annotations([ann], [f"{file_stem}.xml"], CLASSES_list)[0]
+
+def convert_chunk(file_stems, CLASSES_list, unified_xml_dir, label_dir, index=None, diagnostics=None,
+                  verbose=False, with_state=False):
+    """轉換一批圖片的標註：先讀取整批標註，向量化轉換後再一次寫出所有 TXT。
+
+    回傳 (pid, 處理張數, 耗時秒數, diagnostics, states)，供多進程模式統計各 worker 的吞吐量並合併問題紀錄；
+    with_state=True 時 states 為每張圖給 manifest 的 file_state (XML 與 label 的 hash 在 worker 中計算)，否則為 None。
+    """
+    start = time.perf_counter()
+    if diagnostics is None:
+        diagnostics = Diagnostics(verbose=verbose)
+
+    annotations = load_annotations(file_stems, unified_xml_dir, index)
+    lines_per_image = convert_annotations(annotations, [f"{stem}.xml" for stem in file_stems], CLASSES_list,
+                                          diagnostics)
+    write_labels(label_dir, file_stems, lines_per_image)
+
+    states = None
+    if with_state:
+        states = [file_state(unified_xml_dir / f"{stem}.xml", label_dir / f"{stem}.txt") for stem in file_stems]
+
+    return os.getpid(), len(file_stems), time.perf_counter() - start, diagnostics, states
+
+# 多進程模式下每個 worker 的 AnnotationIndex (由 initializer 傳入一次，不隨每個 chunk 序列化)
+_WORKER_INDEX = None
+
+def _init_worker(index):
+    global _WORKER_INDEX
+    _WORKER_INDEX = index
+
+def _convert_chunk_in_worker(file_stems, CLASSES_list, unified_xml_dir, label_dir, verbose, with_state):
+    return convert_chunk(file_stems, CLASSES_list, unified_xml_dir, label_dir, _WORKER_INDEX, verbose=verbose,
+                         with_state=with_state)
+
+def replay_unchanged(manifest, all_stems, converted_stems, diagnostics):
+    """增量模式下未重新轉換的標註：把 manifest 中上次記錄的問題加回 diagnostics，報告才會涵蓋整個資料集。"""
+    converted = set(converted_stems)
+    for stem in all_stems:
+        if stem not in converted:
+            diagnostics.replay(f"{stem}.xml", manifest.issues(stem))
+
+def process_split(base_dir, split, CLASSES_list, unified_xml_dir, incremental=True, index=None, chunk_size=500,
+                  diagnostics=None):
+    """根據 images/{split} 資料夾的檔案清單，從統一的 XML 資料夾中進行轉換。
+
+    incremental=True 時只轉換新增或修改過的標註，並刪除已不在 images/{split} 中的 label。
+    若傳入 index (AnnotationIndex)，則直接從索引讀取標註，不再逐一解析 XML。
+    每 chunk_size 張圖片為一批進行向量化轉換。
+    轉換問題記錄在 diagnostics；未傳入時於 split 結束後印出摘要。
+    """
     
     image_dir = base_dir / "images" / split
     label_dir = base_dir / "labels" / split
@@ -105,28 +159,144 @@ def process_split(base_dir, split, CLASSES_list, unified_xml_dir):
         return
 
     # 1. 以 images 資料夾中的 .jpg 檔名為準
-    image_files = list(image_dir.glob("*.jpg"))
+    all_stems = [img_file.stem for img_file in image_dir.glob("*.jpg")]
     
-    if not image_files:
+    if not all_stems:
         print(f"ℹ️ {image_dir} 中沒有找到 JPG 圖片檔案。")
         return
 
-    print(f"\n--- 開始處理 {split} (共 {len(image_files)} 張圖片) ---")
+    print(f"\n--- 開始處理 {split} (共 {len(all_stems)} 張圖片) ---")
     label_dir.mkdir(parents=True, exist_ok=True) # 確保 labels 資料夾存在
 
-    for img_file in tqdm(image_files, desc=f"Processing {split} files"):
-        file_stem = img_file.stem # 取得檔名 (不含副檔名), 例如 P00001
+    own_diagnostics = diagnostics is None
+    if own_diagnostics:
+        diagnostics = Diagnostics()
 
-        # *** 關鍵修改：從統一的資料夾尋找 XML ***
-        xml_file = unified_xml_dir / f"{file_stem}.xml" 
-        txt_file = label_dir / f"{file_stem}.txt"
-        
-        # 2. 執行轉換邏輯
-        lines = convert_annotation(xml_file, txt_file, CLASSES_list)
-        
-        # 3. 寫入 TXT 檔案 (無論是否有物件都寫入，以覆蓋或生成空白 TXT)
-        with open(txt_file, "w") as f:
-            f.write("\n".join(lines))
+    # 2. 增量模式：只轉換需要重新產生的檔案
+    manifest = LabelManifest(label_dir, CLASSES_list) if incremental else None
+    file_stems = all_stems
+    if manifest is not None:
+        file_stems = [
+            stem for stem in all_stems
+            if not manifest.is_up_to_date(stem, unified_xml_dir / f"{stem}.xml", label_dir / f"{stem}.txt")
+        ]
+
+    # 3. 分批轉換並寫入
+    with tqdm(total=len(file_stems), desc=f"Processing {split} files") as pbar:
+        for i in range(0, len(file_stems), chunk_size):
+            chunk = file_stems[i:i + chunk_size]
+            _, _, _, chunk_diagnostics, states = convert_chunk(chunk, CLASSES_list, unified_xml_dir, label_dir,
+                                                               index, verbose=diagnostics.verbose,
+                                                               with_state=manifest is not None)
+            diagnostics.merge(chunk_diagnostics)
+            pbar.update(len(chunk))
+
+            if manifest is not None:
+                issues = chunk_diagnostics.file_items()
+                for stem, state in zip(chunk, states):
+                    manifest.record(stem, unified_xml_dir / f"{stem}.xml", label_dir / f"{stem}.txt",
+                                    issues.get(f"{stem}.xml", ()), state)
+
+    if manifest is not None:
+        replay_unchanged(manifest, all_stems, file_stems, diagnostics)
+        removed = manifest.remove_orphans(all_stems, label_dir)
+        manifest.save()
+        print(f"ℹ️ 轉換 {len(file_stems)} 個、略過 {len(all_stems) - len(file_stems)} 個未變更的標註 "
+              f"(問題沿用 manifest 中的紀錄)，刪除 {removed} 個孤立 label")
+
+    if own_diagnostics:
+        diagnostics.print_summary(f"{split} 轉換問題摘要")
+
+    print(f"✅ {split} 分割處理完成。已在 {label_dir} 生成所有標註檔案 (含空白 TXT)。")
+
+# --- 多進程轉換 ---
+
+def process_split_parallel(base_dir, split, CLASSES_list, unified_xml_dir, workers=None, chunk_size=500,
+                           incremental=True, index=None, diagnostics=None):
+    """process_split 的多進程版本：將 images/{split} 的檔案清單切成多個 chunk 分派給 worker。
+
+    輸出的 labels/{split}/*.txt 與 process_split 完全相同；manifest 只由主進程讀寫 (hash 由 worker 計算)，
+    各 worker 的問題紀錄在主進程合併到 diagnostics。index 透過 initializer 傳給每個 worker 一次。
+    """
+
+    image_dir = base_dir / "images" / split
+    label_dir = base_dir / "labels" / split
+
+    if not image_dir.is_dir():
+        print(f"❌ 找不到圖片資料夾: {image_dir}，跳過 {split} 處理。")
+        return
+
+    # 只傳檔名 (stem) 給子進程，減少序列化 Path 物件的開銷
+    file_stems = [img_file.stem for img_file in image_dir.glob("*.jpg")]
+
+    if not file_stems:
+        print(f"ℹ️ {image_dir} 中沒有找到 JPG 圖片檔案。")
+        return
+
+    label_dir.mkdir(parents=True, exist_ok=True) # 確保 labels 資料夾存在
+    all_stems = file_stems
+
+    own_diagnostics = diagnostics is None
+    if own_diagnostics:
+        diagnostics = Diagnostics()
+
+    # 增量模式：只把需要重新轉換的檔案分派給 worker
+    manifest = LabelManifest(label_dir, CLASSES_list) if incremental else None
+    if manifest is not None:
+        file_stems = [
+            stem for stem in file_stems
+            if not manifest.is_up_to_date(stem, unified_xml_dir / f"{stem}.xml", label_dir / f"{stem}.txt")
+        ]
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [file_stems[i:i + chunk_size] for i in range(0, len(file_stems), chunk_size)]
+
+    print(f"\n--- 開始處理 {split} (共 {len(all_stems)} 張圖片，需轉換 {len(file_stems)} 張，"
+          f"{workers} 個 worker，{len(chunks)} 個 chunk) ---")
+
+    # pid -> [處理張數, 累計耗時]
+    worker_stats = defaultdict(lambda: [0, 0.0])
+    start = time.perf_counter()
+
+    # 索引只在每個 worker 啟動時傳送一次；manifest 需要的 hash 也在 worker 中計算
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as executor:
+        futures = {
+            executor.submit(_convert_chunk_in_worker, chunk, CLASSES_list, unified_xml_dir, label_dir,
+                            diagnostics.verbose, manifest is not None): chunk
+            for chunk in chunks
+        }
+        with tqdm(total=len(file_stems), desc=f"Processing {split} files") as pbar:
+            for future in as_completed(futures):
+                pid, count, elapsed, chunk_diagnostics, states = future.result()
+                diagnostics.merge(chunk_diagnostics)
+                worker_stats[pid][0] += count
+                worker_stats[pid][1] += elapsed
+                pbar.update(count)
+
+                if manifest is not None:
+                    issues = chunk_diagnostics.file_items()
+                    for stem, state in zip(futures[future], states):
+                        manifest.record(stem, unified_xml_dir / f"{stem}.xml", label_dir / f"{stem}.txt",
+                                        issues.get(f"{stem}.xml", ()), state)
+
+    if manifest is not None:
+        replay_unchanged(manifest, all_stems, file_stems, diagnostics)
+        removed = manifest.remove_orphans(all_stems, label_dir)
+        manifest.save()
+        print(f"ℹ️ 略過 {len(all_stems) - len(file_stems)} 個未變更的標註 (問題沿用 manifest 中的紀錄)，"
+              f"刪除 {removed} 個孤立 label")
+
+    total_elapsed = time.perf_counter() - start
+
+    print(f"📊 {split} 各 worker 吞吐量:")
+    for pid, (count, elapsed) in sorted(worker_stats.items()):
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print(f"    - worker {pid}: {count} 張, {elapsed:.2f} 秒, {rate:.1f} 張/秒")
+    overall_rate = len(file_stems) / total_elapsed if total_elapsed > 0 else 0.0
+    print(f"    - 總計: {len(file_stems)} 張, {total_elapsed:.2f} 秒, {overall_rate:.1f} 張/秒")
+
+    if own_diagnostics:
+        diagnostics.print_summary(f"{split} 轉換問題摘要")
 
     print(f"✅ {split} 分割處理完成。已在 {label_dir} 生成所有標註檔案 (含空白 TXT)。")
 
@@ -155,10 +325,32 @@ if __name__ == "__main__":
         exit()
 
 
-    # 3. 執行轉換
-    for split in ["train", "val", "test"]:
+    # 3. 載入 (或建立) 標註索引，所有 XML 只解析一次
+    INDEX = AnnotationIndex.load_or_build(UNIFIED_XML_DIR)
+
+    # 4. 執行轉換
+    # NUM_WORKERS > 1 時使用多進程轉換；設為 1 則使用原本的單進程流程
+    NUM_WORKERS = os.cpu_count() or 1
+    CHUNK_SIZE = 500  # 每批向量化轉換 (多進程時為每個 worker 一次處理) 的圖片數
+    VERBOSE = False   # True: 逐筆印出每個問題；False: 只在最後印出摘要
+    REPORT_PATH = base_dir / "labels" / "conversion_report.json"  # 副檔名改為 .csv 則輸出 CSV
+
+    # split_yolo_data.py 以 SPLIT_FORMAT = "lists" 分割時，圖片都在 images/all，改為 ["all"]
+    SPLITS = ["train", "val", "test"]
+
+    DIAGNOSTICS = Diagnostics(verbose=VERBOSE)
+    for split in SPLITS:
         # 將 XML 統一路徑傳入
-        process_split(base_dir, split, GLOBAL_CLASSES, UNIFIED_XML_DIR)
+        if NUM_WORKERS > 1:
+            process_split_parallel(base_dir, split, GLOBAL_CLASSES, UNIFIED_XML_DIR,
+                                   workers=NUM_WORKERS, chunk_size=CHUNK_SIZE, index=INDEX,
+                                   diagnostics=DIAGNOSTICS)
+        else:
+            process_split(base_dir, split, GLOBAL_CLASSES, UNIFIED_XML_DIR, index=INDEX, chunk_size=CHUNK_SIZE,
+                          diagnostics=DIAGNOSTICS)
+
+    DIAGNOSTICS.print_summary()
+    DIAGNOSTICS.write_report(REPORT_PATH)
 
     print("\n====================================")
     print("✅ VOC -> YOLO 轉換及 Labels 建立完成！")
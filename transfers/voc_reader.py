@@ -0,0 +1,225 @@
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+
+import numpy as np
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml 為選用套件，沒有安裝時退回標準函式庫
+    lxml_etree = None
+
+# 圖片 (XML) 層級的狀態
+STATUS_OK = 0
+STATUS_PARSE_ERROR = 1   # XML 無法解析
+STATUS_NO_SIZE = 2       # 缺少 <size>
+STATUS_BAD_SIZE = 3      # <size> 內容有問題
+
+# 物件層級的 bndbox 狀態
+BOX_OK = 0
+BOX_MISSING = 1          # <object> 沒有 bndbox
+BOX_BAD_COORDS = 2       # bndbox 座標無法轉成數字
+
+BOX_KEYS = ("xmin", "ymin", "xmax", "ymax")
+
+# 單一 XML 的解析結果 (struct-of-arrays)
+#   names      : 每個 <object> 的 <name> 原始文字 (沒有時為 None)
+#   boxes      : (N, 4) float64，xmin, ymin, xmax, ymax (無效時為 NaN)
+#   box_status : (N,) int8，BOX_* 常數
+VocAnnotation = namedtuple(
+    "VocAnnotation", ["filename", "width", "height", "status", "names", "boxes", "box_status"]
+)
+
+# lxml      : lxml 的 C 解析器 (重複使用同一個 parser)，最快
+# etree     : 標準函式庫 ElementTree 建立 DOM (原本 convert_annotation 的作法)
+# iterparse : 標準函式庫串流解析，處理完的節點立即清除，記憶體用量與檔案大小無關
+BACKENDS = ("lxml", "etree", "iterparse")
+
+def default_backend():
+    """有安裝 lxml 時使用 lxml，否則使用標準函式庫的 etree。
+
+    SIXray 的 XML 都很小 (約 1KB)，逐一事件回呼的 iterparse 反而比一次建立 DOM 慢，
+    因此 iterparse 只在需要限制記憶體用量時手動指定。
+    """
+    return "lxml" if lxml_etree is not None else "etree"
+
+_lxml_parser = None
+
+def _get_lxml_parser():
+    global _lxml_parser
+    if _lxml_parser is None:
+        _lxml_parser = lxml_etree.XMLParser(remove_comments=True)
+    return _lxml_parser
+
+def _empty(status, filename=None, width=np.nan, height=np.nan):
+    return VocAnnotation(filename, width, height, status, [],
+                         np.empty((0, 4), dtype=np.float64), np.empty(0, dtype=np.int8))
+
+def _read_size(size):
+    try:
+        return float(size.find("width").text), float(size.find("height").text), STATUS_OK
+    except:
+        return np.nan, np.nan, STATUS_BAD_SIZE
+
+def _read_object(obj, names, boxes, box_status):
+    name_tag = obj.find("name")
+    names.append(name_tag.text if name_tag is not None else None)
+
+    bndbox = obj.find("bndbox")
+    if bndbox is None:
+        boxes.append((np.nan, np.nan, np.nan, np.nan))
+        box_status.append(BOX_MISSING)
+        return
+    try:
+        boxes.append(tuple(float(bndbox.find(k).text) for k in BOX_KEYS))
+        box_status.append(BOX_OK)
+    except Exception:
+        boxes.append((np.nan, np.nan, np.nan, np.nan))
+        box_status.append(BOX_BAD_COORDS)
+
+def _finish(filename, width, height, status, names, boxes, box_status):
+    return VocAnnotation(
+        filename, width, height, status, names,
+        np.array(boxes, dtype=np.float64).reshape(-1, 4),
+        np.array(box_status, dtype=np.int8),
+    )
+
+def _read_streaming(xml_path):
+    """以 iterparse 串流解析：只處理根節點的直接子節點，處理完立即清除以節省記憶體。
+
+    與 ElementTree 的 root.find() / root.findall() 語意相同 (只取第一個 <filename> / <size>)。
+    """
+    filename = None
+    width = height = np.nan
+    status = STATUS_NO_SIZE
+    seen_filename = seen_size = False
+    names, boxes, box_status = [], [], []
+
+    depth = 0
+    try:
+        for event, elem in ET.iterparse(str(xml_path), events=("start", "end")):
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
+                continue
+
+            tag = elem.tag
+            if tag == "object":
+                _read_object(elem, names, boxes, box_status)
+            elif tag == "size" and not seen_size:
+                seen_size = True
+                width, height, status = _read_size(elem)
+            elif tag == "filename" and not seen_filename:
+                seen_filename = True
+                filename = elem.text.strip() if elem.text else None
+
+            # 清除已處理的節點
+            elem.clear()
+    except ET.ParseError:
+        return _empty(STATUS_PARSE_ERROR)
+
+    return _finish(filename, width, height, status, names, boxes, box_status)
+
+def _read_tree(root):
+    """從已建立的 DOM (ElementTree 或 lxml) 取出標註，find() 的語意與原本 convert_annotation 相同。"""
+    fn_tag = root.find("filename")
+    filename = fn_tag.text.strip() if fn_tag is not None and fn_tag.text else None
+
+    size = root.find("size")
+    if size is None:
+        width, height, status = np.nan, np.nan, STATUS_NO_SIZE
+    else:
+        width, height, status = _read_size(size)
+
+    names, boxes, box_status = [], [], []
+    for obj in root.findall("object"):
+        _read_object(obj, names, boxes, box_status)
+
+    return _finish(filename, width, height, status, names, boxes, box_status)
+
+def _read_etree(xml_path):
+    try:
+        root = ET.parse(xml_path).getroot()
+    except ET.ParseError:
+        return _empty(STATUS_PARSE_ERROR)
+    return _read_tree(root)
+
+def _first_children(elem):
+    """tag -> 第一個同名子節點的 text (等同 elem.find(tag).text)。"""
+    texts = {}
+    for child in elem:
+        texts.setdefault(child.tag, child.text)
+    return texts
+
+def _read_lxml(xml_path):
+    """lxml 解析後只走訪一次子節點，避免 lxml 每次 find() 都建立節點代理物件的開銷。
+
+    結果與 _read_tree 相同：只取第一個 <filename> / <size> / <name> / <bndbox>。
+    """
+    try:
+        root = lxml_etree.parse(str(xml_path), _get_lxml_parser()).getroot()
+    except lxml_etree.XMLSyntaxError:
+        return _empty(STATUS_PARSE_ERROR)
+
+    filename = None
+    width = height = np.nan
+    status = STATUS_NO_SIZE
+    seen_filename = seen_size = False
+    names, boxes, box_status = [], [], []
+
+    for child in root:
+        tag = child.tag
+        if tag == "object":
+            name = bndbox = None
+            seen_name = False
+            for part in child:
+                if part.tag == "name" and not seen_name:
+                    seen_name = True
+                    name = part.text
+                elif part.tag == "bndbox" and bndbox is None:
+                    bndbox = part
+            names.append(name)
+
+            if bndbox is None:
+                boxes.append((np.nan, np.nan, np.nan, np.nan))
+                box_status.append(BOX_MISSING)
+                continue
+            coords = _first_children(bndbox)
+            try:
+                boxes.append(tuple(float(coords[k]) for k in BOX_KEYS))
+                box_status.append(BOX_OK)
+            except Exception:
+                boxes.append((np.nan, np.nan, np.nan, np.nan))
+                box_status.append(BOX_BAD_COORDS)
+        elif tag == "size" and not seen_size:
+            seen_size = True
+            dims = _first_children(child)
+            try:
+                width, height, status = float(dims["width"]), float(dims["height"]), STATUS_OK
+            except:
+                width, height, status = np.nan, np.nan, STATUS_BAD_SIZE
+        elif tag == "filename" and not seen_filename:
+            seen_filename = True
+            filename = child.text.strip() if child.text else None
+
+    return _finish(filename, width, height, status, names, boxes, box_status)
+
+def read_voc(xml_path, backend=None):
+    """
+    解析單一 SIXray VOC XML，回傳 VocAnnotation。
+
+    Args:
+        xml_path: XML 檔案路徑。
+        backend (str): BACKENDS 之一；None 表示使用 default_backend()。
+    """
+    backend = backend or default_backend()
+    if backend == "lxml":
+        if lxml_etree is None:
+            raise ImportError("backend='lxml' 需要安裝 lxml (pip install lxml)")
+        return _read_lxml(xml_path)
+    if backend == "etree":
+        return _read_etree(xml_path)
+    if backend == "iterparse":
+        return _read_streaming(xml_path)
+    raise ValueError(f"未知的 backend: {backend} (可用: {', '.join(BACKENDS)})")
@@ -0,0 +1,145 @@
+import numpy as np
+
+from voc_reader import STATUS_OK, STATUS_PARSE_ERROR, STATUS_NO_SIZE, STATUS_BAD_SIZE, BOX_MISSING, BOX_BAD_COORDS
+
+# 拒絕原因代碼 (0 表示保留)
+REJECT_NONE = 0
+REJECT_PARSE_ERROR = 1      # XML 無法解析
+REJECT_NO_SIZE = 2          # 缺少 <size>
+REJECT_BAD_SIZE = 3         # <size> 內容有問題
+REJECT_NO_NAME = 4          # <object> 沒有名稱
+REJECT_UNKNOWN_CLASS = 5    # 類別不在 dataset.yaml 的 names 中
+REJECT_NO_BNDBOX = 6        # <object> 沒有 bndbox
+REJECT_BAD_COORDS = 7       # bndbox 座標無法轉成數字
+REJECT_INVALID_BOX = 8      # 圖片尺寸或邊界框寬高 <= 0
+REJECT_OUT_OF_RANGE = 9     # 轉換後的 YOLO 座標不在 [0, 1]
+
+REJECT_REASONS = {
+    REJECT_PARSE_ERROR: "parse_error",
+    REJECT_NO_SIZE: "no_size",
+    REJECT_BAD_SIZE: "bad_size",
+    REJECT_NO_NAME: "no_name",
+    REJECT_UNKNOWN_CLASS: "unknown_class",
+    REJECT_NO_BNDBOX: "no_bndbox",
+    REJECT_BAD_COORDS: "bad_coords",
+    REJECT_INVALID_BOX: "invalid_box",
+    REJECT_OUT_OF_RANGE: "out_of_range",
+}
+
+_IMAGE_REJECT = {
+    STATUS_PARSE_ERROR: REJECT_PARSE_ERROR,
+    STATUS_NO_SIZE: REJECT_NO_SIZE,
+    STATUS_BAD_SIZE: REJECT_BAD_SIZE,
+}
+
+# 每一筆被拒絕的圖片或物件
+#   image  : 在輸入 annotations 列表中的位置
+#   object : 該圖中第幾個 <object> (圖片層級的拒絕為 -1)
+#   reason : REJECT_* 代碼
+REJECTION_DTYPE = np.dtype([("image", np.int32), ("object", np.int32), ("reason", np.int8)])
+
+# 類別代碼中的特殊值
+_NO_NAME = -2
+_UNKNOWN = -1
+
+def class_ids(names, CLASSES_list):
+    """將 <name> 原始文字 (strip + lower) 對應到 CLASSES_list 的索引。"""
+    lookup = {}
+    for name in set(names):
+        if name is None:
+            lookup[name] = _NO_NAME
+        else:
+            cls = name.strip().lower()
+            lookup[name] = CLASSES_list.index(cls) if cls in CLASSES_list else _UNKNOWN
+    return np.array([lookup[name] for name in names], dtype=np.int64)
+
+def format_yolo_lines(cls_ids, xywh):
+    """以向量化方式將類別與 (N, 4) 座標格式化為 "cls x y w h" (6 位小數)。"""
+    if len(cls_ids) == 0:
+        return np.array([], dtype=str)
+    lines = np.char.mod("%d", cls_ids)
+    for col in range(4):
+        lines = np.char.add(np.char.add(lines, " "), np.char.mod("%.6f", xywh[:, col]))
+    return lines
+
+def convert_to_yolo(annotations, CLASSES_list):
+    """
+    一次轉換多張圖 (單一檔案、一個 chunk 或整個 split) 的標註。
+
+    Args:
+        annotations: VocAnnotation 列表；None 表示沒有 XML (Negative 樣本)。
+        CLASSES_list: dataset.yaml 中的類別名稱。
+
+    Returns:
+        lines_per_image: 與 annotations 等長的列表，每個元素為該圖的 YOLO 標註行列表。
+        rejections: REJECTION_DTYPE 結構陣列，依 (image, object) 排序。
+    """
+    n_images = len(annotations)
+    width = np.full(n_images, np.nan)
+    height = np.full(n_images, np.nan)
+    status = np.full(n_images, STATUS_OK, dtype=np.int8)
+    counts = np.zeros(n_images, dtype=np.int64)
+    names, boxes, box_status = [], [], []
+
+    for i, ann in enumerate(annotations):
+        if ann is None:
+            continue
+        width[i], height[i], status[i] = ann.width, ann.height, ann.status
+        counts[i] = len(ann.names)
+        names.extend(ann.names)
+        boxes.append(ann.boxes)
+        box_status.append(ann.box_status)
+
+    obj_image = np.repeat(np.arange(n_images), counts)
+    obj_index = np.arange(len(obj_image)) - np.repeat(np.cumsum(counts) - counts, counts)
+    boxes = np.concatenate(boxes) if boxes else np.empty((0, 4))
+    box_status = np.concatenate(box_status) if box_status else np.empty(0, dtype=np.int8)
+    cls = class_ids(names, CLASSES_list)
+
+    # 1. 正規化為 YOLO 格式 (運算順序與原本的純量版本相同，確保數值逐位元一致)
+    w = width[obj_image]
+    h = height[obj_image]
+    xmin, ymin, xmax, ymax = boxes.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        xywh = np.stack([
+            (xmin + xmax) / 2 / w,
+            (ymin + ymax) / 2 / h,
+            (xmax - xmin) / w,
+            (ymax - ymin) / h,
+        ], axis=1)
+    in_range = ((xywh >= 0) & (xywh <= 1)).all(axis=1)
+    invalid = (w <= 0) | (h <= 0) | (xmax <= xmin) | (ymax <= ymin)
+
+    # 2. 依原本的檢查順序決定每個物件的拒絕原因
+    reason = np.select(
+        [cls == _NO_NAME, cls == _UNKNOWN, box_status == BOX_MISSING, box_status == BOX_BAD_COORDS,
+         invalid, ~in_range],
+        [REJECT_NO_NAME, REJECT_UNKNOWN_CLASS, REJECT_NO_BNDBOX, REJECT_BAD_COORDS,
+         REJECT_INVALID_BOX, REJECT_OUT_OF_RANGE],
+        default=REJECT_NONE,
+    ).astype(np.int8)
+
+    # 圖片層級有問題時，該圖的物件不再個別檢查
+    image_ok = status == STATUS_OK
+    obj_image_ok = image_ok[obj_image]
+    keep = obj_image_ok & (reason == REJECT_NONE)
+
+    # 3. 格式化並依圖片分組
+    lines = format_yolo_lines(cls[keep], xywh[keep]).tolist()
+    kept_counts = np.bincount(obj_image[keep], minlength=n_images)
+    bounds = np.concatenate([[0], np.cumsum(kept_counts)]).tolist()
+    lines_per_image = [lines[bounds[i]:bounds[i + 1]] for i in range(n_images)]
+
+    # 4. 結構化的拒絕紀錄
+    bad_images = np.flatnonzero(~image_ok)
+    bad_objects = np.flatnonzero(obj_image_ok & (reason != REJECT_NONE))
+    rejections = np.empty(len(bad_images) + len(bad_objects), dtype=REJECTION_DTYPE)
+    rejections["image"] = np.concatenate([bad_images, obj_image[bad_objects]])
+    rejections["object"] = np.concatenate([np.full(len(bad_images), -1), obj_index[bad_objects]])
+    rejections["reason"] = np.concatenate([
+        [_IMAGE_REJECT[s] for s in status[bad_images].tolist()],
+        reason[bad_objects],
+    ])
+    rejections = rejections[np.lexsort((rejections["object"], rejections["image"]))]
+
+    return lines_per_image, rejections
@@ -1,5 +1,7 @@
 from ultralytics import YOLOv10
 import torch
+
+from image_cache import cache_dir_for, cached_validator
 def main():
     model = YOLOv10('./savemodel/best-24.pt') 
     print(f"Model loaded successfully: {type(model)}")
@@ -7,13 +9,17 @@ def main():
     print(torch.cuda.is_available())
 
     dataset_path = r"D:\SIXray_YOLO\dataset.yaml"  # 改成 Windows 絕對路徑
+    image_size = 480
+    image_cache_root = None  # r"D:\SIXray_YOLO\cache" (image_cache.py 產生的快取)
+    validator = cached_validator(cache_dir_for(image_cache_root, image_size)) if image_cache_root else None
 
     results = model.val(
         data=dataset_path,
         batch=12,
-        imgsz=480,
+        imgsz=image_size,
         device="cuda",
-        save_json=True
+        save_json=True,
+        validator=validator,
     )
     print(results)
     model.save(r"D:\SIXray_code\savemodel\yolov10n_sixray1.pt")  # 改成絕對路徑